@@ -1,16 +1,147 @@
+import atexit
+import hashlib
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import numpy as np
 import pandas as pd
 from utils.valuation import BusinessValuationEngine
 from utils.ranking import BuyerRanker
 from utils.teaser_generator_hf import TeaserGenerator
 from utils.email_generator import EmailGenerator
 from utils.buyer_response_simulator import BuyerResponseSimulator
+from utils.buyer_vectors import BuyerVectorIndex
 from utils.auction_simulator import AuctionSimulator
-from utils.company_graph import CompanyConnectionGraph
+from utils.deal_monte_carlo import DealMonteCarlo
+from utils.company_graph import render_graph_png
 from utils.data_loader import BuyerDataLoader
-from utils.document_access import DocumentAccessManager
+from utils.dossier_service import DossierService
+from utils.stage_scheduler import StageScheduler
+from utils.pipeline import data_version, seller_key
+from utils.run_store import RunStore, model_version
+from utils.sweep import SellerSweep
+from utils.metrics import MetricsRegistry, metrics
+
+# Файл SQLite (по умолчанию) или каталог Arrow/Parquet, выгруженный utils.storage
+DB_PATH = os.environ.get("MA_DATA", "m_and_a.db")
+CACHE_TTL = 3600  # секунд
+# История анализов: готовые прогоны переживают перезапуск и видны всем аналитикам
+RUN_STORE_PATH = os.environ.get("MA_RUNS", "runs.db")
+# Каталог индекса векторов покупателей (python -m utils.buyer_vectors): персонализация откликов
+# по близости векторов; без него — по точному совпадению отрасли и города
+VECTOR_INDEX_PATH = os.environ.get("MA_VECTOR_INDEX")
+# Настройки этапов, от которых зависит результат: при их смене прогоны считаются заново
+MODEL_VERSION = model_version(ranker="logistic", dedup=True, teaser="rugpt3small_based_on_gpt2", top_k=10,
+                              nda_trials=100000, monte_carlo_trials=20000,
+                              vector_index=VECTOR_INDEX_PATH is not None)
+
+
+# === Кэш этапов: модели — общие ресурсы, результаты — данные ===
+@st.cache_resource(max_entries=4, ttl=CACHE_TTL)
+def get_ranker(db_path: str, version: str) -> BuyerRanker:
+    metrics.incr("cache_misses.ranker")
+    # Дубликаты покупателей скрываются, если в базе есть результат utils.dedup
+    ranker = BuyerRanker(db_path, dedup=True)
+    ranker.fit()
+    return ranker
+
+
+@st.cache_resource(max_entries=1)
+def get_vector_index(path: str) -> BuyerVectorIndex:
+    # Матрица отображается в память: один экземпляр на процесс, страницы общие для всех сессий
+    return BuyerVectorIndex(path)
+
+
+@st.cache_resource(max_entries=1)
+def get_teaser_generator() -> TeaserGenerator:
+    return TeaserGenerator()
+
+
+@st.cache_resource(max_entries=4, ttl=CACHE_TTL)
+def get_buyer_profiles(db_path: str, version: str) -> dict:
+    metrics.incr("cache_misses.profiles")
+    # Общий объект только для чтения: cache_data копировал бы весь словарь при каждом обращении
+    buyers_df = BuyerDataLoader(db_path).load_buyers()
+    return dict(zip(buyers_df["company_id"], buyers_df.to_dict("records")))
+
+
+@st.cache_data(max_entries=256, ttl=CACHE_TTL)
+def get_valuation(db_path: str, version: str, key: tuple) -> dict:
+    metrics.incr("cache_misses.valuation")
+    return BusinessValuationEngine(db_path).estimate(dict(key))
+
+
+@st.cache_data(max_entries=256, ttl=CACHE_TTL)
+def get_ranking(db_path: str, version: str, key: tuple, top_k: int = 10) -> list:
+    metrics.incr("cache_misses.ranking")
+    ranked = get_ranker(db_path, version).rank(dict(key), top_k=top_k)
+    for i, b in enumerate(ranked, 1):
+        b["rank"] = i
+    return ranked
+
+
+@st.cache_data(max_entries=256, ttl=CACHE_TTL)
+def get_teaser(key: tuple) -> str:
+    metrics.incr("cache_misses.teaser")
+    return get_teaser_generator().generate(dict(key))
+
+
+@st.cache_resource(max_entries=1)
+def get_dossier_service() -> DossierService:
+    # Один сервис на процесс: готовые досье и состояние NDA общие для всех сессий
+    service = DossierService(log_path="dossier_access.log")
+    atexit.register(service.close)
+    return service
+
+
+@st.cache_resource(max_entries=1)
+def get_process_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn"))
+
+
+@st.cache_data(max_entries=32, ttl=CACHE_TTL)
+def get_graph_png(db_path: str, version: str, key: tuple, top_n: int = 8):
+    metrics.incr("cache_misses.graph")
+    # Построение графа — чистый Python под GIL, поэтому выполняется в отдельном процессе
+    return get_process_pool().submit(render_graph_png, db_path, dict(key), top_n).result()
+
+
+@st.cache_resource(max_entries=1)
+def get_run_store() -> RunStore:
+    store = RunStore(RUN_STORE_PATH)
+    atexit.register(store.close)
+    return store
+
+
+def replay_stages(run: dict, graph):
+    """Этапы сохранённого прогона в том же виде, в каком их отдаёт StageScheduler."""
+    yield "valuation", run["valuation"]
+    yield "ranking", run["ranking"]
+    yield "teaser", run["teaser"]
+    yield "email", run["email"]
+    yield "responses", (run["responses"], run["nda_stats"])
+    yield "auction", (run["auction"], run["price_range"]) if run["auction"] is not None else None
+    # Граф не хранится: он зависит только от данных и берётся из своего кэша
+    yield "graph", graph()
+
+
+# Сетка сценариев «что если»: выручка и EBITDA (0 — без EBITDA) с шагом полей ввода, укрупнённым для слайдеров
+SWEEP_REVENUES = [float(x) for x in range(5, 101, 5)]
+SWEEP_EBITDAS = [0.0] + [x / 2 for x in range(1, 41)]
+
+
+@st.cache_data(max_entries=16, ttl=CACHE_TTL)
+def get_sweep(db_path: str, version: str, industry: str, geographies: tuple) -> dict:
+    metrics.incr("cache_misses.sweep")
+    sweep = SellerSweep(db_path, ranker=get_ranker(db_path, version))
+    return sweep.run(
+        {"industry": industry}, revenues=SWEEP_REVENUES,
+        ebitdas=[e if e > 0 else None for e in SWEEP_EBITDAS], geographies=geographies
+    )
 
-DB_PATH = "m_and_a.db"
 
 st.set_page_config(page_title="AI M&A Platform", layout="wide")
 st.title("AI-Платформа для Продажи Бизнеса")
@@ -42,102 +173,270 @@ seller = {
 if st.button("Запустить анализ продажи", type="primary"):
     with st.spinner("Анализируем рынок..."):
         try:
-            # --- 1. Оценка стоимости ---
-            valuation_engine = BusinessValuationEngine(DB_PATH)
-            valuation_result = valuation_engine.estimate(seller)
-            if valuation_result["error"]:
-                st.error(valuation_result["message"])
-                st.stop()
-            st.success(valuation_result["message"])
-            st.divider()
-
-            # --- 2. Ранжирование покупателей ---
-            ranker = BuyerRanker(DB_PATH)
-            ranker.fit()
-            ranked_buyers = ranker.rank(seller, top_k=10)
-            for i, b in enumerate(ranked_buyers, 1):
-                b["rank"] = i
-
-            df_buyers = pd.DataFrame(ranked_buyers)
-            st.header("2. Топ-10 потенциальных покупателей")
-            st.dataframe(
-                df_buyers[["rank", "name", "type", "probability"]].rename(columns={
-                    "rank": "Ранг",
-                    "name": "Название покупателя",
-                    "type": "Тип",
-                    "probability": "Вероятность интереса"
-                }).style.format({"Вероятность интереса": "{:.1%}"}),
-                hide_index=True,
-                use_container_width=True
+            # Метрики этого прогона: общий реестр процесса видит и другие сессии
+            run_metrics = MetricsRegistry(enabled=metrics.enabled)
+            metrics.bind(run_metrics)
+            version = data_version(DB_PATH)
+            key = seller_key(seller)
+            simulator = BuyerResponseSimulator(
+                vector_index=get_vector_index(VECTOR_INDEX_PATH) if VECTOR_INDEX_PATH else None
             )
-            st.divider()
-
-            # --- 3. Teaser и email ---
-            st.header("3. Teaser и коммуникация")
-            teaser_gen = TeaserGenerator()
-            email_gen = EmailGenerator()
-            st.subheader("Teaser (публичный)")
-            st.info(teaser_gen.generate(seller))
-
-            # Загрузка профилей покупателей
-            loader = BuyerDataLoader(DB_PATH)
-            buyers_df = loader.load_buyers()
-            buyer_profiles = {row["company_id"]: row.to_dict() for _, row in buyers_df.iterrows()}
-
-            # Письмо для топ-1
-            top_buyer = buyer_profiles[ranked_buyers[0]["company_id"]]
-            st.subheader("Пример персонализированного письма")
-            st.code(email_gen.generate(top_buyer, seller), language="text")
-            st.divider()
-
-            # --- 4. Симуляция откликов и аукцион ---
-            simulator = BuyerResponseSimulator()
-            responses = simulator.simulate(ranked_buyers, buyer_profiles, seller)
-            nda_count = sum(1 for r in responses if r["response"] == "NDA_requested")
-
-            # Аукцион
-            auction = AuctionSimulator()
-            auction_result = auction.simulate(valuation_result["estimated_value"], responses)
-
-            # Отображение конкурентной среды
-            st.header("4. Аукцион и конкуренция")
-            if auction_result["competition_level"] == "high":
-                st.success(f"{auction_result['message']} — цена повышена на 30–40%")
-            elif auction_result["competition_level"] == "medium":
-                st.warning(f"{auction_result['message']} — цена повышена на 10–25%")
-            elif auction_result["competition_level"] == "low":
-                st.info(f"{auction_result['message']} — базовая цена")
-            else:
-                st.error("Нет заинтересованных покупателей — сделка не состоится")
-
-            # Метрики
-            st.metric("Начальная цена", f"${valuation_result['estimated_value']:.1f} млн")
-            st.metric("Финальная цена", f"${auction_result['final_price']:.1f} млн", 
-                     delta=f"+{(auction_result['multiplier'] - 1) * 100:.0f}%")
-            st.divider()
-
-            # --- 5. Досье (только после NDA) ---
-            doc_manager = DocumentAccessManager(seller)
-            if nda_count >= 1:
-                st.subheader("Полное досье (доступно после NDA)")
-                dossier = doc_manager.get_full_dossier(nda_signed=True)
-                st.json(dossier)
-            else:
-                st.info("Полное досье станет доступно, как только хотя бы один покупатель запросит NDA.")
-            st.divider()
-
-            # --- 6. Граф связей ---
-            st.header("5. Скрытые связи (граф)")
-            graph_builder = CompanyConnectionGraph(DB_PATH)
-            graph_builder.build(seller)
-            fig = graph_builder.get_plot_figure(top_n=8)
-            if fig:
-                st.pyplot(fig)
+            run_store = get_run_store()
+            stored = run_store.get(seller, version, MODEL_VERSION)
+
+            # Секции создаются заранее: этапы завершаются в любом порядке,
+            # а страница сохраняет привычную структуру
+            sections = {name: st.container() for name in (
+                "valuation", "ranking", "teaser", "email", "auction", "dossier", "graph"
+            )}
+
+            def run_responses(ranking, profiles):
+                responses = simulator.simulate(ranking, profiles, seller)
+                # Seed распределения — из профиля продавца: одинаковый профиль даёт одинаковое распределение
+                nda_rng = np.random.default_rng(int(hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16], 16))
+                nda_stats = simulator.simulate_many(ranking, profiles, seller, n_trials=100000, rng=nda_rng)
+                return responses, nda_stats
+
+            def run_auction(responses, valuation, ranking, profiles):
+                if valuation["error"]:
+                    return None
+                auction_result = AuctionSimulator().simulate(valuation["estimated_value"], responses[0])
+                price_range = DealMonteCarlo(simulator, n_workers=1).run(
+                    valuation["estimated_value"], ranking, profiles, seller, n_trials=20000, seed=0
+                )
+                return auction_result, price_range
+
+            # Этапы и их реальные зависимости: письмо — после ранжирования,
+            # аукцион — после откликов и оценки
+            ctx = get_script_run_ctx()
+
+            def init_stage_thread():
+                add_script_run_ctx(threading.current_thread(), ctx)
+                metrics.bind(run_metrics)
+
+            scheduler = StageScheduler(max_threads=6, thread_initializer=init_stage_thread)
+            # Промахи считаются внутри кэшируемых функций, обращения — здесь
+            for stage in ("valuation", "ranking", "teaser", "profiles", "graph"):
+                metrics.incr(f"cache_requests.{stage}")
+            scheduler.add("valuation", lambda: get_valuation(DB_PATH, version, key))
+            scheduler.add("ranking", lambda: get_ranking(DB_PATH, version, key, top_k=10))
+            scheduler.add("teaser", lambda: get_teaser(key))
+            scheduler.add("profiles", lambda: get_buyer_profiles(DB_PATH, version))
+            scheduler.add("graph", lambda: get_graph_png(DB_PATH, version, key, top_n=8))
+            scheduler.add("email", lambda ranking, profiles: EmailGenerator().generate(
+                profiles[ranking[0]["company_id"]], seller
+            ), deps=("ranking", "profiles"))
+            scheduler.add("responses", run_responses, deps=("ranking", "profiles"))
+            scheduler.add("auction", run_auction, deps=("responses", "valuation", "ranking", "profiles"))
+
+            if stored is not None:
+                st.caption(f"Результат из истории анализов от "
+                           f"{pd.to_datetime(stored['created_at'], unit='s'):%d.%m.%Y %H:%M} (UTC)")
+                stages = replay_stages(stored["result"], lambda: get_graph_png(DB_PATH, version, key, top_n=8))
             else:
-                st.write("Нет значимых связей для отображения.")
+                stages = scheduler.run()
+
+            collected = {}
+            for stage, result in stages:
+                collected[stage] = result
+                # --- 1. Оценка стоимости ---
+                if stage == "valuation":
+                    valuation_result = result
+                    if valuation_result["error"]:
+                        st.error(valuation_result["message"])
+                        st.stop()
+                    with sections["valuation"]:
+                        st.success(valuation_result["message"])
+                        st.divider()
+
+                # --- 2. Ранжирование покупателей ---
+                elif stage == "ranking":
+                    df_buyers = pd.DataFrame(result)
+                    with sections["ranking"]:
+                        st.header("2. Топ-10 потенциальных покупателей")
+                        st.dataframe(
+                            df_buyers[["rank", "name", "type", "probability"]].rename(columns={
+                                "rank": "Ранг",
+                                "name": "Название покупателя",
+                                "type": "Тип",
+                                "probability": "Вероятность интереса"
+                            }).style.format({"Вероятность интереса": "{:.1%}"}),
+                            hide_index=True,
+                            use_container_width=True
+                        )
+                        st.divider()
+
+                # --- 3. Teaser и email ---
+                elif stage == "teaser":
+                    with sections["teaser"]:
+                        st.header("3. Teaser и коммуникация")
+                        st.subheader("Teaser (публичный)")
+                        st.info(result)
+
+                elif stage == "email":
+                    # Письмо для топ-1
+                    with sections["email"]:
+                        st.subheader("Пример персонализированного письма")
+                        st.code(result, language="text")
+                        st.divider()
+
+                # --- 4. Симуляция откликов и аукцион ---
+                elif stage == "responses":
+                    responses, nda_stats = result
+                    nda_count = sum(1 for r in responses if r["response"] == "NDA_requested")
+
+                    # --- 5. Досье (только после NDA) ---
+                    dossier_service = get_dossier_service()
+                    seller_id = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+                    dossier_service.register_seller(seller_id, seller)
+                    nda_buyers = [r["company_id"] for r in responses if r["response"] == "NDA_requested"]
+                    for buyer_id in nda_buyers:
+                        dossier_service.grant_nda(seller_id, buyer_id)
+                    with sections["dossier"]:
+                        if nda_count >= 1:
+                            st.subheader("Полное досье (доступно после NDA)")
+                            _, payload = dossier_service.serve(seller_id, nda_buyers[0])
+                            st.json(payload.body.decode("utf-8"))
+                        else:
+                            st.info("Полное досье станет доступно, как только хотя бы один покупатель запросит NDA.")
+                        st.divider()
+
+                elif stage == "auction" and result is not None:
+                    auction_result, price_range = result
+
+                    # Отображение конкурентной среды
+                    with sections["auction"]:
+                        st.header("4. Аукцион и конкуренция")
+                        if auction_result["competition_level"] == "high":
+                            st.success(f"{auction_result['message']} — цена повышена на 30–40%")
+                        elif auction_result["competition_level"] == "medium":
+                            st.warning(f"{auction_result['message']} — цена повышена на 10–25%")
+                        elif auction_result["competition_level"] == "low":
+                            st.info(f"{auction_result['message']} — базовая цена")
+                        else:
+                            st.error("Нет заинтересованных покупателей — сделка не состоится")
+
+                        # Распределение числа NDA по 100 000 прогонам (seed из профиля продавца:
+                        # при тех же данных и модели не меняется между перезапусками)
+                        st.metric("Ожидаемое число NDA", f"{nda_stats['expected_nda_count']:.1f}")
+                        st.bar_chart(pd.DataFrame({
+                            "Вероятность": nda_stats["nda_count_distribution"]
+                        }).rename_axis("Число NDA"))
+
+                        # Метрики
+                        st.metric("Начальная цена", f"${valuation_result['estimated_value']:.1f} млн")
+                        st.metric("Финальная цена", f"${auction_result['final_price']:.1f} млн", 
+                                 delta=f"+{(auction_result['multiplier'] - 1) * 100:.0f}%")
+                        percentiles = price_range["price_percentiles"]
+                        st.metric("Диапазон цены (P5–P95, Монте-Карло)", f"${percentiles[5]:.1f}–{percentiles[95]:.1f} млн",
+                                  delta=f"+{price_range['expected_uplift'] * 100:.0f}% в среднем")
+                        st.divider()
+
+                # --- 6. Граф связей ---
+                elif stage == "graph":
+                    with sections["graph"]:
+                        st.header("5. Скрытые связи (граф)")
+                        if result:
+                            st.image(result)
+                        else:
+                            st.write("Нет значимых связей для отображения.")
+
+            if stored is None:
+                responses, nda_stats = collected["responses"]
+                auction = collected.get("auction")
+                run_store.put(seller, {
+                    "valuation": collected["valuation"], "ranking": collected["ranking"],
+                    "teaser": collected["teaser"], "email": collected["email"],
+                    "responses": responses, "nda_stats": nda_stats,
+                    "auction": auction[0] if auction else None, "price_range": auction[1] if auction else None
+                }, version, MODEL_VERSION)
+
+            # Разбивка времени прогона (только при MA_METRICS=1)
+            if metrics.enabled:
+                breakdown = run_metrics.snapshot()
+                with st.sidebar:
+                    st.subheader("Тайминги прогона")
+                    st.dataframe(
+                        pd.DataFrame([
+                            {"Этап": name, "Вызовов": s["count"], "Время, с": round(s["total_seconds"], 3)}
+                            for name, s in sorted(breakdown["spans"].items())
+                        ]),
+                        hide_index=True,
+                        use_container_width=True
+                    )
+                    if breakdown["counters"]:
+                        st.json(breakdown["counters"])
 
         except Exception as e:
             st.error(f"Ошибка: {e}")
+        finally:
+            metrics.bind(None)
 else:
 
     st.info("Заполните данные о вашем бизнесе и нажмите «Запустить анализ продажи».")
+
+# === Сценарии «что если» ===
+# Вся сетка считается одним проходом и кэшируется, поэтому слайдеры только выбирают готовые строки
+if st.checkbox("Сценарии «что если»: как меняются оценка и цена"):
+    metrics.incr("cache_requests.sweep")
+    sweep = get_sweep(DB_PATH, data_version(DB_PATH), industry, tuple(GEOGRAPHIES))
+    grid, rankings = sweep["grid"], sweep["rankings"]
+    grid = grid.assign(ebitda=grid["ebitda"].fillna(0.0))
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        what_if_geography = st.selectbox("Город сценария", GEOGRAPHIES, index=GEOGRAPHIES.index(geography))
+    with col2:
+        what_if_revenue = st.select_slider(
+            "Выручка сценария (млн $)", options=SWEEP_REVENUES,
+            value=min(SWEEP_REVENUES, key=lambda x: abs(x - revenue))
+        )
+    with col3:
+        what_if_ebitda = st.select_slider(
+            "EBITDA сценария (млн $)", options=SWEEP_EBITDAS,
+            value=min(SWEEP_EBITDAS, key=lambda x: abs(x - ebitda))
+        )
+
+    point = grid[(grid["geography"] == what_if_geography) & (grid["revenue"] == what_if_revenue)
+                 & (grid["ebitda"] == what_if_ebitda)].iloc[0]
+    if point["error"]:
+        st.error(point["error"])
+    else:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Оценка", f"${point['estimated_value']:.1f} млн", help=point["method"])
+        col2.metric("Ожидаемо NDA", f"{point['expected_nda']:.1f}",
+                    delta=f"P(конкуренция) {point['p_competition']:.0%}", delta_color="off")
+        col3.metric("Ожидаемая цена аукциона", f"${point['expected_price']:.1f} млн",
+                    delta=f"+{(point['expected_multiplier'] - 1) * 100:.0f}%")
+
+    curve = grid[(grid["geography"] == what_if_geography) & (grid["ebitda"] == what_if_ebitda)]
+    st.line_chart(curve.set_index("revenue")[["estimated_value", "expected_price"]])
+    st.dataframe(
+        rankings[(rankings["geography"] == what_if_geography) & (rankings["revenue"] == what_if_revenue)]
+        [["rank", "name", "company_id", "probability"]],
+        hide_index=True,
+        use_container_width=True
+    )
+
+# === История анализов ===
+# Сводные показатели хранятся отдельными столбцами, поэтому история и дашборд не пересчитывают прогоны
+if st.checkbox("История анализов"):
+    run_store = get_run_store()
+    st.subheader("Сегменты")
+    st.dataframe(run_store.dashboard().rename(columns={
+        "industry": "Отрасль", "geography": "География", "runs": "Прогонов",
+        "avg_estimated_value": "Средняя оценка", "avg_final_price": "Средняя цена",
+        "avg_multiplier": "Средний множитель", "avg_nda_count": "Среднее число NDA", "last_run": "Последний"
+    }), hide_index=True, use_container_width=True)
+
+    history = run_store.history(limit=100, industry=industry)
+    st.subheader(f"Последние прогоны: {industry}")
+    st.dataframe(history[["created_at", "geography", "revenue", "ebitda", "estimated_value", "final_price",
+                          "nda_count", "top_buyer"]], hide_index=True, use_container_width=True)
+    labels = {
+        row.run_key: f"{row.created_at:%d.%m %H:%M} · {row.geography} · выручка {row.revenue:g}"
+        for row in history.itertuples()
+    }
+    selected = st.multiselect("Сравнить прогоны", list(labels), format_func=labels.get)
+    if selected:
+        st.dataframe(run_store.compare(selected).set_index("run_key").T, use_container_width=True)
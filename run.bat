@@ -12,11 +12,10 @@ if not exist "%VENV_DIR%" (
 call "%VENV_DIR%\Scripts\activate.bat"
 
 pip install --upgrade pip
-pip install streamlit pandas numpy scikit-learn networkx matplotlib transformers torch requests Pillow
+pip install streamlit pandas numpy scikit-learn networkx matplotlib transformers torch requests Pillow pyarrow
 
 if not exist "%PROJECT_DIR%m_and_a.db" (
-    python "%PROJECT_DIR%utils\df_gen.py"
-    sqlite3 "%PROJECT_DIR%m_and_a.db" < "%PROJECT_DIR%m_and_a_sqlite_compatible.sql"
+    python "%PROJECT_DIR%utils\df_gen.py" "%PROJECT_DIR%m_and_a.db"
 )
 
 streamlit run "%PROJECT_DIR%app.py"
@@ -10,11 +10,10 @@ fi
 source "$VENV_DIR/bin/activate"
 
 pip install --upgrade pip
-pip install streamlit pandas numpy scikit-learn networkx matplotlib transformers torch requests Pillow
+pip install streamlit pandas numpy scikit-learn networkx matplotlib transformers torch requests Pillow pyarrow
 
 if [ ! -f "$PROJECT_DIR/m_and_a.db" ]; then
-    python "$PROJECT_DIR/utils/df_gen.py"
-    sqlite3 "$PROJECT_DIR/m_and_a.db" < "$PROJECT_DIR/m_and_a_sqlite_compatible.sql"
+    python "$PROJECT_DIR/utils/df_gen.py" "$PROJECT_DIR/m_and_a.db"
 fi
 
 streamlit run "$PROJECT_DIR/app.py"
\ No newline at end of file
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.df_gen import MADatasetGenerator  # noqa: E402
+
+# Маленькая детерминированная база: порции по CHUNK_SIZE строк, чтобы проверялось чтение порциями
+CHUNK_SIZE = 128
+
+
+@pytest.fixture(scope="session")
+def generator() -> MADatasetGenerator:
+    generator = MADatasetGenerator(seed=7)
+    generator.set_config(num_sellers=6, num_buyers=300, num_deals=120)
+    return generator
+
+
+@pytest.fixture(scope="session")
+def sqlite_db(tmp_path_factory, generator) -> str:
+    path = str(tmp_path_factory.mktemp("sqlite") / "m_and_a.db")
+    generator.stream_to_sqlite(path, chunk_size=CHUNK_SIZE)
+    return path
+
+
+@pytest.fixture(scope="session")
+def parquet_dir(tmp_path_factory, generator) -> str:
+    """Каталог Parquet в том виде, как его пишет MADatasetGenerator.parallel_to_parquet."""
+    path = str(tmp_path_factory.mktemp("parquet"))
+    generator.parallel_to_parquet(path, n_workers=1, chunk_size=CHUNK_SIZE)
+    return path
+
+
+@pytest.fixture(scope="session")
+def arrow_dir(tmp_path_factory, sqlite_db) -> str:
+    from utils.storage import export_arrow
+
+    path = str(tmp_path_factory.mktemp("arrow"))
+    export_arrow(sqlite_db, path)
+    return path
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from utils.auction_engine import AuctionEngine
+from utils.auction_simulator import AuctionSimulator
+
+BASE_PRICE = 10.0
+
+
+def _bidders(n):
+    return [{"company_id": f"b_{i}", "response": "NDA_requested", "type": "financial"} for i in range(n)]
+
+
+def _engine(auction_format, monkeypatch, valuations):
+    engine = AuctionEngine(auction_format, rng=np.random.default_rng(0))
+    monkeypatch.setattr(engine, "draw_valuations", lambda *args, **kwargs: np.array([valuations], dtype=float))
+    return engine
+
+
+@pytest.mark.parametrize("auction_format", AuctionEngine.FORMATS)
+def test_no_bidders(auction_format):
+    responses = [{"company_id": "b_0", "response": "viewed_only"}]
+    result = AuctionSimulator(auction_format, rng=np.random.default_rng(0)).simulate(BASE_PRICE, responses)
+    assert result["nda_count"] == 0 and result["winner"] is None
+    assert result["final_price"] == BASE_PRICE and result["multiplier"] == 1.0
+    assert result["competition_level"] == "none" and result["bid_history"] == []
+
+    engine = AuctionEngine(auction_format, rng=np.random.default_rng(0))
+    assert np.isnan(engine.clearing_prices(BASE_PRICE, np.empty((3, 0)))).all()
+    assert np.isnan(engine.clearing_prices(BASE_PRICE, np.full((3, 2), np.nan))).all()
+
+
+@pytest.mark.parametrize("auction_format", AuctionEngine.FORMATS)
+def test_single_bidder_pays_reserve(auction_format, monkeypatch):
+    result = _engine(auction_format, monkeypatch, [12.5]).run(BASE_PRICE, _bidders(1))
+    assert result["winner"] == "b_0" and result["final_price"] == pytest.approx(BASE_PRICE)
+    assert result["competition_level"] == "low" and result["bid_history"]
+
+    engine = AuctionEngine(auction_format, rng=np.random.default_rng(0))
+    assert engine.clearing_prices(BASE_PRICE, np.array([[12.5], [np.nan]])).tolist()[0] == pytest.approx(BASE_PRICE)
+
+
+@pytest.mark.parametrize("auction_format", AuctionEngine.FORMATS)
+def test_single_bidder_below_reserve(auction_format, monkeypatch):
+    result = _engine(auction_format, monkeypatch, [9.0]).run(BASE_PRICE, _bidders(1))
+    assert result["winner"] is None and result["final_price"] == BASE_PRICE
+
+
+@pytest.mark.parametrize("auction_format, price", [
+    ("english", 11.6),
+    ("second_price", 11.5),
+    ("first_price", 10.0 + 3.0 * 2 / 3),
+])
+def test_competitive_price(auction_format, price, monkeypatch):
+    valuations = [11.5, 13.0, 9.0, 10.5]
+    result = _engine(auction_format, monkeypatch, valuations).run(BASE_PRICE, _bidders(4))
+    assert result["winner"] == "b_1"
+    assert result["final_price"] == pytest.approx(price)
+    batch = AuctionEngine(auction_format).clearing_prices(BASE_PRICE, np.array([valuations]))
+    assert batch[0] == pytest.approx(result["final_price"])
+
+
+def test_english_bid_history(monkeypatch):
+    result = _engine("english", monkeypatch, [11.5, 13.0, 10.5]).run(BASE_PRICE, _bidders(3))
+    history = result["bid_history"]
+    assert [h["amount"] for h in history] == sorted(h["amount"] for h in history)
+    assert history[-1]["company_id"] == "b_1"
+
+
+def test_two_round_shortlist(monkeypatch):
+    valuations = [11.0, 12.0, 13.0, 14.0, 15.0, 16.0]
+    result = _engine("two_round", monkeypatch, valuations).run(BASE_PRICE, _bidders(6))
+    binding = [h for h in result["bid_history"] if h["binding"]]
+    indicative = [h for h in result["bid_history"] if not h["binding"]]
+    assert len(indicative) == 6 and len(binding) == 4
+    assert result["winner"] in {h["company_id"] for h in binding}
+    assert BASE_PRICE <= result["final_price"] <= 16.0
+
+
+def test_budget_caps_valuations():
+    engine = AuctionEngine(rng=np.random.default_rng(0))
+    mu, budget = engine.bidder_parameters([{"company_id": "b_0", "financial_capacity": 10.5},
+                                           {"company_id": "b_1", "financial_capacity": float("nan")}])
+    assert budget[0] == 10.5 and np.isinf(budget[1])
+    assert (engine.draw_valuations(BASE_PRICE, mu, budget, size=1000)[:, 0] <= 10.5).all()
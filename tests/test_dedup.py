@@ -0,0 +1,99 @@
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pytest
+
+from utils.dedup import (BuyerDeduplicator, normalize_name, save_canonical_ids, load_canonical_ids,
+                         collapse_duplicates, _popcount)
+from utils.df_gen import MADatasetGenerator
+
+FOCUS = "['Аптеки', 'Оптика']"
+CITIES = "['Берлин', 'Мюнхен']"
+
+# (company_id, name, industry_focus, target_geography)
+BUYERS = [
+    ("B1", "Hartmann & Bolander GmbH", FOCUS, CITIES),
+    ("B2", "Bolander Hartmann AG", FOCUS, CITIES),
+    ("B3", "«Hartmann-Bolander» Gmbh & Co. KG", FOCUS, CITIES),
+    # То же название, но фокус не пересекается — другой покупатель
+    ("B4", "Hartmann & Bolander GmbH", "['Автосервисы']", "['Москва']"),
+    ("B5", "Müller Straße Holding", FOCUS, CITIES),
+    ("B6", "Mueller Strasse Holding", FOCUS, CITIES),
+    ("B7", None, FOCUS, CITIES),
+    ("B8", "ООО", FOCUS, CITIES),
+    ("B9", "", None, None),
+    ("B10", "Зелёная Аптека", FOCUS, CITIES),
+]
+
+
+@pytest.fixture
+def buyers_db(tmp_path):
+    path = str(tmp_path / "buyers.db")
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute("CREATE TABLE buyers (company_id TEXT, name TEXT, industry_focus TEXT, target_geography TEXT)")
+        conn.executemany("INSERT INTO buyers VALUES (?, ?, ?, ?)", BUYERS)
+    return path
+
+
+@pytest.mark.parametrize("name, expected", [
+    (None, ""),
+    (float("nan"), ""),
+    ("", ""),
+    ("ООО", ""),
+    ("GmbH & Co. KG", ""),
+    ("Hartmann & Bolander GmbH", "bolander hartmann"),
+    ("«Bolander» Hartmann AG", "bolander hartmann"),
+    ("Müller Straße", "mueller strasse"),
+    ("Зелёная аптека", "аптека зеленая"),
+])
+def test_normalize_name(name, expected):
+    assert normalize_name(name) == expected
+
+
+def test_signatures_of_empty_names():
+    dedup = BuyerDeduplicator()
+    assert dedup._signatures([]).shape == (0, dedup.num_perm)
+    signatures = dedup._signatures(["", ""])
+    assert signatures.shape == (2, dedup.num_perm)
+    assert (signatures == 0xFFFFFFFF).all()
+    mixed = dedup._signatures(["", "abc"])
+    assert (mixed[0] == 0xFFFFFFFF).all() and not (mixed[1] == 0xFFFFFFFF).all()
+
+
+def test_popcount():
+    values = np.array([0, 1, 0b1011, 0xFFFFFFFF, 0x80000001], dtype=np.uint32)
+    assert _popcount(values).tolist() == [0, 1, 3, 32, 2]
+
+
+def test_run_finds_duplicates(buyers_db):
+    result = BuyerDeduplicator().run(buyers_db)
+    canonical = dict(zip(result["clusters"]["company_id"], result["clusters"]["canonical_id"]))
+    assert canonical == {"B1": "B1", "B2": "B1", "B3": "B1", "B5": "B5", "B6": "B5"}
+    # Пустые названия ни с кем не склеиваются
+    assert not {"B7", "B8", "B9"} & (set(result["pairs"]["company_id"]) | set(result["pairs"]["duplicate_id"]))
+
+
+def test_run_on_batches_without_names(buyers_db):
+    with closing(sqlite3.connect(buyers_db)) as conn, conn:
+        conn.execute("UPDATE buyers SET name = NULL")
+    result = BuyerDeduplicator(batch_size=3).run(buyers_db)
+    assert result["clusters"].empty and result["pairs"].empty
+
+
+def test_canonical_ids_roundtrip(buyers_db):
+    clusters = BuyerDeduplicator().run(buyers_db)["clusters"]
+    assert load_canonical_ids(buyers_db) == {}
+    assert save_canonical_ids(buyers_db, clusters) == len(clusters)
+    canonical = load_canonical_ids(buyers_db)
+    assert canonical == {"B2": "B1", "B3": "B1", "B6": "B5"}
+
+    ranked = [{"company_id": c} for c in ["B3", "B4", "B1", "B6", "B10", "B5"]]
+    assert [b["company_id"] for b in collapse_duplicates(ranked, canonical)] == ["B3", "B4", "B6", "B10"]
+
+
+def test_generated_names_are_mostly_unique():
+    # Векторный генератор собирает названия из частей: повторов не больше, чем у построчного Faker
+    generator = MADatasetGenerator(seed=7).set_config(num_sellers=1, num_buyers=20_000, num_deals=1)
+    names = next(generator.iter_chunks("buyers", chunk_size=20_000))["name"]
+    assert names.nunique() > 0.8 * len(names)
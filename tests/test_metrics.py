@@ -0,0 +1,36 @@
+import threading
+
+from utils.metrics import MetricsRegistry
+
+
+def test_bound_registry_sees_only_its_threads():
+    shared = MetricsRegistry(enabled=True)
+    runs = [MetricsRegistry(enabled=True) for _ in range(2)]
+    barrier = threading.Barrier(len(runs))
+
+    def session(run, n):
+        shared.bind(run)
+        barrier.wait()
+        for _ in range(n):
+            with shared.span("stage.ranking"):
+                shared.incr("rows_scanned.buyers", 10)
+
+    threads = [threading.Thread(target=session, args=(run, n)) for n, run in enumerate(runs, 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [run.snapshot()["counters"]["rows_scanned.buyers"] for run in runs] == [10, 20]
+    assert [run.snapshot()["spans"]["stage.ranking"]["count"] for run in runs] == [1, 2]
+    assert shared.snapshot()["counters"]["rows_scanned.buyers"] == 30
+
+    # Новый поток привязку не наследует, bind(None) её снимает
+    shared.bind(runs[0])
+    worker = threading.Thread(target=shared.incr, args=("other",))
+    worker.start()
+    worker.join()
+    shared.bind(None)
+    shared.incr("other")
+    assert "other" not in runs[0].snapshot()["counters"]
+    assert shared.snapshot()["counters"]["other"] == 2
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from utils.buyer_response_simulator import BuyerResponseSimulator, ranked_buyers, buyer_profiles, seller_profile
+from utils.deal_monte_carlo import DealMonteCarlo
+
+BASE_PRICE = 10.0
+
+
+def _run(n_workers, seed=42, auction_format="english", ranked=ranked_buyers):
+    runner = DealMonteCarlo(auction_format=auction_format, n_workers=n_workers, chunk_size=1000)
+    return runner.run(BASE_PRICE, ranked, buyer_profiles, seller_profile, n_trials=5500, seed=seed)
+
+
+@pytest.mark.parametrize("auction_format", [None, "english", "two_round"])
+def test_result_does_not_depend_on_workers(auction_format):
+    single = _run(1, auction_format=auction_format)
+    assert _run(2, auction_format=auction_format) == single
+    assert _run(1, auction_format=auction_format) == single
+    assert _run(1, seed=7, auction_format=auction_format) != single
+    assert single["n_trials"] == 5500
+
+
+def test_no_buyers():
+    result = _run(1, ranked=[])
+    assert result["competition_frequencies"]["none"] == 1.0
+    assert result["expected_uplift"] == 0.0 and result["expected_nda_count"] == 0
+
+
+def test_simulate_many_is_seeded():
+    first = BuyerResponseSimulator(rng=np.random.default_rng(3)).simulate_many(
+        ranked_buyers, buyer_profiles, seller_profile, n_trials=5000, chunk_size=700)
+    second = BuyerResponseSimulator(rng=np.random.default_rng(3)).simulate_many(
+        ranked_buyers, buyer_profiles, seller_profile, n_trials=5000, chunk_size=700)
+    np.testing.assert_array_equal(first["nda_count_distribution"], second["nda_count_distribution"])
+    assert first["expected_nda_count"] == pytest.approx(float(first["nda_probabilities"].sum()), rel=0.05)
@@ -0,0 +1,88 @@
+import shutil
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from utils.news_generator import generate_all_news, search_news
+from utils.news_ner import annotate_news
+from utils.news_signals import NewsSignals, refresh_news_signals
+
+
+@pytest.fixture
+def news_db(sqlite_db, tmp_path):
+    path = str(tmp_path / "news.db")
+    shutil.copy(sqlite_db, path)
+    generate_all_news(path, n_items=200, batch_size=64, seed=3)
+    return path
+
+
+def _fts_integrity(path):
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute("INSERT INTO news_fts (news_fts, rank) VALUES ('integrity-check', 1)")
+
+
+def test_generated_news_are_indexed(news_db):
+    _fts_integrity(news_db)
+    with closing(sqlite3.connect(news_db)) as conn:
+        triggers = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    assert triggers == {"news_fts_insert", "news_fts_delete", "news_fts_update"}
+    generate_all_news(news_db, n_items=50, batch_size=64, append=True, seed=4)
+    _fts_integrity(news_db)
+    with closing(sqlite3.connect(news_db)) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM news").fetchone()[0] == 250
+
+
+def test_plain_writes_keep_index_in_sync(news_db):
+    with closing(sqlite3.connect(news_db)) as conn, conn:
+        conn.execute("INSERT INTO news (id, text) VALUES (1000, 'Уникальнаяфраза о сделке')")
+    assert [n["id"] for n in search_news(news_db, "Уникальнаяфраза")] == [1000]
+
+    with closing(sqlite3.connect(news_db)) as conn, conn:
+        conn.execute("UPDATE news SET text = 'Другаяфраза' WHERE id = 1000")
+    assert search_news(news_db, "Уникальнаяфраза") == []
+    assert [n["id"] for n in search_news(news_db, "Другаяфраза")] == [1000]
+
+    with closing(sqlite3.connect(news_db)) as conn, conn:
+        conn.execute("DELETE FROM news WHERE id = 1000")
+    assert search_news(news_db, "Другаяфраза") == []
+    _fts_integrity(news_db)
+
+
+def _total(signals):
+    return sum(count for buyer in signals.counts.values() for (dimension, _), count in buyer.items()
+               if dimension == "industry")
+
+
+def _add_news(path, texts):
+    with closing(sqlite3.connect(path)) as conn, conn:
+        next_id = conn.execute("SELECT MAX(id) + 1 FROM news").fetchone()[0]
+        buyer = conn.execute("SELECT buyer_id FROM news LIMIT 1").fetchone()[0]
+        conn.executemany("INSERT INTO news (id, text, buyer_id) VALUES (?, ?, ?)",
+                         [(next_id + i, text, buyer) for i, text in enumerate(texts)])
+
+
+def test_signals_wait_for_annotation(news_db):
+    assert refresh_news_signals(news_db) == 200
+    assert _total(NewsSignals.load(news_db)) == 200
+
+    # Новости без разметки ждут annotate_news
+    _add_news(news_db, ["Сеть аптек в Берлине куплена"] * 10)
+    assert refresh_news_signals(news_db) == 0
+    assert annotate_news(news_db) == 10
+    assert refresh_news_signals(news_db) == 10
+    assert _total(NewsSignals.load(news_db)) == 210
+
+
+def test_entity_free_news_do_not_hold_the_mark(news_db):
+    refresh_news_signals(news_db)
+    # Первая новость не упоминает ни отрасли, ни города: после разметки она остаётся NULL/NULL
+    _add_news(news_db, ["Совет директоров сменил председателя"] + ["Сеть аптек в Берлине куплена"] * 5)
+    annotate_news(news_db)
+    assert refresh_news_signals(news_db) == 6
+    assert _total(NewsSignals.load(news_db)) == 205
+
+    _add_news(news_db, ["Покупатель закрыл сделку по аптеке в Мюнхене"] * 3)
+    annotate_news(news_db)
+    assert refresh_news_signals(news_db) == 3
+    assert _total(NewsSignals.load(news_db)) == 208
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+# Конвейер импортирует генератор teaser на Hugging Face
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from utils.pipeline import JsonlResultWriter, iter_sellers, run_batch  # noqa: E402
+
+OPTIONS = {"top_k": 5, "use_model": False, "seed": 11}
+
+
+def _run(db_path, path, sellers=None, workers=1):
+    writer = JsonlResultWriter(str(path))
+    try:
+        stats = run_batch(sellers if sellers is not None else iter_sellers(None, db_path), writer, db_path,
+                          workers=workers, flush_every=2, **OPTIONS)
+    finally:
+        writer.close()
+    with open(path, encoding="utf-8") as f:
+        records = {r["seller_id"]: r for r in map(json.loads, f)}
+    return stats, records
+
+
+def test_seeded_run_does_not_depend_on_workers(sqlite_db, tmp_path):
+    _, single = _run(sqlite_db, tmp_path / "single.jsonl")
+    _, pooled = _run(sqlite_db, tmp_path / "pooled.jsonl", workers=2)
+    _, again = _run(sqlite_db, tmp_path / "again.jsonl")
+    assert single == pooled == again
+    assert any(r["status"] == "ok" for r in single.values())
+
+
+def test_skipped_counts_only_this_input(sqlite_db, tmp_path):
+    sellers = list(iter_sellers(None, sqlite_db))
+    path = tmp_path / "resume.jsonl"
+    stats, _ = _run(sqlite_db, path, sellers[:3])
+    assert stats == {"processed": 3, "skipped": 0}
+    stats, _ = _run(sqlite_db, path, sellers[3:4])
+    assert stats == {"processed": 1, "skipped": 0}
+    stats, records = _run(sqlite_db, path, sellers)
+    assert stats == {"processed": len(sellers) - 4, "skipped": 4}
+    assert len(records) == len(sellers)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_finished_results_are_written_on_failure(sqlite_db, tmp_path, workers):
+    sellers = list(iter_sellers(None, sqlite_db))
+
+    def failing_input():
+        yield from sellers[:3]
+        raise RuntimeError("обрыв входа")
+
+    path = tmp_path / "partial.jsonl"
+    with pytest.raises(RuntimeError):
+        _run(sqlite_db, path, failing_input(), workers=workers)
+    with open(path, encoding="utf-8") as f:
+        assert sorted(json.loads(line)["seller_id"] for line in f) == sorted(s["seller_id"] for s in sellers[:3])
+    stats, _ = _run(sqlite_db, path, sellers)
+    assert stats == {"processed": len(sellers) - 3, "skipped": 3}
@@ -0,0 +1,142 @@
+import shutil
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.buyer_store import CompactBuyers
+from utils.data_loader import BuyerDataLoader
+from utils.ranking import BuyerRanker
+from utils.storage import open_storage, parse_list, list_text
+
+SELLER = {"industry": "Аптеки", "geography": "Берлин", "revenue": 20.0}
+
+
+@pytest.fixture(params=["arrow", "parquet"])
+def columnar(request, arrow_dir, parquet_dir):
+    return arrow_dir if request.param == "arrow" else parquet_dir
+
+
+@pytest.mark.parametrize("table", ["sellers", "buyers", "deals"])
+def test_read_matches_sqlite(sqlite_db, columnar, table):
+    expected = open_storage(sqlite_db).read(table)
+    actual = open_storage(columnar).read(table)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_projection_and_filters_match_sqlite(sqlite_db, columnar):
+    columns = ["deal_id", "target_industry", "target_revenue"]
+    filters = [("target_industry", "in", ["Аптеки", "Оптика"]), ("target_revenue", ">", 20)]
+    expected = open_storage(sqlite_db).read("deals", columns=columns, filters=filters)
+    actual = open_storage(columnar).read("deals", columns=columns, filters=filters)
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_batches_match_sqlite(sqlite_db, columnar):
+    expected = pd.concat(open_storage(sqlite_db).iter_batches("buyers", batch_size=100), ignore_index=True)
+    actual = pd.concat(open_storage(columnar).iter_batches("buyers", batch_size=100), ignore_index=True)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    assert open_storage(columnar).count("buyers") == open_storage(sqlite_db).count("buyers")
+
+
+def test_loader_parses_lists_from_parquet(sqlite_db, parquet_dir):
+    expected = BuyerDataLoader(sqlite_db).load_buyers()
+    actual = BuyerDataLoader(parquet_dir).load_buyers()
+    assert isinstance(actual["industry_focus"].iloc[0], list)
+    assert isinstance(actual["past_acquisitions"].iloc[0], list)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_ranker_matches_sqlite(sqlite_db, columnar, compact):
+    reference = BuyerRanker(sqlite_db, compact=compact)
+    reference.fit()
+    ranker = BuyerRanker(columnar, compact=compact)
+    ranker._load_buyers()
+    ranker.model = reference.model
+    assert ranker.rank(SELLER, top_k=10) == reference.rank(SELLER, top_k=10)
+
+
+def test_ranker_frame_builds_compact_store(sqlite_db, columnar):
+    ranker = BuyerRanker(columnar)
+    ranker._load_buyers()
+    from_ranker = CompactBuyers.from_frame(ranker._buyers_df)
+    expected = CompactBuyers.from_db(sqlite_db)
+    assert [from_ranker.profile(row) for row in range(0, len(expected), 23)] == \
+        [expected.profile(row) for row in range(0, len(expected), 23)]
+
+
+def test_compact_store_matches_sqlite(sqlite_db, parquet_dir):
+    expected = CompactBuyers.from_db(sqlite_db)
+    actual = CompactBuyers.from_db(parquet_dir)
+    assert len(actual) == len(expected)
+    for row in range(0, len(expected), 37):
+        assert actual.profile(row) == expected.profile(row)
+
+
+def test_parse_list_accepts_all_storage_forms():
+    assert parse_list("['Аптеки', 'Оптика']") == ["Аптеки", "Оптика"]
+    assert parse_list(np.array(["Аптеки"], dtype=object)) == ["Аптеки"]
+    assert parse_list(["Аптеки"]) == ["Аптеки"]
+    assert parse_list(np.array([{"industry": "Оптика", "geography": "Берлин"}], dtype=object)) == \
+        [{"industry": "Оптика", "geography": "Берлин"}]
+    for empty in (None, float("nan"), "", "NULL", "не список", "{'a': 1}", np.array([], dtype=object)):
+        assert parse_list(empty) == []
+    assert list_text(np.array(["Аптеки"], dtype=object)) == "['Аптеки']"
+    assert list_text(None) == list_text(float("nan")) == ""
+
+
+def test_compact_store_tolerates_missing_values(sqlite_db, tmp_path):
+    path = str(tmp_path / "gaps.db")
+    shutil.copy(sqlite_db, path)
+    with closing(sqlite3.connect(path)) as conn, conn:
+        first = conn.execute("SELECT company_id FROM buyers LIMIT 1").fetchone()[0]
+        conn.execute("UPDATE buyers SET industry_focus = NULL, target_geography = NULL, "
+                     "past_acquisitions = NULL WHERE company_id = ?", (first,))
+    store = CompactBuyers.from_db(path)
+    profile = store[first]
+    assert profile["industry_focus"] == profile["target_geography"] == profile["past_acquisitions"] == []
+
+    df = open_storage(path).read("buyers")
+    df.loc[df["company_id"] == first, ["name", "industry_focus", "past_acquisitions"]] = np.nan
+    from_frame = CompactBuyers.from_frame(df)
+    assert from_frame[first]["name"] == ""
+    assert from_frame[first]["industry_focus"] == from_frame[first]["past_acquisitions"] == []
+    # Текстовые и разобранные списки дают одинаковые профили
+    parsed = CompactBuyers.from_frame(BuyerDataLoader(sqlite_db).load_buyers())
+    assert [parsed.profile(row) for row in range(1, len(parsed), 29)] == \
+        [from_frame.profile(row) for row in range(1, len(parsed), 29)]
+
+
+def test_compact_store_parses_non_canonical_lists(sqlite_db, tmp_path):
+    path = str(tmp_path / "lists.db")
+    shutil.copy(sqlite_db, path)
+    with closing(sqlite3.connect(path)) as conn, conn:
+        first, second = [r[0] for r in conn.execute("SELECT company_id FROM buyers LIMIT 2")]
+        conn.execute("UPDATE buyers SET industry_focus = ?, target_geography = ?, past_acquisitions = ? "
+                     "WHERE company_id = ?",
+                     ('["Аптеки", \'Оптика\']', "['Берлин','Москва']",
+                      "[{'geography': 'Берлин', 'industry': 'Аптеки', 'year': 2020}, "
+                      "{'industry': \"Doctor's\", 'geography': 'Москва'}]", first))
+        conn.execute("UPDATE buyers SET target_geography = ? WHERE company_id = ?",
+                     ("[\"Saint John's\", 'Мюнхен']", second))
+    store = CompactBuyers.from_db(path)
+    assert store[first]["industry_focus"] == ["Аптеки", "Оптика"]
+    assert store[first]["target_geography"] == ["Берлин", "Москва"]
+    assert store[first]["past_acquisitions"] == [{"industry": "Аптеки", "geography": "Берлин"},
+                                                 {"industry": "Doctor's", "geography": "Москва"}]
+    assert sorted(store[second]["target_geography"]) == ["Saint John's", "Мюнхен"]
+    from_frame = CompactBuyers.from_frame(open_storage(path).read("buyers"))
+    assert [store.profile(row) for row in range(len(store))] == \
+        [from_frame.profile(row) for row in range(len(from_frame))]
+
+
+def test_generator_does_not_overwrite_existing_database(generator, sqlite_db, tmp_path):
+    path = str(tmp_path / "copy.db")
+    shutil.copy(sqlite_db, path)
+    with pytest.raises(FileExistsError):
+        generator.stream_to_sqlite(path)
+    assert open_storage(path).read("buyers").equals(open_storage(sqlite_db).read("buyers"))
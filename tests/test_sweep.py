@@ -0,0 +1,53 @@
+import pytest
+
+from utils.ranking import BuyerRanker
+from utils.storage import open_storage
+from utils.sweep import SellerSweep
+from utils.valuation import BusinessValuationEngine
+
+REVENUES = [5.0, 10.0]
+EBITDAS = [None, 1.0]
+
+
+@pytest.fixture(scope="module")
+def seller(sqlite_db):
+    deals = open_storage(sqlite_db).read("deals", columns=["target_industry"])
+    industry = deals["target_industry"].value_counts().index[0]
+    return {"industry": industry, "geography": "Берлин", "revenue": 10.0}
+
+
+@pytest.fixture(scope="module", params=[False, True], ids=["frame", "compact"])
+def ranker(request, sqlite_db):
+    ranker = BuyerRanker(sqlite_db, compact=request.param, seed=0)
+    ranker.fit()
+    return ranker
+
+
+def test_grid_matches_single_runs(sqlite_db, ranker, seller):
+    result = SellerSweep(sqlite_db, ranker=ranker).run(seller, REVENUES, EBITDAS,
+                                                       geographies=["Берлин", "Москва"], top_k=5)
+    grid, rankings = result["grid"], result["rankings"]
+    assert len(grid) == len(REVENUES) * len(EBITDAS) * 2
+    assert grid["expected_multiplier"].ge(1.0).all()
+
+    engine = BusinessValuationEngine(sqlite_db)
+    for revenue in REVENUES:
+        for ebitda in EBITDAS:
+            expected = engine.estimate({**seller, "revenue": revenue, "ebitda": ebitda})
+            same_ebitda = grid["ebitda"].isna() if ebitda is None else grid["ebitda"] == ebitda
+            rows = grid[(grid["revenue"] == revenue) & same_ebitda]
+            assert len(rows) == 2
+            assert rows["estimated_value"].tolist() == pytest.approx([expected["estimated_value"]] * 2)
+            assert (rows["method"] == expected["method"]).all()
+
+        for geography in ("Берлин", "Москва"):
+            expected = ranker.rank({**seller, "revenue": revenue, "geography": geography}, top_k=5)
+            top = rankings[(rankings["revenue"] == revenue) & (rankings["geography"] == geography)]
+            assert top["rank"].tolist() == [1, 2, 3, 4, 5]
+            assert top["probability"].tolist() == pytest.approx([b["probability"] for b in expected], rel=1e-6)
+            assert top["company_id"].iloc[0] == expected[0]["company_id"]
+
+
+def test_default_ranker(sqlite_db, seller):
+    grid = SellerSweep(sqlite_db).run(seller, REVENUES)["grid"]
+    assert grid["estimated_value"].notna().all()
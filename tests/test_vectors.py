@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from utils.buyer_response_simulator import BuyerResponseSimulator
+from utils.buyer_vectors import BuyerVectorIndex
+from utils.data_loader import BuyerDataLoader
+
+SELLER = {"industry": "Аптеки", "geography": "Берлин", "revenue": 20.0}
+
+
+@pytest.fixture(scope="module")
+def index(sqlite_db, tmp_path_factory):
+    return BuyerVectorIndex.build(sqlite_db, str(tmp_path_factory.mktemp("vectors")), hash_dims=16, chunk_size=128)
+
+
+@pytest.fixture(scope="module")
+def profiles(sqlite_db):
+    buyers = BuyerDataLoader(sqlite_db).load_buyers()
+    return dict(zip(buyers["company_id"], buyers.to_dict("records")))
+
+
+def test_similar_to_seller_is_exact_top_k(index):
+    query = index.encoder.encode_seller(SELLER)
+    scores = query @ np.asarray(index.vectors)
+    found = index.similar_to_seller(SELLER, k=10)
+    assert [s for _, s in found] == pytest.approx(np.sort(scores)[::-1][:10].tolist(), rel=1e-5)
+    buyer_id = found[0][0]
+    assert buyer_id not in [b for b, _ in index.similar_to_buyer(buyer_id, k=5)]
+
+
+def test_personalization_uses_vectors(index, profiles):
+    simulator = BuyerResponseSimulator(vector_index=index)
+    seller_vector = simulator._seller_vector(SELLER)
+    for buyer_id, _ in index.similar_to_seller(SELLER, k=5):
+        score = simulator._calculate_personalization_score(profiles[buyer_id], SELLER, buyer_id, seller_vector)
+        assert score == pytest.approx(float(index.vector(buyer_id) @ seller_vector))
+        assert 0.0 < score <= 1.0
+    # Покупателя нет в индексе — точное совпадение отрасли и города
+    outsider = {"industry_focus": ["Аптеки"], "target_geography": ["Москва"]}
+    assert simulator._calculate_personalization_score(outsider, SELLER, "missing", seller_vector) == 0.5
+
+
+def test_simulation_with_index(index, profiles):
+    ranked = [{"company_id": b, "rank": i} for i, (b, _) in enumerate(index.similar_to_seller(SELLER, k=12), 1)]
+    simulator = BuyerResponseSimulator(rng=np.random.default_rng(0), vector_index=index)
+    probs = simulator._nda_probabilities(ranked, profiles, SELLER)
+    plain = BuyerResponseSimulator()._nda_probabilities(ranked, profiles, SELLER)
+    assert probs.shape == plain.shape and ((probs > 0) & (probs <= 0.95)).all()
+    first = simulator.simulate(ranked, profiles, SELLER)
+    simulator.rng = np.random.default_rng(0)
+    assert simulator.simulate(ranked, profiles, SELLER) == first
@@ -0,0 +1,371 @@
+import heapq
+from typing import List, Dict, Optional, Tuple, Any
+
+import numpy as np
+
+
+class EventScheduler:
+    """
+    Дискретно-событийный планировщик на куче: события извлекаются
+    в порядке времени, при равном времени — в порядке добавления.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str, Any]] = []
+        self._seq = 0
+
+    def schedule(self, time: float, kind: str, payload: Any = None):
+        heapq.heappush(self._heap, (time, self._seq, kind, payload))
+        self._seq += 1
+
+    def pop(self) -> Tuple[float, str, Any]:
+        time, _, kind, payload = heapq.heappop(self._heap)
+        return time, kind, payload
+
+    def clear(self):
+        self._heap.clear()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+class BidBook:
+    """
+    История ставок в массивах numpy с амортизированным ростом ёмкости.
+    Хранит индекс участника, а не словарь на каждую ставку.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.size = 0
+        self._time = np.empty(capacity, dtype=np.float64)
+        self._round = np.empty(capacity, dtype=np.int32)
+        self._bidder = np.empty(capacity, dtype=np.int32)
+        self._amount = np.empty(capacity, dtype=np.float64)
+        self._binding = np.empty(capacity, dtype=bool)
+
+    def _reserve(self, extra: int):
+        needed = self.size + extra
+        capacity = len(self._time)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("_time", "_round", "_bidder", "_amount", "_binding"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def append(self, time: float, round_no: int, bidders: np.ndarray, amounts, binding: bool = True):
+        """Добавляет пачку ставок одного раунда (amounts — массив или одно число)."""
+        bidders = np.atleast_1d(bidders)
+        n = len(bidders)
+        if n == 0:
+            return
+        self._reserve(n)
+        end = self.size + n
+        self._time[self.size:end] = time
+        self._round[self.size:end] = round_no
+        self._bidder[self.size:end] = bidders
+        self._amount[self.size:end] = amounts
+        self._binding[self.size:end] = binding
+        self.size = end
+
+    def to_records(self, bidder_ids: List[Any]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "time": float(self._time[i]),
+                "round": int(self._round[i]),
+                "company_id": bidder_ids[self._bidder[i]],
+                "amount": round(float(self._amount[i]), 3),
+                "binding": bool(self._binding[i])
+            }
+            for i in range(self.size)
+        ]
+
+
+class AuctionEngine:
+    """
+    Аукционный движок с несколькими форматами торгов:
+    - "english" — открытый английский аукцион с шагом цены по раундам;
+    - "first_price" — закрытый аукцион первой цены;
+    - "second_price" — закрытый аукцион второй цены (Викри);
+    - "two_round" — индикативный раунд, шорт-лист и обязывающий раунд.
+
+    Частные оценки участников выводятся из профиля покупателя
+    и ограничиваются его financial_capacity.
+    """
+
+    FORMATS = ("english", "first_price", "second_price", "two_round")
+
+    # Средняя премия к базовой цене по типу покупателя (логарифмическая шкала)
+    TYPE_PREMIUM = {
+        "strategic": 0.12,
+        "financial": 0.06,
+        "entrepreneur": 0.03
+    }
+
+    def __init__(self, auction_format: str = "english", increment: float = 0.02,
+                 reserve_ratio: float = 1.0, valuation_sigma: float = 0.10,
+                 shortlist_size: int = 4, round_duration: float = 1.0,
+                 indicative_deadline: float = 10.0, binding_deadline: float = 20.0,
+                 max_rounds: int = 500, rng: Optional[np.random.Generator] = None):
+        """
+        :param auction_format: Формат торгов (см. FORMATS)
+        :param increment: Шаг цены английского аукциона (доля базовой цены)
+        :param reserve_ratio: Резервная цена как доля базовой цены
+        :param valuation_sigma: Разброс частных оценок (логнормальный)
+        :param shortlist_size: Размер шорт-листа двухраундового аукциона
+        :param round_duration: Длительность раунда английского аукциона (дни)
+        :param indicative_deadline: Дедлайн закрытых/индикативных ставок (дни)
+        :param binding_deadline: Дедлайн обязывающих ставок (дни)
+        :param max_rounds: Максимум раундов английского аукциона
+        :param rng: Генератор numpy (по умолчанию — новый np.random.default_rng())
+        """
+        if auction_format not in self.FORMATS:
+            raise ValueError(f"Неизвестный формат аукциона: {auction_format}")
+        self.auction_format = auction_format
+        self.increment = increment
+        self.reserve_ratio = reserve_ratio
+        self.valuation_sigma = valuation_sigma
+        self.shortlist_size = shortlist_size
+        self.round_duration = round_duration
+        self.indicative_deadline = indicative_deadline
+        self.binding_deadline = binding_deadline
+        self.max_rounds = max_rounds
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    # === Частные оценки ===
+
+    def bidder_parameters(self, bidders: List[Dict], buyer_profiles: Optional[Dict] = None,
+                          seller_profile: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Рассчитывает параметры частных оценок участников.
+
+        :param bidders: Участники торгов (словари с "company_id")
+        :param buyer_profiles: Профили покупателей по company_id (по умолчанию — сами участники)
+        :param seller_profile: Профиль продавца для учёта соответствия фокусу
+        :return: (средняя лог-премия, бюджет в млн $) — массивы длины len(bidders)
+        """
+        mu = np.zeros(len(bidders), dtype=np.float64)
+        budget = np.full(len(bidders), np.inf)
+        for i, bidder in enumerate(bidders):
+            profile = (buyer_profiles or {}).get(bidder.get("company_id")) or bidder
+            premium = self.TYPE_PREMIUM.get(profile.get("type"), 0.03)
+            if seller_profile:
+                if seller_profile.get("industry") in (profile.get("industry_focus") or []):
+                    premium += 0.04
+                if seller_profile.get("geography") in (profile.get("target_geography") or []):
+                    premium += 0.04
+            mu[i] = premium
+            capacity = profile.get("financial_capacity")
+            if capacity is not None and capacity == capacity and capacity > 0:
+                budget[i] = capacity
+        return mu, budget
+
+    def draw_valuations(self, base_price: float, mu: np.ndarray, budget: np.ndarray, size: int = 1) -> np.ndarray:
+        """
+        Генерирует частные оценки: матрица size × число участников.
+        Оценка не превышает бюджет участника.
+        """
+        z = self.rng.standard_normal((size, len(mu)))
+        values = base_price * np.exp(mu + self.valuation_sigma * z)
+        return np.minimum(values, budget)
+
+    # === Пакетный режим ===
+
+    def clearing_prices(self, base_price: float, valuations: np.ndarray) -> np.ndarray:
+        """
+        Цены закрытия для пакета аукционов без истории ставок.
+
+        :param base_price: Базовая цена
+        :param valuations: Матрица оценок (аукционы × участники), NaN — участник отсутствует
+        :return: Массив финальных цен (NaN — сделка не состоялась)
+        """
+        valuations = np.atleast_2d(np.asarray(valuations, dtype=np.float64))
+        n_auctions, n_bidders = valuations.shape
+        reserve = base_price * self.reserve_ratio
+        prices = np.full(n_auctions, np.nan)
+        if n_bidders == 0:
+            return prices
+
+        valid = ~np.isnan(valuations) & (valuations >= reserve)
+        masked = np.where(valid, valuations, -np.inf)
+        k = valid.sum(axis=1)
+
+        if self.auction_format == "two_round":
+            noise = self.rng.normal(0.05, 0.05, size=masked.shape)
+            indicative = np.where(valid, masked * (1.0 + noise), -np.inf)
+            s = min(self.shortlist_size, n_bidders)
+            top = np.argpartition(-indicative, s - 1, axis=1)[:, :s]
+            short_vals = np.take_along_axis(masked, top, axis=1)
+            n_short = np.isfinite(short_vals).sum(axis=1)
+            v1 = np.where(n_short > 0, short_vals.max(axis=1), reserve)
+            shade = np.where(n_short > 0, (n_short - 1) / np.maximum(n_short, 1), 0.0)
+            prices = np.where(n_short > 0, reserve + (v1 - reserve) * shade, np.nan)
+            return prices
+
+        if n_bidders >= 2:
+            top2 = -np.partition(-masked, 1, axis=1)[:, :2]
+            v1, v2 = top2[:, 0], top2[:, 1]
+        else:
+            v1, v2 = masked[:, 0], np.full(n_auctions, -np.inf)
+
+        if self.auction_format == "english":
+            step = base_price * self.increment
+            levels = np.floor((np.where(k >= 2, v2, reserve) - reserve) / step) + 1
+            levels = np.minimum(levels, self.max_rounds - 1)
+            p_next = reserve + step * levels
+            p_prev = p_next - step
+            competitive = np.where(v1 >= p_next, p_next, p_prev)
+            prices = np.where(k >= 2, competitive, prices)
+        elif self.auction_format == "second_price":
+            prices = np.where(k >= 2, v2, prices)
+        else:
+            shade = (k - 1) / np.maximum(k, 1)
+            prices = np.where(k >= 2, reserve + (v1 - reserve) * shade, prices)
+
+        return np.where(k == 1, reserve, prices)
+
+    # === Событийный режим ===
+
+    def run(self, base_price: float, interested_buyers: List[Dict],
+            buyer_profiles: Optional[Dict] = None, seller_profile: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        Проводит один аукцион с полной историей ставок.
+
+        :param base_price: Базовая (оценочная) цена
+        :param interested_buyers: Ответы покупателей; участвуют запросившие NDA
+        :param buyer_profiles: Профили покупателей по company_id
+        :param seller_profile: Профиль продавца
+        :return: Итог аукциона в формате AuctionSimulator.simulate плюс история ставок
+        """
+        from .auction_simulator import AuctionSimulator
+
+        bidders = [b for b in interested_buyers if b.get("response") == "NDA_requested"]
+        nda_count = len(bidders)
+        bidder_ids = [b.get("company_id") for b in bidders]
+        mu, budget = self.bidder_parameters(bidders, buyer_profiles, seller_profile)
+        valuations = self.draw_valuations(base_price, mu, budget)[0]
+
+        book = BidBook()
+        reserve = base_price * self.reserve_ratio
+        scheduler = EventScheduler()
+        if self.auction_format == "english":
+            winner, price = self._run_english(scheduler, book, reserve, base_price, valuations)
+        elif self.auction_format == "two_round":
+            winner, price = self._run_two_round(scheduler, book, reserve, valuations)
+        else:
+            winner, price = self._run_sealed(scheduler, book, reserve, valuations)
+
+        final_price = price if winner is not None else base_price
+        competition_level, message = AuctionSimulator.competition_level(nda_count)
+        return {
+            "nda_count": nda_count,
+            "final_price": final_price,
+            "multiplier": round(final_price / base_price, 2) if base_price else 1.0,
+            "competition_level": competition_level,
+            "message": message,
+            "format": self.auction_format,
+            "winner": bidder_ids[winner] if winner is not None else None,
+            "bid_history": book.to_records(bidder_ids)
+        }
+
+    def _run_english(self, scheduler: EventScheduler, book: BidBook, reserve: float,
+                     base_price: float, valuations: np.ndarray) -> Tuple[Optional[int], float]:
+        step = base_price * self.increment
+        scheduler.schedule(0.0, "round", (0, reserve, None))
+        scheduler.schedule(self.max_rounds * self.round_duration, "deadline")
+        winner, price = None, reserve
+
+        while scheduler:
+            time, kind, payload = scheduler.pop()
+            if kind == "deadline":
+                # Раунды исчерпаны: побеждает участник с максимальной оценкой по текущей цене
+                if price is not None and len(valuations):
+                    active = np.flatnonzero(valuations >= price)
+                    if len(active):
+                        winner = int(active[np.argmax(valuations[active])])
+                break
+
+            round_no, price, prev_active = payload
+            active = np.flatnonzero(valuations >= price)
+            if len(active) >= 2:
+                book.append(time, round_no, active, price)
+                scheduler.schedule(time + self.round_duration, "round", (round_no + 1, price + step, active))
+            elif len(active) == 1:
+                book.append(time, round_no, active, price)
+                winner = int(active[0])
+                break
+            else:
+                # Все оставшиеся вышли одновременно — побеждает старшая оценка по прошлой цене
+                if prev_active is not None:
+                    winner = int(prev_active[np.argmax(valuations[prev_active])])
+                    price -= step
+                break
+
+        scheduler.clear()
+        return winner, price
+
+    def _collect_sealed(self, scheduler: EventScheduler, book: BidBook, participants: np.ndarray,
+                        bids: np.ndarray, start: float, deadline: float, round_no: int,
+                        binding: bool) -> Tuple[np.ndarray, np.ndarray]:
+        """Планирует подачу закрытых ставок до дедлайна и собирает поданные к нему ставки."""
+        times = self.rng.uniform(start, deadline, size=len(participants))
+        for idx, t, bid in zip(participants, times, bids):
+            scheduler.schedule(float(t), "bid", (int(idx), float(bid)))
+        scheduler.schedule(deadline, "deadline")
+
+        received_idx, received_bids = [], []
+        while scheduler:
+            time, kind, payload = scheduler.pop()
+            if kind == "deadline":
+                break
+            idx, bid = payload
+            book.append(time, round_no, idx, bid, binding=binding)
+            received_idx.append(idx)
+            received_bids.append(bid)
+        scheduler.clear()
+        return np.asarray(received_idx, dtype=np.int64), np.asarray(received_bids, dtype=np.float64)
+
+    def _run_sealed(self, scheduler: EventScheduler, book: BidBook, reserve: float,
+                    valuations: np.ndarray) -> Tuple[Optional[int], float]:
+        participants = np.flatnonzero(valuations >= reserve)
+        k = len(participants)
+        if k == 0:
+            return None, reserve
+        values = valuations[participants]
+        if self.auction_format == "first_price":
+            bids = reserve + (values - reserve) * (k - 1) / k
+        else:
+            bids = values
+        idx, received = self._collect_sealed(scheduler, book, participants, bids,
+                                             0.0, self.indicative_deadline, 0, True)
+        order = np.argsort(-received, kind="stable")
+        winner = int(idx[order[0]])
+        if self.auction_format == "first_price":
+            price = float(received[order[0]])
+        else:
+            price = float(received[order[1]]) if k >= 2 else reserve
+        return winner, max(price, reserve)
+
+    def _run_two_round(self, scheduler: EventScheduler, book: BidBook, reserve: float,
+                       valuations: np.ndarray) -> Tuple[Optional[int], float]:
+        participants = np.flatnonzero(valuations >= reserve)
+        if len(participants) == 0:
+            return None, reserve
+
+        # Раунд 1: необязывающие индикативные предложения
+        indicative = valuations[participants] * (1.0 + self.rng.normal(0.05, 0.05, size=len(participants)))
+        idx, received = self._collect_sealed(scheduler, book, participants, indicative,
+                                             0.0, self.indicative_deadline, 0, False)
+        shortlist = idx[np.argsort(-received, kind="stable")[:self.shortlist_size]]
+
+        # Раунд 2: обязывающие предложения шорт-листа (аукцион первой цены)
+        k = len(shortlist)
+        values = valuations[shortlist]
+        bids = reserve + (values - reserve) * (k - 1) / k
+        idx, received = self._collect_sealed(scheduler, book, shortlist, bids,
+                                             self.indicative_deadline, self.binding_deadline, 1, True)
+        best = int(np.argmax(received))
+        return int(idx[best]), max(float(received[best]), reserve)
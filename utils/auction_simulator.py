@@ -1,5 +1,6 @@
-import random
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+
+import numpy as np
 
 class AuctionSimulator:
     """
@@ -8,34 +9,99 @@ class AuctionSimulator:
     - множитель,
     - уровень конкуренции.
     Не содержит print(), time.sleep() или Streamlit-кода.
+
+    По умолчанию множитель выбирается из фиксированного диапазона по числу NDA.
+    Если задан auction_format, торги проводит AuctionEngine
+    (английский, первой/второй цены, двухраундовый аукцион).
     """
 
+    def __init__(self, auction_format: Optional[str] = None, rng: Optional[np.random.Generator] = None,
+                 **engine_options):
+        """
+        :param auction_format: Формат торгов AuctionEngine (None — упрощённая модель)
+        :param rng: Генератор numpy (по умолчанию — новый np.random.default_rng())
+        :param engine_options: Дополнительные параметры AuctionEngine
+        """
+        self.auction_format = auction_format
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.engine_options = engine_options
+
+    @staticmethod
+    def competition_level(nda_count: int) -> Tuple[str, str]:
+        """Определяет уровень конкуренции и сообщение для UI по числу NDA."""
+        if nda_count >= 4:
+            return "high", "Высокая конкуренция: 4+ покупателей"
+        elif nda_count >= 2:
+            return "medium", "Конкуренция: 2–3 покупателя"
+        elif nda_count == 1:
+            return "low", "Один заинтересованный покупатель"
+        else:
+            return "none", "Нет заинтересованных покупателей"
+
+    @staticmethod
+    def reveal_events(base_price: float, nda_count: int, final_price: float, multiplier: float,
+                      delay: float = 1.0) -> List[Dict]:
+        """
+        Формирует сценарий пошагового показа аукциона для UI.
+
+        :param base_price: Начальная цена
+        :param nda_count: Число покупателей, запросивших NDA
+        :param final_price: Финальная цена
+        :param multiplier: Итоговый множитель
+        :param delay: Пауза между шагами (сек.)
+        :return: Список событий {"at": секунда показа, "level": info/success/warning/error, "text": ...}
+        """
+        steps = [("info", f"Старт аукциона! Начальная цена: ${base_price:.1f} млн")]
+        if nda_count == 0:
+            steps.append(("error", "Нет заинтересованных покупателей."))
+        else:
+            steps.append(("success", f"{nda_count} покупателей запросили NDA!"))
+            steps.append(("warning", f"Уже {nda_count} изучают досье — дедлайн через 10 дней!"))
+            if nda_count >= 2:
+                steps.append(("warning", "Появился второй покупатель — начинается конкуренция!"))
+            if nda_count >= 4:
+                steps.append(("warning", "Цена растёт — 3+ инвестора в сделке!"))
+            steps.append((
+                "success",
+                f"**Финальная цена**: ${final_price:.1f} млн (**+{(multiplier - 1) * 100:.0f}%**)"
+            ))
+        return [{"at": i * delay, "level": level, "text": text} for i, (level, text) in enumerate(steps)]
+
     def calculate_multiplier(self, nda_count: int) -> float:
         if nda_count <= 1:
             return 1.0
         elif nda_count <= 3:
-            return round(random.uniform(1.10, 1.25), 2)
+            return round(self.rng.uniform(1.10, 1.25), 2)
         else:
-            return round(random.uniform(1.30, 1.40), 2)
+            return round(self.rng.uniform(1.30, 1.40), 2)
+
+    @staticmethod
+    def expected_multiplier(nda_distribution: np.ndarray) -> np.ndarray:
+        """
+        Математическое ожидание множителя calculate_multiplier по распределению числа NDA.
+
+        :param nda_distribution: Вероятности 0, 1, 2, ... NDA по последней оси
+        :return: Ожидаемый множитель (по остальным осям)
+        """
+        dist = np.asarray(nda_distribution, dtype=float)
+        counts = np.arange(dist.shape[-1])
+        # Средние равномерных диапазонов (округление до 0.01 симметрично и среднее не меняет)
+        multipliers = np.select([counts <= 1, counts <= 3], [1.0, (1.10 + 1.25) / 2], default=(1.30 + 1.40) / 2)
+        return dist @ multipliers
+
+    def simulate(self, base_price: float, interested_buyers: List[Dict],
+                 buyer_profiles: Optional[Dict] = None, seller_profile: Optional[Dict] = None) -> dict:
+        if self.auction_format:
+            from .auction_engine import AuctionEngine
+            engine = AuctionEngine(self.auction_format, rng=self.rng, **self.engine_options)
+            return engine.run(base_price, interested_buyers, buyer_profiles, seller_profile)
 
-    def simulate(self, base_price: float, interested_buyers: List[Dict]) -> dict:
         nda_count = sum(1 for b in interested_buyers if b.get("response") == "NDA_requested")
         multiplier = self.calculate_multiplier(nda_count)
         final_price = base_price * multiplier
 
         # Определяем уровень конкуренции для UI
-        if nda_count >= 4:
-            competition_level = "high"
-            message = "Высокая конкуренция: 4+ покупателей"
-        elif nda_count >= 2:
-            competition_level = "medium"
-            message = "Конкуренция: 2–3 покупателя"
-        elif nda_count == 1:
-            competition_level = "low"
-            message = "Один заинтересованный покупатель"
-        else:
-            competition_level = "none"
-            message = "Нет заинтересованных покупателей"
+        competition_level, message = self.competition_level(nda_count)
 
         return {
             "nda_count": nda_count,
@@ -43,4 +109,4 @@ class AuctionSimulator:
             "multiplier": multiplier,
             "competition_level": competition_level,
             "message": message
-        }
\ No newline at end of file
+        }
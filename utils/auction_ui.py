@@ -1,30 +1,53 @@
-import streamlit as st
-import time
-
-def run_auction_ui(base_price: float, nda_count: int):
-    placeholder = st.empty()
-    delay = 1.0
-
-    placeholder.info(f"Старт аукциона! Начальная цена: ${base_price:.1f} млн")
-    time.sleep(delay)
-
-    if nda_count == 0:
-        placeholder.error("Нет заинтересованных покупателей.")
-        return base_price
+import html
+import re
+from typing import List, Dict
 
-    placeholder.success(f"{nda_count} покупателей запросили NDA!")
-    time.sleep(delay)
-
-    placeholder.warning(f"Уже {nda_count} изучают досье — дедлайн через 10 дней!")
-    time.sleep(delay)
-
-    if nda_count >= 2:
-        placeholder.warning("Появился второй покупатель — начинается конкуренция!")
-        time.sleep(delay)
-    if nda_count >= 4:
-        placeholder.warning("Цена растёт — 3+ инвестора в сделке!")
-        time.sleep(delay)
+import streamlit as st
 
+from .auction_simulator import AuctionSimulator
+
+# Непрозрачные цвета в духе st.info/st.success/st.warning/st.error:
+# каждое следующее сообщение перекрывает предыдущее
+_LEVEL_COLORS = {
+    "info": ("#e8f2fc", "#0c4a7a"),
+    "success": ("#e6f4ea", "#177233"),
+    "warning": ("#fffbe5", "#926c05"),
+    "error": ("#fde8e8", "#7d353b"),
+}
+
+_STYLE = """
+<style>
+@keyframes ma-auction-reveal { from { opacity: 0; } to { opacity: 1; } }
+.ma-auction { position: relative; height: 3.4rem; margin-bottom: 1rem; }
+.ma-auction-step {
+    position: absolute; inset: 0; padding: 0.9rem 1rem; border-radius: 0.5rem;
+    opacity: 0; animation: ma-auction-reveal 0.3s ease-out forwards;
+}
+</style>
+"""
+
+
+def _render_text(text: str) -> str:
+    """Экранирует текст и переводит **жирный** markdown в <b>."""
+    return re.sub(r"\*\*(.+?)\*\*", r"<b>\1</b>", html.escape(text))
+
+
+def render_auction_events(events: List[Dict]) -> str:
+    """
+    Строит HTML/CSS-анимацию по заранее рассчитанному списку событий.
+    Показ идёт на стороне браузера: сервер не ждёт между шагами.
+    """
+    steps = []
+    for event in events:
+        background, color = _LEVEL_COLORS.get(event["level"], _LEVEL_COLORS["info"])
+        steps.append(
+            f'<div class="ma-auction-step" style="animation-delay: {event["at"]:.2f}s; '
+            f'background: {background}; color: {color};">{_render_text(event["text"])}</div>'
+        )
+    return _STYLE + '<div class="ma-auction">' + "".join(steps) + "</div>"
+
+
+def run_auction_ui(base_price: float, nda_count: int, delay: float = 1.0):
     if nda_count <= 1:
         multiplier = 1.0
     elif nda_count <= 3:
@@ -33,5 +56,7 @@ def run_auction_ui(base_price: float, nda_count: int):
         multiplier = 1.35
 
     final_price = base_price * multiplier
-    placeholder.success(f"**Финальная цена**: ${final_price:.1f} млн (**+{(multiplier - 1) * 100:.0f}%**)")
-    return final_price
\ No newline at end of file
+    events = AuctionSimulator.reveal_events(base_price, nda_count, final_price, multiplier, delay=delay)
+    st.markdown(render_auction_events(events), unsafe_allow_html=True)
+
+    return base_price if nda_count == 0 else final_price
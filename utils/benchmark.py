@@ -0,0 +1,243 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Any
+
+import numpy as np
+
+SCALE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+# Как в исходном наборе: 150 покупателей, 70 сделок, 8 продавцов
+DEALS_PER_BUYER = 70 / 150
+
+# Этапы на DataFrame со списками и iterrows: время растёт построчно, у каждого есть векторный вариант *_compact
+ROWWISE_STAGES = ("load_buyers", "ranker_fit", "ranker_rank", "graph_build")
+
+BENCH_SELLER = {
+    "industry": "Стоматологические клиники",
+    "geography": "Берлин",
+    "revenue": 10.0,
+    "ebitda": 2.0,
+    "assets": "Современное оборудование и лояльная клиентская база",
+    "num_customers": 5000,
+    "usp": "Высокая маржинальность и стабильный кэш-флоу"
+}
+
+
+def parse_scale(value: str) -> int:
+    """'150' → 150, '10k' → 10000, '1M' → 1000000."""
+    value = value.strip().lower()
+    if value and value[-1] in SCALE_SUFFIXES:
+        return int(float(value[:-1]) * SCALE_SUFFIXES[value[-1]])
+    return int(value)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_database(db_path: str, num_buyers: int, seed: int = 42) -> float:
+    """
+    Генерирует базу заданного масштаба через MADatasetGenerator (потоковый векторный режим).
+
+    :return: Время генерации и загрузки (сек.)
+    """
+    from .df_gen import MADatasetGenerator
+
+    num_deals = max(1, int(num_buyers * DEALS_PER_BUYER))
+
+    start = time.perf_counter()
+    generator = MADatasetGenerator(seed=seed)
+    generator.set_config(num_sellers=8, num_buyers=num_buyers, num_deals=num_deals)
+    generator.stream_to_sqlite(db_path, replace=True)
+    return time.perf_counter() - start
+
+
+def measure(func: Callable[[], Any], repeat: int = 1, track_memory: bool = True) -> Dict[str, Any]:
+    """
+    Замеряет функцию: лучшее время из repeat запусков без трассировки,
+    затем отдельный запуск под tracemalloc для пикового объёма памяти
+    и объёма, который занимает возвращённый результат (retained_mb).
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    peak_mb = retained_mb = None
+    if track_memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            # Результат держится, пока снимаются показания: retained_mb — память, занятая им
+            held = [func()]
+            gc.collect()
+            current, peak = tracemalloc.get_traced_memory()
+            peak_mb, retained_mb = peak / 2 ** 20, current / 2 ** 20
+            held.clear()
+        finally:
+            tracemalloc.stop()
+    return {"seconds": best, "peak_mb": peak_mb, "retained_mb": retained_mb}
+
+
+def benchmark_scale(db_path: str, repeat: int = 1, track_memory: bool = True,
+                    rowwise_limit: Optional[int] = 200_000) -> List[Dict[str, Any]]:
+    """
+    Замеряет все этапы конвейера на готовой базе.
+
+    :param rowwise_limit: Число покупателей, выше которого построчные этапы (DataFrame со списками,
+                          iterrows) не замеряются: на миллионах строк они идут часами (None — всегда)
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from .buyer_store import CompactBuyers
+    from .data_loader import BuyerDataLoader
+    from .ranking import BuyerRanker
+    from .valuation import BusinessValuationEngine
+    from .company_graph import CompanyConnectionGraph
+    from .buyer_response_simulator import BuyerResponseSimulator
+    from .auction_simulator import AuctionSimulator
+
+    # Подготовка — только векторными путями, чтобы не зависеть от построчных этапов
+    seller = dict(BENCH_SELLER)
+    compact_ranker = BuyerRanker(db_path, compact=True, seed=0)
+    compact_ranker.fit()
+    ranked = compact_ranker.rank(seller, top_k=50)
+    for i, b in enumerate(ranked, 1):
+        b["rank"] = i
+    profiles = {b["company_id"]: compact_ranker.buyers[b["company_id"]] for b in ranked}
+    graph = CompanyConnectionGraph(db_path, compact=True).build(seller)
+    responses = BuyerResponseSimulator(rng=np.random.default_rng(0)).simulate(ranked, profiles, seller)
+    rowwise = rowwise_limit is None or len(compact_ranker.buyers) <= rowwise_limit
+
+    def plot():
+        fig = graph.get_plot_figure(top_n=8)
+        if fig:
+            plt.close(fig)
+
+    def auction():
+        AuctionSimulator(rng=np.random.default_rng(0)).simulate(10.0, responses)
+        AuctionSimulator("english", rng=np.random.default_rng(0)).simulate(10.0, responses, profiles, seller)
+
+    ranker = None
+    if rowwise:
+        ranker = BuyerRanker(db_path, seed=0)
+        ranker.fit()
+
+    stages = {
+        "load_buyers": lambda: BuyerDataLoader(db_path).load_buyers(),
+        "load_buyers_compact": lambda: CompactBuyers.from_db(db_path),
+        "ranker_fit": lambda: BuyerRanker(db_path).fit(),
+        "ranker_fit_compact": lambda: BuyerRanker(db_path, compact=True).fit(),
+        "ranker_rank": lambda: ranker.rank(seller, top_k=10),
+        "ranker_rank_compact": lambda: compact_ranker.rank(seller, top_k=10),
+        "valuation": lambda: BusinessValuationEngine(db_path).estimate(seller),
+        "graph_build": lambda: CompanyConnectionGraph(db_path).build(seller),
+        "graph_build_compact": lambda: CompanyConnectionGraph(db_path, compact=True).build(seller),
+        "graph_plot": plot,
+        "response_simulation": lambda: BuyerResponseSimulator(rng=np.random.default_rng(0)).simulate_many(
+            ranked, profiles, seller, n_trials=10000
+        ),
+        "auction_simulation": auction,
+    }
+    if not rowwise:
+        stages = {stage: func for stage, func in stages.items() if stage not in ROWWISE_STAGES}
+    results = []
+    for stage, func in stages.items():
+        results.append({"stage": stage, **measure(func, repeat=repeat, track_memory=track_memory)})
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+            threshold: float, min_seconds: float = 0.01) -> List[Dict[str, Any]]:
+    """
+    Ищет регрессии относительно базового прогона.
+    Время считается регрессией, если выросло больше чем на threshold и на min_seconds.
+    """
+    base = {(r["scale"], r["stage"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        old = base.get((r["scale"], r["stage"]))
+        if old is None:
+            continue
+        for metric, floor in (("seconds", min_seconds), ("peak_mb", 1.0), ("retained_mb", 1.0)):
+            new_value, old_value = r.get(metric), old.get(metric)
+            if new_value is None or old_value is None:
+                continue
+            if new_value > old_value * (1 + threshold) and new_value - old_value > floor:
+                regressions.append({
+                    "scale": r["scale"], "stage": r["stage"], "metric": metric,
+                    "baseline": old_value, "current": new_value,
+                    "change": new_value / old_value - 1 if old_value else float("inf")
+                })
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк этапов конвейера на синтетических данных разного масштаба")
+    parser.add_argument("--scales", default="150,10k", help="Числа покупателей через запятую (150,10k,100k,1M)")
+    parser.add_argument("--workdir", default=".bench", help="Каталог для сгенерированных баз")
+    parser.add_argument("--output", default="bench_results.json", help="Файл результатов (JSON)")
+    parser.add_argument("--baseline", default=None, help="Результаты прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Допустимый рост времени/памяти (доля)")
+    parser.add_argument("--repeat", type=int, default=1, help="Повторов замера времени (берётся лучший)")
+    parser.add_argument("--no-memory", action="store_true", help="Не замерять пиковую память")
+    parser.add_argument("--rebuild", action="store_true", help="Пересоздать базы, даже если они есть")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rowwise-limit", type=int, default=200_000,
+                        help="Выше этого числа покупателей построчные этапы не замеряются (0 — всегда)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = []
+    for scale in (parse_scale(s) for s in args.scales.split(",")):
+        db_path = os.path.join(args.workdir, f"bench_{scale}.db")
+        if args.rebuild or not os.path.exists(db_path):
+            seconds = build_database(db_path, scale, seed=args.seed)
+            results.append({"scale": scale, "stage": "generate_database", "seconds": seconds, "peak_mb": None,
+                            "retained_mb": None})
+        for row in benchmark_scale(db_path, repeat=args.repeat, track_memory=not args.no_memory,
+                                   rowwise_limit=args.rowwise_limit or None):
+            results.append({"scale": scale, **row})
+            peak = f"{row['peak_mb']:.1f} MB" if row["peak_mb"] is not None else "—"
+            retained = f"{row['retained_mb']:.1f} MB" if row["retained_mb"] is not None else "—"
+            print(f"{scale:>9} {row['stage']:<22} {row['seconds']:9.4f} s  {peak:>10}  {retained:>10}")
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        report["regressions"] = compare(results, baseline, args.threshold)
+        for reg in report["regressions"]:
+            print(f"РЕГРЕССИЯ: {reg['scale']} {reg['stage']} {reg['metric']}: "
+                  f"{reg['baseline']:.4f} → {reg['current']:.4f} ({reg['change']:+.0%})")
+        exit_code = 1 if report["regressions"] else 0
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
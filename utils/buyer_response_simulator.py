@@ -1,5 +1,8 @@
-import random
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from .buyer_vectors import BuyerVectorIndex
 
 
 class BuyerResponseSimulator:
@@ -8,26 +11,49 @@ class BuyerResponseSimulator:
     на основе их профиля, позиции в ранжировании и соответствия профилю продавца.
     """
 
-    def __init__(self, base_nda_probs: Dict[int, float] = None):
+    def __init__(self, base_nda_probs: Dict[int, float] = None, rng: Optional[np.random.Generator] = None,
+                 vector_index: Optional[BuyerVectorIndex] = None):
         """
         Инициализация симулятора.
 
         :param base_nda_probs: Базовые вероятности NDA по рангам (по умолчанию — встроенные)
+        :param rng: Генератор numpy (по умолчанию — новый np.random.default_rng())
+        :param vector_index: Индекс векторов покупателей: персонализация считается как близость
+                             векторов покупателя и продавца, а не по точному совпадению отрасли и города
         """
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.vector_index = vector_index
         self.base_nda_probs = base_nda_probs or {
             'top': 0.70,   # rank <= 3
             'mid': 0.30,   # rank <= 8
             'low': 0.05    # rank > 8
         }
 
-    def _calculate_personalization_score(self, buyer_profile: Dict, seller_profile: Dict) -> float:
+    def _seller_vector(self, seller_profile: Dict) -> Optional[np.ndarray]:
+        """Вектор продавца в пространстве индекса (None — индекса нет)."""
+        if self.vector_index is None:
+            return None
+        return self.vector_index.encoder.encode_seller(seller_profile)
+
+    def _calculate_personalization_score(self, buyer_profile: Dict, seller_profile: Dict,
+                                         buyer_id: Optional[str] = None,
+                                         seller_vector: Optional[np.ndarray] = None) -> float:
         """
         Рассчитывает степень соответствия профиля покупателя профилю продавца.
 
         :param buyer_profile: Профиль покупателя
         :param seller_profile: Профиль продавца
+        :param buyer_id: company_id покупателя для поиска в индексе векторов
+        :param seller_vector: Вектор продавца (_seller_vector); без него или без покупателя
+                              в индексе — точное совпадение отрасли и города
         :return: Оценка соответствия (0.0 – 1.0)
         """
+        if seller_vector is not None and buyer_id is not None:
+            try:
+                # Векторы неотрицательны и нормированы: скалярное произведение — косинус в [0, 1]
+                return float(min(1.0, self.vector_index.vector(buyer_id) @ seller_vector))
+            except KeyError:
+                pass
         score = 0.0
         if seller_profile["industry"] in buyer_profile["industry_focus"]:
             score += 1.0
@@ -49,6 +75,74 @@ class BuyerResponseSimulator:
         else:
             return self.base_nda_probs['low']
 
+    def _nda_probabilities(self, ranked_buyers: List[Dict], buyer_profiles: Dict, seller_profile: Dict) -> np.ndarray:
+        """
+        Рассчитывает вероятности запроса NDA для всех покупателей одним массивом.
+
+        :param ranked_buyers: Список покупателей с полями "rank", "company_id"
+        :param buyer_profiles: Словарь профилей покупателей по company_id
+        :param seller_profile: Профиль продавца
+        :return: Массив вероятностей NDA (0.0 для покупателей без профиля)
+        """
+        probs = np.zeros(len(ranked_buyers), dtype=np.float64)
+        seller_vector = self._seller_vector(seller_profile)
+        for i, buyer in enumerate(ranked_buyers):
+            buyer_profile = buyer_profiles.get(buyer["company_id"])
+            if not buyer_profile:
+                continue
+            p_nda = self._get_base_nda_probability(buyer["rank"])
+            personalization = self._calculate_personalization_score(buyer_profile, seller_profile,
+                                                                    buyer["company_id"], seller_vector)
+            probs[i] = min(0.95, p_nda + 0.2 * personalization)
+        return probs
+
+    def simulate_many(self, ranked_buyers: List[Dict], buyer_profiles: Dict, seller_profile: Dict,
+                      n_trials: int = 10000, rng: Optional[np.random.Generator] = None,
+                      chunk_size: int = 20000) -> Dict:
+        """
+        Монте-Карло симуляция откликов: n_trials независимых прогонов рассылки.
+
+        Вероятности NDA считаются один раз, случайные числа генерируются блоками
+        размером chunk_size × число покупателей, поэтому память не растёт с n_trials.
+
+        :param ranked_buyers: Список покупателей с полями "rank", "company_id"
+        :param buyer_profiles: Словарь профилей покупателей по company_id
+        :param seller_profile: Профиль продавца
+        :param n_trials: Количество прогонов
+        :param rng: Генератор numpy (по умолчанию — генератор симулятора)
+        :param chunk_size: Размер блока прогонов
+        :return: Словарь с распределением числа NDA и долями NDA по покупателям
+        """
+        if n_trials <= 0:
+            raise ValueError("n_trials должно быть положительным")
+        rng = rng if rng is not None else self.rng
+
+        probs = self._nda_probabilities(ranked_buyers, buyer_profiles, seller_profile)
+        n_buyers = len(probs)
+        count_hist = np.zeros(n_buyers + 1, dtype=np.int64)
+        nda_hits = np.zeros(n_buyers, dtype=np.int64)
+
+        done = 0
+        while done < n_trials:
+            size = min(chunk_size, n_trials - done)
+            nda = rng.random((size, n_buyers)) < probs
+            count_hist += np.bincount(nda.sum(axis=1), minlength=n_buyers + 1)
+            nda_hits += nda.sum(axis=0)
+            done += size
+
+        distribution = count_hist / n_trials
+        nda_rates = nda_hits / n_trials
+        return {
+            "n_trials": n_trials,
+            "nda_probabilities": probs,
+            "nda_count_distribution": distribution,
+            "expected_nda_count": float(np.dot(np.arange(n_buyers + 1), distribution)),
+            "buyers": [
+                {**buyer, "nda_rate": float(rate)}
+                for buyer, rate in zip(ranked_buyers, nda_rates)
+            ]
+        }
+
     def simulate(self, ranked_buyers: List[Dict], buyer_profiles: Dict, seller_profile: Dict) -> List[Dict]:
         """
         Симулирует ответы покупателей на предложение о сделке.
@@ -59,6 +153,7 @@ class BuyerResponseSimulator:
         :return: Список словарей с исходными данными и добавленным "response"
         """
         results = []
+        seller_vector = self._seller_vector(seller_profile)
 
         for buyer in ranked_buyers:
             rank = buyer["rank"]
@@ -73,11 +168,12 @@ class BuyerResponseSimulator:
                 p_nda = self._get_base_nda_probability(rank)
 
                 # Увеличение вероятности на основе персонализации
-                personalization = self._calculate_personalization_score(buyer_profile, seller_profile)
+                personalization = self._calculate_personalization_score(buyer_profile, seller_profile,
+                                                                        buyer_id, seller_vector)
                 p_nda = min(0.95, p_nda + 0.2 * personalization)
 
                 # Определяем ответ случайным образом
-                rand = random.random()
+                rand = self.rng.random()
                 if rand < p_nda:
                     response = "NDA_requested"
                 elif rand < p_nda + 0.2:
@@ -130,3 +226,8 @@ if __name__ == "__main__":
     responses = simulator.simulate(ranked_buyers, buyer_profiles, seller_profile)
     for b in responses:
         print(f"{b['rank']}. {b['name']} → {b['response']}")
+
+    stats = simulator.simulate_many(ranked_buyers, buyer_profiles, seller_profile, n_trials=100000)
+    print(f"Ожидаемое число NDA: {stats['expected_nda_count']:.2f}")
+    for b in stats["buyers"]:
+        print(f"{b['rank']}. {b['name']} → NDA в {b['nda_rate']:.1%} прогонов")
@@ -0,0 +1,293 @@
+import re
+from collections.abc import Mapping
+from typing import Dict, Any, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .buyer_vectors import INDUSTRIES, GEOGRAPHIES
+from .metrics import metrics
+from .storage import open_storage, list_text, parse_list
+
+BUYER_TYPES = ("strategic", "financial", "entrepreneur")
+
+_LIST_ITEM = re.compile(r"'([^']*)'")
+_ACQ_PAIR = re.compile(r"\{'industry': '([^']*)', 'geography': '([^']*)'\}")
+
+
+def _list_items(text: str) -> List[Any]:
+    """
+    Элементы списка из текста repr. Регулярное выражение верно только для канонического
+    repr (одинарные кавычки, без апострофов в значениях). Если длина канонического repr
+    найденного не совпадает с длиной текста (пропущены элементы в другой записи),
+    список разбирается parse_list — как в from_frame.
+    """
+    items = _LIST_ITEM.findall(text)
+    # repr: "[" + "'x', " на элемент без последней ", " + "]"
+    if len(text) == max(2, sum(map(len, items)) + 4 * len(items)):
+        return items
+    return parse_list(text)
+
+
+def _acquisition_pairs(value: Any) -> List[tuple]:
+    """Пары (отрасль, город) прошлых сделок; текст repr разбирается как в _list_items."""
+    if isinstance(value, str):
+        pairs = _ACQ_PAIR.findall(value)
+        # "{'industry': '', 'geography': ''}" — 33 символа, ", " между словарями, "[]"
+        if len(value) == max(2, sum(len(i) + len(g) for i, g in pairs) + 35 * len(pairs)):
+            return pairs
+    return [(a.get("industry"), a.get("geography")) for a in parse_list(value) if isinstance(a, dict)]
+
+
+class _Vocabulary:
+    """Словарь значений → код; коды отраслей и городов — номера битов в масках."""
+
+    def __init__(self, values: Sequence[str] = ()):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for value in values:
+            self.code(value)
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            if code >= 64:
+                raise ValueError("В словаре больше 64 значений — маска uint64 не помещается")
+            self.values.append(value)
+        return code
+
+    def mask(self, items) -> int:
+        result = 0
+        for item in items:
+            result |= 1 << self.code(item)
+        return result
+
+    def decode_mask(self, mask: int) -> List[str]:
+        return [value for i, value in enumerate(self.values) if mask >> i & 1]
+
+
+class CompactBuyers(Mapping):
+    """
+    Компактное колоночное представление таблицы buyers.
+
+    - тип покупателя — код uint8;
+    - industry_focus / target_geography — битовые маски uint64 по словарям отраслей и городов;
+    - past_acquisitions — CSR: массив смещений и плоские массивы кодов отрасли/города;
+    - числовые поля — float32;
+    - id — байтовые строки фиксированной ширины, названия — UTF-8 в одном буфере со смещениями
+      (без объектов Python на строку).
+
+    Реализует Mapping company_id → профиль, поэтому подходит везде, где ожидаются
+    buyer_profiles (симуляторы, аукцион, письма): профиль собирается при обращении.
+    Для ранжирования и графа есть векторные методы над всеми покупателями сразу.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], industries: _Vocabulary, geographies: _Vocabulary):
+        """
+        :param columns: Массивы представления (см. _encode_part), склеенные по всем порциям
+        :param industries: Словарь отраслей (номера битов industry_masks и коды acq_industry)
+        :param geographies: Словарь городов (номера битов geography_masks и коды acq_geography)
+        """
+        # id — байтовые строки фиксированной ширины; поиск — двоичный по перестановке сортировки
+        self._ids = columns["ids"]
+        self._id_order = np.argsort(self._ids, kind="stable")
+        self._name_data = columns["name_data"]
+        self._name_offsets = self._offsets(columns["name_lengths"])
+        self.types = columns["types"]
+        self.industry_masks = columns["industry_masks"]
+        self.geography_masks = columns["geography_masks"]
+        self.revenue_min = columns["revenue_min"]
+        self.revenue_max = columns["revenue_max"]
+        self.capacity = columns["capacity"]
+        self.acq_offsets = self._offsets(columns["acq_counts"])
+        self.acq_industry = columns["acq_industry"]
+        self.acq_geography = columns["acq_geography"]
+        self.industries = industries
+        self.geographies = geographies
+
+    # === Построение ===
+    @staticmethod
+    def _offsets(lengths: np.ndarray) -> np.ndarray:
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return offsets
+
+    @staticmethod
+    def _encode_part(ids, names, types, ind_lists, geo_lists, acq_lists, rev_min, rev_max, capacity,
+                     industries: _Vocabulary, geographies: _Vocabulary) -> Dict[str, np.ndarray]:
+        """Кодирует порцию покупателей в массивы; словари пополняются новыми значениями."""
+        n = len(ids)
+        type_codes = {t: i for i, t in enumerate(BUYER_TYPES)}
+        encoded_names = [name.encode("utf-8") if isinstance(name, str) else b"" for name in names]
+        n_acq = sum(len(a) for a in acq_lists)
+        return {
+            "ids": np.array([i.encode("utf-8") for i in ids], dtype=bytes),
+            "name_data": np.frombuffer(b"".join(encoded_names), dtype=np.uint8),
+            "name_lengths": np.fromiter(map(len, encoded_names), dtype=np.int64, count=n),
+            "types": np.fromiter((type_codes.get(t, 255) for t in types), dtype=np.uint8, count=n),
+            "industry_masks": np.fromiter(map(industries.mask, ind_lists), dtype=np.uint64, count=n),
+            "geography_masks": np.fromiter(map(geographies.mask, geo_lists), dtype=np.uint64, count=n),
+            "revenue_min": np.asarray(rev_min, dtype=np.float32),
+            "revenue_max": np.asarray(rev_max, dtype=np.float32),
+            "capacity": np.asarray(capacity, dtype=np.float32),
+            "acq_counts": np.fromiter(map(len, acq_lists), dtype=np.int64, count=n),
+            "acq_industry": np.fromiter((industries.code(i) for a in acq_lists for i, _ in a),
+                                        dtype=np.uint8, count=n_acq),
+            "acq_geography": np.fromiter((geographies.code(g) for a in acq_lists for _, g in a),
+                                         dtype=np.uint8, count=n_acq),
+        }
+
+    @classmethod
+    def _from_parts(cls, parts: List[Dict[str, np.ndarray]], industries: _Vocabulary,
+                    geographies: _Vocabulary) -> 'CompactBuyers':
+        if not parts:
+            parts = [cls._encode_part([], [], [], [], [], [], [], [], [], industries, geographies)]
+        columns = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+        return cls(columns, industries, geographies)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'CompactBuyers':
+        """Из DataFrame покупателей (BuyerDataLoader.load_buyers); списки — разобранные или текстом."""
+        industries, geographies = _Vocabulary(INDUSTRIES), _Vocabulary(GEOGRAPHIES)
+        part = cls._encode_part(
+            df["company_id"].tolist(), df["name"].tolist(), df["type"].tolist(),
+            [parse_list(x) for x in df["industry_focus"]],
+            [parse_list(x) for x in df["target_geography"]],
+            [_acquisition_pairs(x) for x in df["past_acquisitions"]],
+            df["preferred_revenue_min"], df["preferred_revenue_max"], df["financial_capacity"],
+            industries, geographies
+        )
+        return cls._from_parts([part], industries, geographies)
+
+    @classmethod
+    def from_db(cls, db_path: str, chunk_size: int = 200_000) -> 'CompactBuyers':
+        """
+        Читает buyers порциями (из SQLite или каталога Arrow/Parquet — см. storage.open_storage)
+        и разбирает списки регулярными выражениями вместо literal_eval
+        (неканонический текст — через parse_list, как from_frame).
+        Каждая порция сразу кодируется в массивы, поэтому объекты Python существуют
+        только для одной порции, а не для всей таблицы.
+        """
+        industries, geographies = _Vocabulary(INDUSTRIES), _Vocabulary(GEOGRAPHIES)
+        parts = []
+        with metrics.span("db_load.buyers_compact"):
+            for chunk in open_storage(db_path).iter_batches("buyers", batch_size=chunk_size):
+                parts.append(cls._encode_part(
+                    chunk["company_id"].tolist(), chunk["name"].tolist(), chunk["type"].tolist(),
+                    [_list_items(list_text(x)) for x in chunk["industry_focus"]],
+                    [_list_items(list_text(x)) for x in chunk["target_geography"]],
+                    [_acquisition_pairs(list_text(x)) for x in chunk["past_acquisitions"]],
+                    chunk["preferred_revenue_min"], chunk["preferred_revenue_max"],
+                    chunk["financial_capacity"], industries, geographies
+                ))
+            store = cls._from_parts(parts, industries, geographies)
+        metrics.incr("rows_scanned.buyers", len(store))
+        return store
+
+    # === Mapping: company_id → профиль ===
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def company_id(self, row: int) -> str:
+        return self._ids[row].decode("utf-8")
+
+    def name(self, row: int) -> str:
+        return bytes(self._name_data[self._name_offsets[row]:self._name_offsets[row + 1]]).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for row in range(len(self)):
+            yield self.company_id(row)
+
+    def row_of(self, company_id: str) -> Optional[int]:
+        """Номер строки покупателя (None — нет такого id)."""
+        if not isinstance(company_id, str):
+            return None
+        key = company_id.encode("utf-8")
+        pos = int(np.searchsorted(self._ids, key, sorter=self._id_order))
+        if pos < len(self._ids) and self._ids[self._id_order[pos]] == key:
+            return int(self._id_order[pos])
+        return None
+
+    def __getitem__(self, company_id: str) -> Dict[str, Any]:
+        row = self.row_of(company_id)
+        if row is None:
+            raise KeyError(company_id)
+        return self.profile(row)
+
+    def __contains__(self, company_id) -> bool:
+        return self.row_of(company_id) is not None
+
+    def profile(self, row: int) -> Dict[str, Any]:
+        """Профиль в формате строки BuyerDataLoader.load_buyers (float32 округляется до 2 знаков)."""
+        start, end = self.acq_offsets[row], self.acq_offsets[row + 1]
+        type_code = int(self.types[row])
+        return {
+            "company_id": self.company_id(row),
+            "name": self.name(row),
+            "type": BUYER_TYPES[type_code] if type_code < len(BUYER_TYPES) else None,
+            "industry_focus": self.industries.decode_mask(int(self.industry_masks[row])),
+            "target_geography": self.geographies.decode_mask(int(self.geography_masks[row])),
+            "preferred_revenue_min": round(float(self.revenue_min[row]), 2),
+            "preferred_revenue_max": round(float(self.revenue_max[row]), 2),
+            "past_acquisitions": [
+                {"industry": self.industries.values[i], "geography": self.geographies.values[g]}
+                for i, g in zip(self.acq_industry[start:end].tolist(), self.acq_geography[start:end].tolist())
+            ],
+            "financial_capacity": round(float(self.capacity[row]), 2)
+        }
+
+    # === Векторные признаки по всем покупателям ===
+    def _bits(self, vocabulary: _Vocabulary, values) -> np.uint64:
+        mask = 0
+        for value in values:
+            code = vocabulary.codes.get(value)
+            if code is not None:
+                mask |= 1 << code
+        return np.uint64(mask)
+
+    def industry_match(self, industry: str) -> np.ndarray:
+        return (self.industry_masks & self._bits(self.industries, [industry])) != 0
+
+    def geography_match(self, geographies) -> np.ndarray:
+        """Совпадение target_geography хотя бы с одним из городов (строка или список)."""
+        geographies = [geographies] if isinstance(geographies, str) else geographies
+        return (self.geography_masks & self._bits(self.geographies, geographies)) != 0
+
+    def revenue_in_range(self, revenue: float) -> np.ndarray:
+        return (self.revenue_min <= revenue) & (revenue <= self.revenue_max)
+
+    def acquisition_rows(self) -> np.ndarray:
+        """Номер покупателя для каждой прошлой сделки (для агрегатов по CSR)."""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.acq_offsets))
+
+    def acquisition_counts(self, industry: Optional[str] = None, geographies=None) -> np.ndarray:
+        """
+        Число прошлых сделок покупателя в отрасли industry и/или в одном из городов geographies
+        (условия объединяются через ИЛИ, как в past_match ранжирования).
+        """
+        hit = np.zeros(len(self.acq_industry), dtype=bool)
+        if industry is not None and industry in self.industries.codes:
+            hit |= self.acq_industry == self.industries.codes[industry]
+        if geographies is not None:
+            geographies = [geographies] if isinstance(geographies, str) else geographies
+            codes = [self.geographies.codes[g] for g in geographies if g in self.geographies.codes]
+            hit |= np.isin(self.acq_geography, codes)
+        return np.bincount(self.acquisition_rows()[hit], minlength=len(self)).astype(np.int32)
+
+    def nbytes(self) -> int:
+        """Объём массивов представления в байтах."""
+        arrays = (self._ids, self._id_order, self._name_data, self._name_offsets, self.types, self.industry_masks, self.geography_masks, self.revenue_min,
+                  self.revenue_max, self.capacity, self.acq_offsets, self.acq_industry, self.acq_geography)
+        return sum(a.nbytes for a in arrays)
+
+
+# === Пример использования ===
+if __name__ == "__main__":
+    from .data_loader import BuyerDataLoader
+
+    store = CompactBuyers.from_db("m_and_a.db")
+    df = BuyerDataLoader("m_and_a.db").load_buyers()
+    print(f"Покупателей: {len(store)}, массивы: {store.nbytes() / 1024:.1f} КБ")
+    print(store["b_1"])
+    print(df.iloc[0].to_dict())
@@ -0,0 +1,241 @@
+import json
+import os
+import re
+import zlib
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .metrics import metrics
+from .storage import open_storage
+
+INDUSTRIES = [
+    "Стоматологические клиники", "Частные медицинские центры", "Аптеки", "Оптика",
+    "Фитнес-клубы", "Розничная торговля продуктами", "Автосервисы", "IT-аутсорсинг"
+]
+GEOGRAPHIES = [
+    "Берлин", "Мюнхен", "Гамбург", "Франкфурт", "Кёльн",
+    "Москва", "Санкт-Петербург", "Екатеринбург", "Новосибирск"
+]
+# Границы диапазонов выручки (млн $)
+REVENUE_BANDS = [0.0, 10.0, 25.0, 50.0, 100.0, float("inf")]
+
+# Вес блоков вектора: совпадение отрасли и города важнее истории сделок
+BLOCK_WEIGHTS = {"industry": 1.0, "geography": 1.0, "revenue": 0.7, "acquisitions": 0.5, "hashed": 0.3}
+
+_ACQ_PAIR = re.compile(r"'industry': '([^']*)', 'geography': '([^']*)'")
+
+
+class BuyerVectorEncoder:
+    """
+    Кодирует покупателей и продавцов векторами фиксированной длины:
+    multi-hot отраслей и городов, диапазоны выручки, история сделок по отраслям/городам
+    и (опционально) хешированные пары «отрасль|город» прошлых сделок.
+    Векторы нормированы, поэтому скалярное произведение — косинусная близость.
+    """
+
+    def __init__(self, hash_dims: int = 0):
+        """
+        :param hash_dims: Размер хешированного блока прошлых сделок (0 — без него)
+        """
+        self.hash_dims = hash_dims
+        n_ind, n_geo, n_rev = len(INDUSTRIES), len(GEOGRAPHIES), len(REVENUE_BANDS) - 1
+        sizes = [("industry", n_ind), ("geography", n_geo), ("revenue", n_rev),
+                 ("acq_industry", n_ind), ("acq_geography", n_geo), ("hashed", hash_dims)]
+        self.slices: Dict[str, slice] = {}
+        offset = 0
+        for name, size in sizes:
+            self.slices[name] = slice(offset, offset + size)
+            offset += size
+        self.dim = offset
+
+    def _hash_index(self, industry: str, geography: str) -> int:
+        return zlib.crc32(f"{industry}|{geography}".encode("utf-8")) % self.hash_dims
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+    def encode_frame(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Векторы покупателей по строкам таблицы buyers. Списки в столбцах могут быть как
+        строками из базы, так и разобранными списками: их текстовое представление совпадает,
+        поэтому признаки считаются векторными операциями над строками без literal_eval.
+        """
+        n = len(df)
+        out = np.zeros((n, self.dim), dtype=np.float32)
+        ind_focus = df["industry_focus"].astype(str)
+        geo_focus = df["target_geography"].astype(str)
+        acquisitions = df["past_acquisitions"].astype(str)
+
+        for j, name in enumerate(INDUSTRIES):
+            out[:, self.slices["industry"].start + j] = ind_focus.str.contains(f"'{name}'", regex=False)
+            out[:, self.slices["acq_industry"].start + j] = acquisitions.str.count(
+                re.escape(f"'industry': '{name}'")
+            ) / 3.0
+        for j, name in enumerate(GEOGRAPHIES):
+            out[:, self.slices["geography"].start + j] = geo_focus.str.contains(f"'{name}'", regex=False)
+            out[:, self.slices["acq_geography"].start + j] = acquisitions.str.count(
+                re.escape(f"'geography': '{name}'")
+            ) / 3.0
+
+        # Диапазоны выручки, пересекающиеся с предпочтениями покупателя
+        rev_min = df["preferred_revenue_min"].to_numpy(dtype=np.float64)
+        rev_max = df["preferred_revenue_max"].to_numpy(dtype=np.float64)
+        for j in range(len(REVENUE_BANDS) - 1):
+            low, high = REVENUE_BANDS[j], REVENUE_BANDS[j + 1]
+            out[:, self.slices["revenue"].start + j] = (rev_min < high) & (rev_max >= low)
+
+        if self.hash_dims:
+            start = self.slices["hashed"].start
+            for row, text in enumerate(acquisitions):
+                for industry, geography in _ACQ_PAIR.findall(text):
+                    out[row, start + self._hash_index(industry, geography)] += 1.0
+
+        self._apply_weights(out)
+        return self._normalize(out)
+
+    def encode_seller(self, seller: Dict[str, Any]) -> np.ndarray:
+        """Вектор продавца в том же пространстве: его отрасль и город — и как фокус, и как история сделок."""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if seller.get("industry") in INDUSTRIES:
+            j = INDUSTRIES.index(seller["industry"])
+            vector[self.slices["industry"].start + j] = 1.0
+            vector[self.slices["acq_industry"].start + j] = 1.0
+        if seller.get("geography") in GEOGRAPHIES:
+            j = GEOGRAPHIES.index(seller["geography"])
+            vector[self.slices["geography"].start + j] = 1.0
+            vector[self.slices["acq_geography"].start + j] = 1.0
+        revenue = seller.get("revenue")
+        if revenue is not None:
+            band = int(np.searchsorted(REVENUE_BANDS, revenue, side="right")) - 1
+            vector[self.slices["revenue"].start + min(max(band, 0), len(REVENUE_BANDS) - 2)] = 1.0
+        if self.hash_dims:
+            vector[self.slices["hashed"].start + self._hash_index(seller.get("industry"), seller.get("geography"))] = 1.0
+        self._apply_weights(vector)
+        return self._normalize(vector)
+
+    def _apply_weights(self, vectors: np.ndarray):
+        for name, weight in (("industry", BLOCK_WEIGHTS["industry"]), ("geography", BLOCK_WEIGHTS["geography"]),
+                             ("revenue", BLOCK_WEIGHTS["revenue"]), ("acq_industry", BLOCK_WEIGHTS["acquisitions"]),
+                             ("acq_geography", BLOCK_WEIGHTS["acquisitions"]), ("hashed", BLOCK_WEIGHTS["hashed"])):
+            vectors[..., self.slices[name]] *= weight
+
+
+class BuyerVectorIndex:
+    """
+    Индекс близости покупателей: матрица float32 в memory-mapped .npy и точный поиск top-k
+    полным перебором (матрично-векторное произведение BLAS).
+
+    Матрица хранится по признакам (dim × число покупателей): запрос продавца содержит
+    лишь несколько ненулевых признаков, и умножаются только соответствующие строки.
+    Память процесса не растёт с размером индекса: страницы матрицы подгружает ОС.
+    """
+
+    VECTORS_FILE = "vectors.npy"
+    IDS_FILE = "ids.npy"
+    META_FILE = "meta.json"
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, self.META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.directory = directory
+        self.encoder = BuyerVectorEncoder(hash_dims=meta["hash_dims"])
+        self.vectors = np.load(os.path.join(directory, self.VECTORS_FILE), mmap_mode="r")
+        self.ids = np.load(os.path.join(directory, self.IDS_FILE), mmap_mode="r")
+        self._positions: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def vector(self, buyer_id: str) -> np.ndarray:
+        """Вектор покупателя."""
+        return np.asarray(self.vectors[:, self._position(buyer_id)])
+
+    def _position(self, buyer_id: str) -> int:
+        if self._positions is None:
+            self._positions = {company_id: i for i, company_id in enumerate(self.ids.tolist())}
+        return self._positions[buyer_id]
+
+    @classmethod
+    def build(cls, db_path: str, directory: str, hash_dims: int = 0, chunk_size: int = 200_000) -> 'BuyerVectorIndex':
+        """
+        Строит индекс по таблице buyers. Покупатели читаются порциями (только нужные столбцы)
+        и пишутся сразу в memory-mapped файл, поэтому память не зависит от числа покупателей.
+        """
+        os.makedirs(directory, exist_ok=True)
+        encoder = BuyerVectorEncoder(hash_dims=hash_dims)
+        columns = ["company_id", "industry_focus", "target_geography", "preferred_revenue_min",
+                   "preferred_revenue_max", "past_acquisitions"]
+        storage = open_storage(db_path)
+        total = storage.count("buyers")
+        ids = []
+        vectors = np.lib.format.open_memmap(
+            os.path.join(directory, cls.VECTORS_FILE), mode="w+", dtype=np.float32, shape=(encoder.dim, total)
+        )
+        with metrics.span("vector_index.build"):
+            offset = 0
+            for chunk in storage.iter_batches("buyers", columns=columns, batch_size=chunk_size):
+                vectors[:, offset:offset + len(chunk)] = encoder.encode_frame(chunk).T
+                ids.extend(chunk["company_id"].tolist())
+                offset += len(chunk)
+        vectors.flush()
+        del vectors
+        np.save(os.path.join(directory, cls.IDS_FILE), np.array(ids, dtype=str))
+        with open(os.path.join(directory, cls.META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"hash_dims": hash_dims, "dim": encoder.dim, "count": total}, f)
+        return cls(directory)
+
+    def _top_k(self, query: np.ndarray, k: int, exclude: Optional[int] = None,
+               sample_step: int = 64) -> List[Tuple[str, float]]:
+        n = len(self.ids)
+        k_eff = min(k + (exclude is not None), n)
+        if k_eff == 0:
+            return []
+        active = np.flatnonzero(query)
+        if len(active) == 0:
+            return []
+        scores = query[active] @ self.vectors[active]
+
+        # Порог отбора — k-е лучшее значение по прореженной выборке: оно не выше k-го по всем,
+        # поэтому кандидатов не меньше k, а сортируются только они
+        sample = scores[::sample_step] if n // sample_step >= k_eff else scores
+        threshold = np.partition(sample, len(sample) - k_eff)[len(sample) - k_eff]
+        candidates = np.flatnonzero(scores >= threshold)
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        result = []
+        for i in candidates:
+            if i == exclude:
+                continue
+            result.append((str(self.ids[i]), float(scores[i])))
+            if len(result) == k:
+                break
+        return result
+
+    def similar_to_seller(self, seller: Dict[str, Any], k: int = 10) -> List[Tuple[str, float]]:
+        """Покупатели, наиболее близкие к профилю продавца: [(company_id, близость)]."""
+        with metrics.span("vector_index.query"):
+            return self._top_k(self.encoder.encode_seller(seller), k)
+
+    def similar_to_buyer(self, buyer_id: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Покупатели, похожие на данного (сам покупатель исключается)."""
+        position = self._position(buyer_id)
+        with metrics.span("vector_index.query"):
+            return self._top_k(np.asarray(self.vectors[:, position]), k, exclude=position)
+
+
+# === Пример использования ===
+if __name__ == "__main__":
+    import sys
+    import time
+
+    db = sys.argv[1] if len(sys.argv) > 1 else "m_and_a.db"
+    index = BuyerVectorIndex.build(db, sys.argv[2] if len(sys.argv) > 2 else ".vector_index", hash_dims=16)
+    seller = {"industry": "Стоматологические клиники", "geography": "Берлин", "revenue": 10.0}
+    start = time.perf_counter()
+    print(index.similar_to_seller(seller, k=5))
+    print(f"{(time.perf_counter() - start) * 1000:.2f} мс на {len(index)} покупателях")
+    print(index.similar_to_buyer("b_1", k=5))
@@ -1,9 +1,13 @@
-import sqlite3
+import io
+import numpy as np
 import pandas as pd
 import networkx as nx
-import ast
 import matplotlib.pyplot as plt
-from typing import Dict, List
+from typing import Dict, List, Optional
+from .buyer_store import CompactBuyers
+from .metrics import metrics
+from .news_signals import NewsSignals
+from .storage import open_storage, parse_list
 
 class CompanyConnectionGraph:
     NEARBY_ZONES = {
@@ -14,26 +18,68 @@ class CompanyConnectionGraph:
         "Стокгольм": ["Мальмё"]
     }
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, use_news_signals: bool = False, compact: bool = False):
+        """
+        :param use_news_signals: Усиливать связи по активности покупателя в новостях
+        :param compact: Считать силу связей векторно по CompactBuyers; в граф попадают
+                        только связанные с продавцом покупатели
+        """
         self.db_path = db_path
         self.graph = nx.Graph()
         self.seller_id = "SELLER"
+        self.use_news_signals = use_news_signals
+        self.compact = compact
 
     def _cities_are_close(self, c1: str, c2: str) -> bool:
         return c1 == c2 or c2 in self.NEARBY_ZONES.get(c1, [])
 
     def _load_and_parse(self) -> pd.DataFrame:
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query("SELECT * FROM buyers", conn)
-        conn.close()
-        for col in ["industry_focus", "target_geography", "past_acquisitions"]:
-            df[col] = df[col].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else [])
+        with metrics.span("db_load.buyers"):
+            df = open_storage(self.db_path).read("buyers")
+        metrics.incr("rows_scanned.buyers", len(df))
+        with metrics.span("parse.literal_eval"):
+            for col in ["industry_focus", "target_geography", "past_acquisitions"]:
+                df[col] = df[col].apply(parse_list)
         return df
 
     def build(self, seller: Dict) -> 'CompanyConnectionGraph':
         self.graph.clear()
-        df = self._load_and_parse()
+        buyers = CompactBuyers.from_db(self.db_path) if self.compact else self._load_and_parse()
+        signals = NewsSignals.load(self.db_path) if self.use_news_signals else None
+        with metrics.span("graph.build"):
+            if self.compact:
+                self._add_compact_buyers(seller, buyers, signals)
+            else:
+                self._add_buyers(seller, buyers, signals)
+        return self
 
+    def _add_compact_buyers(self, seller: Dict, store: CompactBuyers, signals: Optional[NewsSignals] = None):
+        """Те же правила, что в _add_buyers, но над массивами всех покупателей сразу."""
+        seller_attrs = {k: v for k, v in seller.items() if k != "type"}
+        self.graph.add_node(self.seller_id, **seller_attrs)
+
+        close_cities = [seller["geography"]] + self.NEARBY_ZONES.get(seller["geography"], [])
+        strength = 2.0 * store.industry_match(seller["industry"])
+        strength += np.where(store.geography_match(seller["geography"]), 2.0,
+                             np.where(store.geography_match(close_cities), 1.5, 0.0))
+        strength += 1.5 * store.acquisition_counts(industry=seller["industry"])
+        strength += 1.0 * store.acquisition_counts(geographies=close_cities)
+        if signals is not None:
+            for buyer_id in signals.counts:
+                row = store.row_of(buyer_id)
+                if row is not None:
+                    news_industry = signals.count(buyer_id, "industry", seller["industry"])
+                    news_geography = signals.count(buyer_id, "geography", seller["geography"])
+                    strength[row] += min(1.5, 0.5 * news_industry) + min(1.5, 0.5 * news_geography)
+
+        for row in np.flatnonzero(strength > 0).tolist():
+            buyer_attrs = store.profile(row)
+            buyer_attrs.pop("type")
+            buyer_id = buyer_attrs["company_id"]
+            self.graph.add_node(buyer_id, **buyer_attrs)
+            self.graph.add_edge(self.seller_id, buyer_id, weight=float(strength[row]))
+
+    def _add_buyers(self, seller: Dict, df: pd.DataFrame, signals: Optional[NewsSignals] = None):
         # Узел продавца (без поля "type")
         seller_attrs = {k: v for k, v in seller.items() if k != "type"}
         self.graph.add_node(self.seller_id, **seller_attrs)
@@ -62,12 +108,19 @@ class CompanyConnectionGraph:
                     acq_geo = acq.get("geography")
                     if acq_geo and self._cities_are_close(seller["geography"], acq_geo):
                         strength += 1.0
+            if signals is not None:
+                # Новости о сделках в отрасли/городе продавца: не больше 1.5 за каждое измерение
+                news_industry = signals.count(buyer_id, "industry", seller["industry"])
+                news_geography = signals.count(buyer_id, "geography", seller["geography"])
+                strength += min(1.5, 0.5 * news_industry) + min(1.5, 0.5 * news_geography)
             if strength > 0:
                 self.graph.add_edge(self.seller_id, buyer_id, weight=strength)
 
-        return self
-
     def get_plot_figure(self, top_n: int = 5):
+        with metrics.span("graph.plot"):
+            return self._plot(top_n)
+
+    def _plot(self, top_n: int):
         edges = [
             {"buyer_id": v, "weight": d["weight"]}
             for u, v, d in self.graph.edges(data=True) if u == self.seller_id
@@ -98,4 +151,18 @@ class CompanyConnectionGraph:
         ax.set_title(f"Топ-{top_n} скрытых связей", fontsize=14)
         ax.axis("off")
         plt.tight_layout()
-        return fig
\ No newline at end of file
+        return fig
+
+
+def render_graph_png(db_path: str, seller: Dict, top_n: int = 5) -> Optional[bytes]:
+    """
+    Строит граф связей и возвращает картинку в PNG (None — нет связей).
+    Функция верхнего уровня с сериализуемым результатом: её можно запускать в отдельном процессе.
+    """
+    fig = CompanyConnectionGraph(db_path).build(seller).get_plot_figure(top_n=top_n)
+    if not fig:
+        return None
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    return buffer.getvalue()
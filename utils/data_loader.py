@@ -1,29 +1,28 @@
-import sqlite3
 import pandas as pd
-import ast
 from typing import List
+from .metrics import metrics
+from .storage import open_storage, parse_list
 
 class BuyerDataLoader:
     def __init__(self, db_path: str):
+        """
+        :param db_path: Файл SQLite или каталог Arrow/Parquet (см. storage.open_storage)
+        """
         self.db_path = db_path
 
     @staticmethod
     def _safe_literal_eval(x) -> List:
-        if pd.isna(x) or x in ("", "[]", "NULL", None):
-            return []
-        try:
-            result = ast.literal_eval(x)
-            return result if isinstance(result, list) else []
-        except (ValueError, SyntaxError, TypeError):
-            return []
+        return parse_list(x)
 
     def load_buyers(self) -> pd.DataFrame:
-        with sqlite3.connect(self.db_path) as conn:
-            df = pd.read_sql_query("SELECT * FROM buyers", conn)
+        with metrics.span("db_load.buyers"):
+            df = open_storage(self.db_path).read("buyers")
+        metrics.incr("rows_scanned.buyers", len(df))
         list_columns = ["industry_focus", "target_geography", "past_acquisitions"]
-        for col in list_columns:
-            if col in df.columns:
-                df[col] = df[col].apply(self._safe_literal_eval)
-            else:
-                df[col] = [[] for _ in range(len(df))]
+        with metrics.span("parse.literal_eval"):
+            for col in list_columns:
+                if col in df.columns:
+                    df[col] = df[col].apply(self._safe_literal_eval)
+                else:
+                    df[col] = [[] for _ in range(len(df))]
         return df
\ No newline at end of file
@@ -0,0 +1,185 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Optional, Any
+
+import numpy as np
+
+from .auction_engine import AuctionEngine
+from .buyer_response_simulator import BuyerResponseSimulator
+
+COMPETITION_LEVELS = ("none", "low", "medium", "high")
+
+
+class StreamingAggregate:
+    """
+    Агрегат результатов прогонов с постоянным объёмом памяти:
+    гистограмма множителей цены, частоты уровней конкуренции и суммы для средних.
+    """
+
+    def __init__(self, max_multiplier: float = 3.0, bins: int = 3000):
+        self.max_multiplier = max_multiplier
+        self.bins = bins
+        self.hist = np.zeros(bins + 1, dtype=np.int64)  # последний бин — переполнение
+        self.level_counts = np.zeros(len(COMPETITION_LEVELS), dtype=np.int64)
+        self.n = 0
+        self.sum_multiplier = 0.0
+        self.sum_nda = 0
+
+    def add(self, multipliers: np.ndarray, nda_counts: np.ndarray):
+        idx = np.floor(multipliers / self.max_multiplier * self.bins).astype(np.int64)
+        self.hist += np.bincount(np.clip(idx, 0, self.bins), minlength=self.bins + 1)
+        # 0 → none, 1 → low, 2–3 → medium, 4+ → high
+        levels = np.select([nda_counts == 0, nda_counts == 1, nda_counts <= 3], [0, 1, 2], default=3)
+        self.level_counts += np.bincount(levels, minlength=len(COMPETITION_LEVELS))
+        self.n += len(multipliers)
+        self.sum_multiplier += float(multipliers.sum())
+        self.sum_nda += int(nda_counts.sum())
+
+    def merge(self, other: 'StreamingAggregate') -> 'StreamingAggregate':
+        self.hist += other.hist
+        self.level_counts += other.level_counts
+        self.n += other.n
+        self.sum_multiplier += other.sum_multiplier
+        self.sum_nda += other.sum_nda
+        return self
+
+    def multiplier_percentile(self, q: float) -> float:
+        """Перцентиль множителя по гистограмме (точность — ширина бина)."""
+        target = q / 100.0 * self.n
+        cumulative = np.cumsum(self.hist)
+        idx = int(np.searchsorted(cumulative, target, side="left"))
+        return min(idx + 0.5, self.bins) * self.max_multiplier / self.bins
+
+
+def _run_chunk(seed_seq: np.random.SeedSequence, n_trials: int, probs: np.ndarray,
+               mu: np.ndarray, budget: np.ndarray, base_price: float,
+               auction_format: Optional[str], engine_options: Dict[str, Any]) -> StreamingAggregate:
+    """Прогоняет блок сделок (отклики + аукцион) на собственном потоке случайных чисел."""
+    rng = np.random.default_rng(seed_seq)
+    aggregate = StreamingAggregate()
+
+    nda = rng.random((n_trials, len(probs))) < probs
+    nda_counts = nda.sum(axis=1)
+
+    if auction_format is None:
+        # Упрощённая модель AuctionSimulator: множитель из диапазона по числу NDA
+        mid = np.round(rng.uniform(1.10, 1.25, n_trials), 2)
+        high = np.round(rng.uniform(1.30, 1.40, n_trials), 2)
+        multipliers = np.where(nda_counts <= 1, 1.0, np.where(nda_counts <= 3, mid, high))
+    else:
+        engine = AuctionEngine(auction_format, rng=rng, **engine_options)
+        valuations = engine.draw_valuations(base_price, mu, budget, size=n_trials)
+        valuations[~nda] = np.nan
+        prices = engine.clearing_prices(base_price, valuations)
+        multipliers = np.where(np.isnan(prices), 1.0, prices / base_price)
+
+    aggregate.add(multipliers, nda_counts)
+    return aggregate
+
+
+class DealMonteCarlo:
+    """
+    Монте-Карло прогон сделки целиком: отклики покупателей → аукцион.
+    Блоки прогонов выполняются в пуле процессов, каждый блок получает
+    собственный дочерний поток numpy.random.SeedSequence.
+    Результат не зависит от числа процессов при одинаковом seed.
+    """
+
+    def __init__(self, response_simulator: Optional[BuyerResponseSimulator] = None,
+                 auction_format: Optional[str] = None, n_workers: Optional[int] = None,
+                 chunk_size: int = 10000, **engine_options):
+        """
+        :param response_simulator: Симулятор откликов (по умолчанию — с базовыми вероятностями)
+        :param auction_format: Формат AuctionEngine (None — упрощённая модель AuctionSimulator)
+        :param n_workers: Число процессов (по умолчанию — число CPU; 1 — без пула)
+        :param chunk_size: Прогонов в одном блоке
+        :param engine_options: Дополнительные параметры AuctionEngine
+        """
+        self.response_simulator = response_simulator or BuyerResponseSimulator()
+        self.auction_format = auction_format
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.engine_options = engine_options
+
+    def run(self, base_price: float, ranked_buyers: List[Dict], buyer_profiles: Dict,
+            seller_profile: Dict, n_trials: int = 10000, seed: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Запускает n_trials прогонов сделки.
+
+        :param base_price: Оценочная стоимость бизнеса
+        :param ranked_buyers: Список покупателей с полями "rank", "company_id"
+        :param buyer_profiles: Словарь профилей покупателей по company_id
+        :param seller_profile: Профиль продавца
+        :param n_trials: Количество прогонов
+        :param seed: Мастер-seed (None — случайный)
+        :return: Перцентили финальной цены, частоты уровней конкуренции и ожидаемый прирост цены
+        """
+        if n_trials <= 0:
+            raise ValueError("n_trials должно быть положительным")
+
+        probs = self.response_simulator._nda_probabilities(ranked_buyers, buyer_profiles, seller_profile)
+        engine = AuctionEngine(self.auction_format or "english", **self.engine_options)
+        mu, budget = engine.bidder_parameters(ranked_buyers, buyer_profiles, seller_profile)
+
+        root = np.random.SeedSequence(seed)
+        n_chunks = -(-n_trials // self.chunk_size)
+
+        def chunk_args(i: int):
+            size = min(self.chunk_size, n_trials - i * self.chunk_size)
+            # Эквивалентно root.spawn(n_chunks)[i], но без хранения всех потомков
+            child = np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (i,))
+            return (child, size, probs, mu, budget, base_price, self.auction_format, self.engine_options)
+
+        total = StreamingAggregate()
+        if self.n_workers == 1 or n_chunks == 1:
+            for i in range(n_chunks):
+                total.merge(_run_chunk(*chunk_args(i)))
+        else:
+            self._run_parallel(n_chunks, chunk_args, total)
+
+        return self._summary(total, base_price)
+
+    def _run_parallel(self, n_chunks: int, chunk_args, total: StreamingAggregate):
+        """
+        Держит в работе не более 2 × n_workers блоков и сливает результаты
+        строго по порядку блоков — так сумма не зависит от порядка завершения.
+        """
+        window = 2 * self.n_workers
+        pending, ready = {}, {}
+        next_submit, next_merge = 0, 0
+        with ProcessPoolExecutor(max_workers=self.n_workers) as pool:
+            while next_merge < n_chunks:
+                while next_submit < n_chunks and len(pending) + len(ready) < window:
+                    pending[pool.submit(_run_chunk, *chunk_args(next_submit))] = next_submit
+                    next_submit += 1
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ready[pending.pop(future)] = future.result()
+                while next_merge in ready:
+                    total.merge(ready.pop(next_merge))
+                    next_merge += 1
+
+    @staticmethod
+    def _summary(total: StreamingAggregate, base_price: float) -> Dict[str, Any]:
+        mean_multiplier = total.sum_multiplier / total.n
+        return {
+            "n_trials": total.n,
+            "price_percentiles": {
+                q: round(base_price * total.multiplier_percentile(q), 3) for q in (5, 25, 50, 75, 95)
+            },
+            "competition_frequencies": {
+                level: float(count / total.n) for level, count in zip(COMPETITION_LEVELS, total.level_counts)
+            },
+            "expected_nda_count": total.sum_nda / total.n,
+            "expected_final_price": base_price * mean_multiplier,
+            "expected_uplift": mean_multiplier - 1.0
+        }
+
+
+# === Пример использования ===
+if __name__ == "__main__":
+    from utils.buyer_response_simulator import ranked_buyers, buyer_profiles, seller_profile
+
+    runner = DealMonteCarlo(auction_format="english")
+    result = runner.run(10.0, ranked_buyers, buyer_profiles, seller_profile, n_trials=200000, seed=42)
+    print(result)
@@ -0,0 +1,306 @@
+import os
+import re
+import sqlite3
+from contextlib import closing
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .buyer_vectors import INDUSTRIES, GEOGRAPHIES
+from .metrics import metrics
+from .storage import open_storage
+
+CANONICAL_TABLE = "buyer_canonical"
+
+# Правовые формы и типовые суффиксы: у одной компании из разных источников они пишутся
+# по-разному, а у разных компаний совпадают и завышают сходство названий
+_LEGAL_FORMS = re.compile(
+    r"\b(ооо|оао|зао|пао|ао|нао|нпо|рао|ип|тоо|гк|ук|инк|инкорпорэйтед|лтд|лимитед|групп|и|партнеры|"
+    r"gmbh|mbh|ag|kg|kgaa|ohg|gbr|ug|se|ev|eg|ek|co|ltd|llc|inc|corp|plc|group|stiftung|haftungsbeschraenkt)\b"
+)
+_TRANSLIT = str.maketrans({"ё": "е", "ß": "ss", "ä": "ae", "ö": "oe", "ü": "ue"})
+_NON_WORD = re.compile(r"[\W_]+")
+# Число единичных битов в байте: np.bitwise_count есть только в NumPy 2
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def normalize_name(name: Any) -> str:
+    """
+    Нормализованное название для сравнения: нижний регистр, немецкие умляуты и «ё» приведены
+    к одному написанию, без кавычек, пунктуации и правовой формы; слова отсортированы,
+    чтобы порядок фамилий («Hartmann Bolander» / «Bolander Hartmann») не влиял на сходство.
+    """
+    if not isinstance(name, str):
+        return ""
+    text = _NON_WORD.sub(" ", name.lower().translate(_TRANSLIT))
+    # «e.V.» и «& Co.» после удаления точек распадаются на буквы — склеиваем однобуквенные слова
+    text = re.sub(r"\b(\w) (?=\w\b)", r"\1", text)
+    text = _LEGAL_FORMS.sub(" ", text)
+    return " ".join(sorted(set(text.split())))
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """Число единичных битов в каждом элементе массива масок uint32."""
+    values = np.ascontiguousarray(values, dtype=np.uint32)
+    return _BYTE_POPCOUNT[values.view(np.uint8)].reshape(len(values), 4).sum(axis=1)
+
+
+def _sorted_unique(values: np.ndarray) -> np.ndarray:
+    """Уникальные значения по возрастанию (np.unique для int64 заметно медленнее сортировки)."""
+    values = np.sort(values)
+    return values[np.concatenate(([True], values[1:] != values[:-1]))] if len(values) else values
+
+
+class BuyerDeduplicator:
+    """
+    Поиск дубликатов покупателей (entity resolution) без сравнения всех пар.
+
+    - Названия нормализуются (normalize_name) и разбиваются на символьные триграммы;
+      подписи MinHash считаются векторно для порции строк сразу.
+    - Блокировка — LSH: подпись делится на bands полос, покупатели с одинаковой полосой
+      попадают в один блок. Внутри блока строки сортируются по маске отраслей и городов
+      и сравниваются только с window соседями (sorted neighbourhood), поэтому даже
+      блок из тысяч одноимённых компаний даёт O(размер × window) пар, а не квадрат.
+    - Кандидат подтверждается, если оценка Жаккара по подписям названий не ниже
+      name_threshold и пересечение фокуса (отрасли и города, Жаккар масок) не ниже focus_threshold.
+    - Подтверждённые пары склеиваются в кластеры (union-find на массивах);
+      канонический id кластера — покупатель, записанный в базе первым.
+    """
+
+    def __init__(self, num_perm: int = 32, bands: int = 8, window: int = 4,
+                 name_threshold: float = 0.7, focus_threshold: float = 0.5,
+                 max_name_length: int = 48, seed: int = 0, batch_size: int = 200_000):
+        """
+        :param num_perm: Длина подписи MinHash (делится на bands)
+        :param bands: Число полос LSH: больше полос — выше полнота и больше кандидатов
+        :param window: Сколько соседей внутри блока сравнивается с каждой строкой
+        :param name_threshold: Минимальная оценка сходства названий (Жаккар триграмм)
+        :param focus_threshold: Минимальное пересечение отраслей и городов (Жаккар масок)
+        :param max_name_length: Длина нормализованного названия, после которой оно обрезается
+        :param batch_size: Размер порции чтения buyers
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm должно делиться на bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.window = window
+        self.name_threshold = name_threshold
+        self.focus_threshold = focus_threshold
+        self.max_name_length = max_name_length
+        self.batch_size = batch_size
+        rng = np.random.default_rng(seed)
+        # Хеши multiply-shift: (a·x + b) mod 2^64, старшие 32 бита; a нечётные
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    # === Признаки ===
+    def _signatures(self, names: List[str]) -> np.ndarray:
+        """Подписи MinHash по триграммам « название »; у пустых названий подпись — все единицы."""
+        if not names:
+            return np.empty((0, self.num_perm), dtype=np.uint32)
+        padded = np.array([f" {name[:self.max_name_length]} " if name else "" for name in names])
+        width = padded.dtype.itemsize // 4
+        if width < 3:
+            # В порции нет ни одного непустого названия — триграмм нет ни у кого
+            return np.full((len(names), self.num_perm), 0xFFFFFFFF, dtype=np.uint32)
+        codes = padded.view(np.uint32).reshape(len(names), width).astype(np.uint64)
+        lengths = np.char.str_len(padded)
+        # Код триграммы точный: символ Unicode занимает 21 бит
+        grams = (codes[:, :-2] << np.uint64(42)) | (codes[:, 1:-1] << np.uint64(21)) | codes[:, 2:]
+        # Позиции за концом названия заполняем первой триграммой — минимум от этого не меняется
+        valid = np.arange(width - 2) < (lengths[:, None] - 2)
+        grams = np.where(valid, grams, grams[:, :1])
+        signatures = np.empty((len(names), self.num_perm), dtype=np.uint32)
+        with np.errstate(over="ignore"):
+            for k in range(self.num_perm):
+                signatures[:, k] = ((grams * self._a[k] + self._b[k]) >> np.uint64(32)).min(axis=1)
+        signatures[lengths == 0] = 0xFFFFFFFF
+        return signatures
+
+    @staticmethod
+    def _focus_masks(frame: pd.DataFrame) -> np.ndarray:
+        """Битовые маски отраслей (младшие биты) и городов покупателя."""
+        masks = np.zeros(len(frame), dtype=np.uint32)
+        industries = frame["industry_focus"].astype(str)
+        geographies = frame["target_geography"].astype(str)
+        for bit, name in enumerate(INDUSTRIES):
+            masks |= industries.str.contains(f"'{name}'", regex=False).to_numpy(dtype=np.uint32) << bit
+        for bit, name in enumerate(GEOGRAPHIES, len(INDUSTRIES)):
+            masks |= geographies.str.contains(f"'{name}'", regex=False).to_numpy(dtype=np.uint32) << bit
+        return masks
+
+    def _load(self, db_path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        storage = open_storage(db_path)
+        ids, names, signatures, masks = [], [], [], []
+        for chunk in storage.iter_batches("buyers", columns=["company_id", "name", "industry_focus",
+                                                             "target_geography"], batch_size=self.batch_size):
+            with metrics.span("dedup.signatures"):
+                # Названия повторяются (одноимённые компании, списки из нескольких источников):
+                # нормализация и подписи считаются один раз на уникальное название
+                codes, unique_names = pd.factorize(chunk["name"].fillna(""))
+                normalized = [normalize_name(name) for name in unique_names.tolist()]
+                signatures.append(self._signatures(normalized)[codes])
+                masks.append(self._focus_masks(chunk))
+            ids.append(chunk["company_id"].to_numpy(dtype=object))
+            names.append(chunk["name"].to_numpy(dtype=object))
+        metrics.incr("rows_scanned.dedup", sum(len(part) for part in ids))
+        if not ids:
+            return (np.empty(0, dtype=object), np.empty(0, dtype=object),
+                    np.empty((0, self.num_perm), dtype=np.uint32), np.empty(0, dtype=np.uint32))
+        return np.concatenate(ids), np.concatenate(names), np.vstack(signatures), np.concatenate(masks)
+
+    # === Кандидаты и проверка ===
+    def _candidates(self, signatures: np.ndarray, masks: np.ndarray) -> np.ndarray:
+        """Пары (i, j), i < j, попавшие в общий блок LSH в пределах окна; без повторов."""
+        n = len(signatures)
+        members = np.flatnonzero(signatures[:, 0] != np.uint32(0xFFFFFFFF))
+        member_masks = masks[members]
+        per_band = self.num_perm // self.bands
+        coeffs = np.array([0x9E3779B97F4A7C15 >> (7 * r) | 1 for r in range(per_band)], dtype=np.uint64)
+        # Пара кодируется одним числом i·n + j: повторы из разных полос убираются сортировкой
+        codes = []
+        with np.errstate(over="ignore"):
+            for band in range(self.bands):
+                part = signatures[members, band * per_band:(band + 1) * per_band].astype(np.uint64)
+                keys = (part * coeffs).sum(axis=1, dtype=np.uint64)
+                order = np.lexsort((members, member_masks, keys))
+                keys, rows = keys[order], members[order]
+                band_codes = []
+                for step in range(1, self.window + 1):
+                    same = keys[step:] == keys[:-step]
+                    first, second = rows[:-step][same], rows[step:][same]
+                    band_codes.append(np.minimum(first, second) * n + np.maximum(first, second))
+                codes.append(_sorted_unique(np.concatenate(band_codes)))
+        codes = _sorted_unique(np.concatenate(codes)) if codes else np.empty(0, dtype=np.int64)
+        return np.stack([codes // max(n, 1), codes % max(n, 1)], axis=1)
+
+    @staticmethod
+    def _focus_overlap(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        union = _popcount(a | b).astype(float)
+        common = _popcount(a & b).astype(float)
+        # Фокус не указан ни у одного из двух — пересечение не противоречит совпадению
+        return np.divide(common, union, out=np.ones_like(union), where=union > 0)
+
+    def _verify(self, pairs: np.ndarray, signatures: np.ndarray, masks: np.ndarray,
+                chunk_size: int = 1_000_000) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        name_sim = np.empty(len(pairs))
+        for start in range(0, len(pairs), chunk_size):
+            i, j = pairs[start:start + chunk_size, 0], pairs[start:start + chunk_size, 1]
+            name_sim[start:start + chunk_size] = (signatures[i] == signatures[j]).mean(axis=1)
+        focus = self._focus_overlap(masks[pairs[:, 0]], masks[pairs[:, 1]])
+        matched = (name_sim >= self.name_threshold) & (focus >= self.focus_threshold)
+        return matched, name_sim, focus
+
+    @staticmethod
+    def _components(n: int, pairs: np.ndarray) -> np.ndarray:
+        """Union-find на массивах: метка компоненты — наименьший номер строки в ней."""
+        labels = np.arange(n, dtype=np.int64)
+        i, j = pairs[:, 0], pairs[:, 1]
+        while True:
+            # Сжатие путей: каждая строка указывает прямо на корень
+            while True:
+                jumped = labels[labels]
+                if np.array_equal(jumped, labels):
+                    break
+                labels = jumped
+            li, lj = labels[i], labels[j]
+            split = li != lj
+            if not split.any():
+                return labels
+            li, lj = li[split], lj[split]
+            lowest = np.minimum(li, lj)
+            # Подвешиваем корень с большим номером к меньшему
+            np.minimum.at(labels, np.maximum(li, lj), lowest)
+
+    # === Запуск ===
+    def run(self, db_path: str) -> Dict[str, pd.DataFrame]:
+        """
+        Ищет дубликаты в таблице buyers.
+
+        :return: {"clusters": company_id, canonical_id, cluster_size — только покупатели
+                  из кластеров размером больше 1 (остальные сами себе канонические);
+                  "pairs": подтверждённые пары со сходством названий и фокуса}
+        """
+        ids, names, signatures, masks = self._load(db_path)
+        with metrics.span("dedup.candidates"):
+            candidates = self._candidates(signatures, masks)
+        metrics.incr("dedup.candidates", len(candidates))
+        with metrics.span("dedup.verify"):
+            matched, name_sim, focus = self._verify(candidates, signatures, masks)
+        pairs = candidates[matched]
+        with metrics.span("dedup.merge"):
+            labels = self._components(len(ids), pairs)
+        sizes = np.bincount(labels, minlength=len(ids))[labels]
+        members = np.flatnonzero(sizes > 1)
+        metrics.incr("dedup.duplicates", int(np.sum(labels[members] != members)))
+
+        clusters = pd.DataFrame({"company_id": ids[members], "canonical_id": ids[labels[members]],
+                                 "cluster_size": sizes[members]})
+        pairs_df = pd.DataFrame({"company_id": ids[pairs[:, 0]], "name": names[pairs[:, 0]],
+                                 "duplicate_id": ids[pairs[:, 1]], "duplicate_name": names[pairs[:, 1]],
+                                 "name_similarity": name_sim[matched], "focus_overlap": focus[matched]})
+        return {"clusters": clusters, "pairs": pairs_df}
+
+
+def save_canonical_ids(db_path: str, clusters: pd.DataFrame) -> int:
+    """
+    Сохраняет соответствие company_id → canonical_id в таблицу buyer_canonical
+    (в SQLite или файлом .arrow в каталоге Arrow). Предыдущий результат заменяется.
+
+    :return: Число записанных строк
+    """
+    clusters = clusters[["company_id", "canonical_id", "cluster_size"]]
+    if os.path.isdir(db_path):
+        import pyarrow as pa
+
+        path = os.path.join(db_path, f"{CANONICAL_TABLE}.arrow")
+        table = pa.Table.from_pandas(clusters.astype({"cluster_size": "int64"}), preserve_index=False)
+        with pa.ipc.new_file(path + ".tmp", table.schema) as writer:
+            writer.write_table(table)
+        os.replace(path + ".tmp", path)
+        return len(clusters)
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        conn.execute(f"DROP TABLE IF EXISTS {CANONICAL_TABLE}")
+        conn.execute(f"CREATE TABLE {CANONICAL_TABLE} (company_id TEXT PRIMARY KEY, "
+                     f"canonical_id TEXT NOT NULL, cluster_size INTEGER NOT NULL)")
+        conn.executemany(f"INSERT INTO {CANONICAL_TABLE} VALUES (?, ?, ?)",
+                         clusters.astype({"cluster_size": int}).itertuples(index=False, name=None))
+    return len(clusters)
+
+
+def load_canonical_ids(db_path: str) -> Dict[str, str]:
+    """Соответствие id дубликата → канонический id; пусто, если дедупликация не запускалась."""
+    storage = open_storage(db_path)
+    if not storage.has_table(CANONICAL_TABLE):
+        return {}
+    df = storage.read(CANONICAL_TABLE, columns=["company_id", "canonical_id"])
+    df = df[df["company_id"] != df["canonical_id"]]
+    return dict(zip(df["company_id"], df["canonical_id"]))
+
+
+def collapse_duplicates(ranked: List[Dict[str, Any]], canonical: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Оставляет в упорядоченном списке покупателей по одной (первой) записи на канонический id."""
+    seen, result = set(), []
+    for buyer in ranked:
+        key = canonical.get(buyer["company_id"], buyer["company_id"])
+        if key not in seen:
+            seen.add(key)
+            result.append(buyer)
+    return result
+
+
+# === Пример использования ===
+if __name__ == "__main__":
+    import sys
+    import time
+
+    db = sys.argv[1] if len(sys.argv) > 1 else "m_and_a.db"
+    start = time.perf_counter()
+    result = BuyerDeduplicator().run(db)
+    clusters = result["clusters"]
+    print(f"Кластеров: {clusters['canonical_id'].nunique()}, дубликатов: "
+          f"{int((clusters['company_id'] != clusters['canonical_id']).sum())} "
+          f"за {time.perf_counter() - start:.1f} с")
+    print(result["pairs"].head(10).to_string())
+    print(f"Записано в {CANONICAL_TABLE}: {save_canonical_ids(db, clusters)}")
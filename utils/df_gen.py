@@ -1,8 +1,13 @@
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
 import pandas as pd
 import random
 import uuid
 from faker import Faker
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 
 
 class MADatasetGenerator:
@@ -11,10 +16,64 @@ class MADatasetGenerator:
     Поддерживает мультиязычность (немецкие и русские города/названия).
     """
 
-    def __init__(self):
+    # Схема SQLite (совпадает с export_to_sql)
+    SQLITE_SCHEMA = {
+        "sellers": """
+            seller_id TEXT PRIMARY KEY,
+            industry TEXT NOT NULL,
+            geography TEXT NOT NULL,
+            revenue REAL NOT NULL,
+            ebitda REAL NOT NULL,
+            assets TEXT,
+            num_customers INTEGER,
+            usp TEXT""",
+        "buyers": """
+            company_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            type TEXT CHECK(type IN ('strategic', 'financial', 'entrepreneur')),
+            industry_focus TEXT,
+            target_geography TEXT,
+            preferred_revenue_min REAL,
+            preferred_revenue_max REAL,
+            past_acquisitions TEXT,
+            financial_capacity REAL""",
+        "deals": """
+            deal_id TEXT PRIMARY KEY,
+            buyer_id TEXT NOT NULL,
+            target_industry TEXT NOT NULL,
+            target_geography TEXT NOT NULL,
+            target_revenue REAL NOT NULL,
+            target_ebitda REAL NOT NULL,
+            deal_size REAL NOT NULL,
+            revenue_multiple REAL,
+            ebitda_multiple REAL"""
+    }
+
+    # Вторичные индексы создаются после загрузки: так вставка не перестраивает B-деревья на каждой строке
+    SQLITE_INDEXES = [
+        "CREATE INDEX IF NOT EXISTS idx_deals_buyer ON deals (buyer_id)",
+        "CREATE INDEX IF NOT EXISTS idx_deals_target ON deals (target_industry, target_geography)",
+        "CREATE INDEX IF NOT EXISTS idx_buyers_type ON buyers (type)",
+    ]
+
+    # Порядок таблиц: индекс таблицы входит в spawn_key сидов порций
+    TABLES = ("sellers", "buyers", "deals")
+
+    # Размер пула частей имён (фамилий, имён, отчеств) и описаний Faker для векторного режима
+    NAME_POOL_SIZE = 5000
+
+    def __init__(self, seed: Optional[int] = None):
+        """
+        :param seed: Seed векторного режима (NumPy и пулы Faker); None — случайный
+        """
         # Фейкер для генерации имён и описаний
         self.fake_ru = Faker('ru_RU')
         self.fake_de = Faker('de_DE')
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        # Энтропия потоковой генерации: фиксируется один раз, чтобы порции были согласованы
+        self._entropy = np.random.SeedSequence(seed).entropy
+        self._pools: Optional[Dict[str, np.ndarray]] = None
 
         # Настройки можно переопределить через параметры
         self.INDUSTRIES = [
@@ -80,8 +139,308 @@ class MADatasetGenerator:
         else:
             return str(val)
 
-    def generate_sellers(self) -> 'MADatasetGenerator':
+    # === Векторный режим: все поля — массивы NumPy, тексты — из заранее собранных пулов ===
+    def _text_pools(self) -> Dict[str, np.ndarray]:
+        """
+        Пулы частей названий и имён и описаний активов (Faker вызывается NAME_POOL_SIZE раз, а не на строку).
+        Названия собираются из нескольких частей на строку (_names), поэтому повторяются
+        примерно так же редко, как у построчного Faker, а не каждые NAME_POOL_SIZE строк.
+        """
+        if self._pools is None:
+            # Пулы определяются энтропией генератора: в каждом процессе они одинаковы
+            self.fake_ru.seed_instance(self._entropy)
+            self.fake_de.seed_instance(self._entropy)
+            n = self.NAME_POOL_SIZE
+
+            def pool(method, size: int = n) -> np.ndarray:
+                return np.array([method() for _ in range(size)], dtype=object)
+
+            ru = self.fake_ru
+            self._pools = {
+                "first_de": pool(self.fake_de.first_name),
+                "last_de": pool(self.fake_de.last_name),
+                "suffix_de": pool(self.fake_de.company_suffix, n // 50),
+                "last_ru": pool(ru.last_name),
+                "prefix_ru": pool(ru.company_prefix, n // 50),
+                "first_ru_male": pool(ru.first_name_male), "first_ru_female": pool(ru.first_name_female),
+                "middle_ru_male": pool(ru.middle_name_male), "middle_ru_female": pool(ru.middle_name_female),
+                "last_ru_male": pool(ru.last_name_male), "last_ru_female": pool(ru.last_name_female),
+                "sentence_de": pool(lambda: self.fake_de.sentence(nb_words=6), n // 10),
+                "sentence_ru": pool(lambda: ru.sentence(nb_words=6), n // 10),
+            }
+        return self._pools
+
+    @staticmethod
+    def _names(rng: np.random.Generator, pools: Dict[str, np.ndarray], is_person: np.ndarray,
+               use_de: np.ndarray) -> np.ndarray:
+        """Названия компаний и имена людей по шаблонам Faker company()/name() из частей пулов."""
+        count = len(is_person)
+
+        def pick(key: str) -> np.ndarray:
+            return pools[key][rng.integers(0, len(pools[key]), size=count)]
+
+        last_de, last2_de, suffix = pick("last_de"), pick("last_de"), pick("suffix_de")
+        form = rng.integers(0, 3, size=count)
+        company_de = np.where(form == 0, last_de + " " + suffix,
+                              np.where(form == 1, last_de + " " + last2_de + " " + suffix, last_de))
+
+        last, last2, last3 = pick("last_ru"), pick("last_ru"), pick("last_ru")
+        form = rng.integers(0, 4, size=count)
+        title = np.select([form == 0, form == 1, form == 2],
+                          [last, last + " " + last2, last + "-" + last2],
+                          last + ", " + last2 + " и " + last3)
+        company_ru = pick("prefix_ru") + " «" + title + "»"
+
+        name_de = pick("first_de") + " " + last_de
+        female = rng.random(count) < 0.5
+        first, middle, last = (np.where(female, pick(f"{part}_ru_female"), pick(f"{part}_ru_male"))
+                               for part in ("first", "middle", "last"))
+        name_ru = np.where(rng.random(count) < 0.5, last + " " + first + " " + middle,
+                           first + " " + middle + " " + last)
+
+        return np.where(is_person, np.where(use_de, name_de, name_ru), np.where(use_de, company_de, company_ru))
+
+    @staticmethod
+    def _ids(prefix: str, start: int, count: int) -> np.ndarray:
+        """Идентификаторы вида prefix_N для N из [start + 1, start + count]."""
+        return (prefix + pd.Series(np.arange(start + 1, start + count + 1)).astype(str)).to_numpy(dtype=object)
+
+    @staticmethod
+    def _sample_subsets(rng: np.random.Generator, options: List[str], size: int, k_max: int = 3) -> List[List[str]]:
+        """
+        Аналог random.sample(options, k=randint(1, k_max)) для size строк сразу:
+        случайная перестановка через argsort, первые k элементов каждой строки.
+        """
+        order = rng.random((size, len(options))).argsort(axis=1)[:, :k_max]
+        k = rng.integers(1, k_max + 1, size=size)
+        values = np.array(options, dtype=object)[order]
+        return [row[:n].tolist() for row, n in zip(values, k)]
+
+    def _sellers_frame(self, rng: np.random.Generator, start: int, count: int) -> pd.DataFrame:
+        pools = self._text_pools()
+        geo = rng.integers(0, len(self.GEOGRAPHIES), size=count)
+        geographies = np.array(self.GEOGRAPHIES, dtype=object)[geo]
+        is_de = np.isin(geographies, list(self.GERMAN_CITIES))
+        rev = np.round(rng.uniform(5, 100, size=count), 1)
+        assets = np.where(
+            is_de,
+            pools["sentence_de"][rng.integers(0, len(pools["sentence_de"]), size=count)],
+            pools["sentence_ru"][rng.integers(0, len(pools["sentence_ru"]), size=count)]
+        )
+        return pd.DataFrame({
+            "seller_id": self._ids("s_", start, count),
+            "industry": np.array(self.INDUSTRIES, dtype=object)[rng.integers(0, len(self.INDUSTRIES), size=count)],
+            "geography": geographies,
+            "revenue": rev,
+            "ebitda": np.round(rev * rng.uniform(0.1, 0.3, size=count), 1),
+            "assets": assets,
+            "num_customers": rng.integers(500, 100001, size=count),
+            "usp": np.array(self.USP_EXAMPLES, dtype=object)[rng.integers(0, len(self.USP_EXAMPLES), size=count)]
+        })
+
+    def _buyers_frame(self, rng: np.random.Generator, start: int, count: int) -> pd.DataFrame:
+        pools = self._text_pools()
+        types = rng.integers(0, len(self.BUYER_TYPES), size=count)
+        use_de = rng.random(count) < 0.5
+        is_person = types == self.BUYER_TYPES.index('entrepreneur')
+        names = self._names(rng, pools, is_person, use_de)
+        rev_min = np.round(rng.uniform(3, 50, size=count), 1)
+
+        # Прошлые сделки: 0–3 на покупателя, все отрасли/города одним массивом, затем нарезка
+        n_acq = rng.integers(0, 4, size=count)
+        total = int(n_acq.sum())
+        acq_ind = np.array(self.INDUSTRIES, dtype=object)[rng.integers(0, len(self.INDUSTRIES), size=total)]
+        acq_geo = np.array(self.GEOGRAPHIES, dtype=object)[rng.integers(0, len(self.GEOGRAPHIES), size=total)]
+        acq = [{"industry": i, "geography": g} for i, g in zip(acq_ind.tolist(), acq_geo.tolist())]
+        bounds = np.concatenate(([0], np.cumsum(n_acq))).tolist()
+        past_acq = [acq[bounds[j]:bounds[j + 1]] for j in range(count)]
+
+        return pd.DataFrame({
+            "company_id": self._ids("b_", start, count),
+            "name": names,
+            "type": np.array(self.BUYER_TYPES, dtype=object)[types],
+            "industry_focus": self._sample_subsets(rng, self.INDUSTRIES, count),
+            "target_geography": self._sample_subsets(rng, self.GEOGRAPHIES, count),
+            "preferred_revenue_min": rev_min,
+            "preferred_revenue_max": np.round(rev_min + rng.uniform(10, 80, size=count), 1),
+            "past_acquisitions": past_acq,
+            "financial_capacity": np.round(rng.uniform(10, 200, size=count), 1)
+        })
+
+    def _deals_frame(self, rng: np.random.Generator, start: int, count: int, num_buyers: int) -> pd.DataFrame:
+        # Покупатель сделки — случайный индекс из диапазона id, без обращения к таблице покупателей
+        buyer_idx = rng.integers(1, num_buyers + 1, size=count)
+        target_revenue = np.round(rng.uniform(5, 90, size=count), 1)
+        target_ebitda = np.round(target_revenue * rng.uniform(0.12, 0.28, size=count), 1)
+        ebitda_multiple = np.round(rng.uniform(4, 9, size=count), 1)
+        deal_size = np.round(target_ebitda * ebitda_multiple, 1)
+        revenue_multiple = np.round(np.divide(
+            deal_size, target_revenue, out=np.zeros(count), where=target_revenue > 0
+        ), 1)
+        return pd.DataFrame({
+            "deal_id": self._ids("d_", start, count),
+            "buyer_id": ("b_" + pd.Series(buyer_idx).astype(str)).to_numpy(dtype=object),
+            "target_industry": np.array(self.INDUSTRIES, dtype=object)[rng.integers(0, len(self.INDUSTRIES), size=count)],
+            "target_geography": np.array(self.GEOGRAPHIES, dtype=object)[rng.integers(0, len(self.GEOGRAPHIES), size=count)],
+            "target_revenue": target_revenue,
+            "target_ebitda": target_ebitda,
+            "deal_size": deal_size,
+            "revenue_multiple": revenue_multiple,
+            "ebitda_multiple": ebitda_multiple
+        })
+
+    def _chunk_rng(self, table: str, chunk_no: int) -> np.random.Generator:
+        """Независимый генератор порции: зависит только от seed, таблицы и номера порции."""
+        return np.random.default_rng(
+            np.random.SeedSequence(self._entropy, spawn_key=(self.TABLES.index(table), chunk_no))
+        )
+
+    def _table_size(self, table: str) -> int:
+        return {"sellers": self.NUM_SELLERS, "buyers": self.NUM_BUYERS, "deals": self.NUM_DEALS}[table]
+
+    def generate_chunk(self, table: str, chunk_no: int, chunk_size: int) -> pd.DataFrame:
+        """
+        Генерирует одну порцию таблицы: строки [chunk_no * chunk_size, ...) со своими id.
+        Сделки ссылаются на покупателей по диапазону id, таблица покупателей не нужна.
+        """
+        start = chunk_no * chunk_size
+        count = min(chunk_size, self._table_size(table) - start)
+        rng = self._chunk_rng(table, chunk_no)
+        if table == "sellers":
+            return self._sellers_frame(rng, start, count)
+        if table == "buyers":
+            return self._buyers_frame(rng, start, count)
+        return self._deals_frame(rng, start, count, self.NUM_BUYERS)
+
+    def iter_chunks(self, table: str, chunk_size: int = 100_000) -> Iterator[pd.DataFrame]:
+        """Порции таблицы по chunk_size строк; в памяти одновременно только одна порция."""
+        n_chunks = -(-self._table_size(table) // chunk_size)
+        for chunk_no in range(n_chunks):
+            yield self.generate_chunk(table, chunk_no, chunk_size)
+
+    def _config(self) -> Tuple[int, int, int, int]:
+        return self._entropy, self.NUM_SELLERS, self.NUM_BUYERS, self.NUM_DEALS
+
+    def _partitions(self, chunk_size: int) -> List[Tuple[str, int]]:
+        """Разбиение всех таблиц на диапазоны id: (таблица, номер порции)."""
+        return [
+            (table, chunk_no)
+            for table in self.TABLES
+            for chunk_no in range(-(-self._table_size(table) // chunk_size))
+        ]
+
+    def _run_partitions(self, task, extra: tuple, chunk_size: int, n_workers: int) -> Iterator[Tuple[str, Any]]:
+        """
+        Выполняет task(config, table, chunk_no, chunk_size, *extra) для всех порций
+        и отдаёт результаты строго в порядке порций. В работе не более 2 × n_workers порций,
+        поэтому память ограничена независимо от объёма данных.
+        """
+        partitions = self._partitions(chunk_size)
+        config = self._config()
+        if n_workers <= 1:
+            for table, chunk_no in partitions:
+                yield table, task(config, table, chunk_no, chunk_size, *extra)
+            return
+
+        window = 2 * n_workers
+        pending, ready = {}, {}
+        next_submit, next_merge = 0, 0
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            while next_merge < len(partitions):
+                while next_submit < len(partitions) and len(pending) + len(ready) < window:
+                    table, chunk_no = partitions[next_submit]
+                    pending[pool.submit(task, config, table, chunk_no, chunk_size, *extra)] = next_submit
+                    next_submit += 1
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ready[pending.pop(future)] = future.result()
+                while next_merge in ready:
+                    yield partitions[next_merge][0], ready.pop(next_merge)
+                    next_merge += 1
+
+    def parallel_to_sqlite(self, db_path: str = "m_and_a_generated.db", n_workers: Optional[int] = None,
+                           chunk_size: int = 100_000, replace: bool = False):
+        """
+        Параллельная генерация в SQLite: порции генерируются и сериализуются в пуле процессов,
+        единственный писатель вставляет их по порядку. Содержимое базы не зависит от n_workers.
+
+        :param n_workers: Число процессов (по умолчанию — число CPU)
+        """
+        n_workers = n_workers or os.cpu_count() or 1
+        conn = self._open_bulk_connection(db_path, replace)
+        try:
+            conn.execute("BEGIN")
+            self._create_schema(conn)
+            for table, (columns, rows) in self._run_partitions(_partition_rows, (), chunk_size, n_workers):
+                if rows:
+                    conn.executemany(
+                        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                        rows
+                    )
+            self._create_indexes(conn)
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        print(f"База '{db_path}' успешно создана.")
+
+    def parallel_to_parquet(self, directory: str = "m_and_a_parquet", n_workers: Optional[int] = None,
+                            chunk_size: int = 100_000):
+        """
+        Параллельная генерация в Parquet-датасет: <directory>/<таблица>/part-<порция>.parquet.
+        Каждый процесс пишет свои файлы сам; имена определяются номером порции.
+        """
+        n_workers = n_workers or os.cpu_count() or 1
+        for table in self.TABLES:
+            os.makedirs(os.path.join(directory, table), exist_ok=True)
+        for _ in self._run_partitions(_partition_parquet, (directory,), chunk_size, n_workers):
+            pass
+        print(f"Parquet-датасет записан в '{directory}'.")
+
+    def stream_to_sqlite(self, db_path: str = "m_and_a_generated.db", chunk_size: int = 100_000,
+                         replace: bool = False):
+        """
+        Потоковая генерация прямо в SQLite: пиковая память определяется chunk_size,
+        а не числом строк. df_sellers/df_buyers/df_deals не заполняются.
+        """
+        conn = self._open_bulk_connection(db_path, replace)
+        try:
+            conn.execute("BEGIN")
+            self._create_schema(conn)
+            for table in self.TABLES:
+                for chunk in self.iter_chunks(table, chunk_size):
+                    self._insert_frame(conn, table, chunk)
+            self._create_indexes(conn)
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        print(f"База '{db_path}' успешно создана.")
+
+    def stream_to_parquet(self, directory: str = "m_and_a_parquet", chunk_size: int = 100_000):
+        """Потоковая генерация в Parquet: каждая порция — отдельная row group файла таблицы."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(directory, exist_ok=True)
+        for table in self.TABLES:
+            writer = None
+            try:
+                for chunk in self.iter_chunks(table, chunk_size):
+                    if writer is None:
+                        batch = pa.Table.from_pandas(chunk, preserve_index=False)
+                        writer = pq.ParquetWriter(os.path.join(directory, f"{table}.parquet"), batch.schema)
+                    else:
+                        batch = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+                    writer.write_table(batch)
+            finally:
+                if writer is not None:
+                    writer.close()
+        print(f"Parquet-файлы записаны в '{directory}'.")
+
+    def generate_sellers(self, vectorized: bool = False) -> 'MADatasetGenerator':
         """Генерирует данные о продавцах."""
+        if vectorized:
+            self.df_sellers = self._sellers_frame(self.rng, 0, self.NUM_SELLERS)
+            return self
         sellers = []
         for i in range(self.NUM_SELLERS):
             geography = random.choice(self.GEOGRAPHIES)
@@ -104,8 +463,11 @@ class MADatasetGenerator:
         self.df_sellers = pd.DataFrame(sellers)
         return self
 
-    def generate_buyers(self) -> 'MADatasetGenerator':
+    def generate_buyers(self, vectorized: bool = False) -> 'MADatasetGenerator':
         """Генерирует данные о покупателях."""
+        if vectorized:
+            self.df_buyers = self._buyers_frame(self.rng, 0, self.NUM_BUYERS)
+            return self
         buyers = []
         for i in range(self.NUM_BUYERS):
             buyer_type = random.choice(self.BUYER_TYPES)
@@ -139,8 +501,11 @@ class MADatasetGenerator:
         self.df_buyers = pd.DataFrame(buyers)
         return self
 
-    def generate_deals(self) -> 'MADatasetGenerator':
+    def generate_deals(self, vectorized: bool = False) -> 'MADatasetGenerator':
         """Генерирует данные о сделках."""
+        if vectorized:
+            self.df_deals = self._deals_frame(self.rng, 0, self.NUM_DEALS, self.NUM_BUYERS)
+            return self
         deals = []
         for i in range(self.NUM_DEALS):
             buyer = self.df_buyers.sample(1).iloc[0]  # случайный покупатель
@@ -168,13 +533,15 @@ class MADatasetGenerator:
         self.df_deals = pd.DataFrame(deals)
         return self
 
-    def generate_all(self) -> 'MADatasetGenerator':
+    def generate_all(self, vectorized: bool = False) -> 'MADatasetGenerator':
         """
         Генерирует все таблицы: sellers, buyers, deals.
+
+        :param vectorized: Векторный режим NumPy (миллионы строк за минуты, воспроизводим по seed)
         """
-        self.generate_sellers()
-        self.generate_buyers()
-        self.generate_deals()
+        self.generate_sellers(vectorized)
+        self.generate_buyers(vectorized)
+        self.generate_deals(vectorized)
         return self
 
     def export_to_sql(self, filename: str = "m_and_a_sqlite_compatible.sql"):
@@ -227,6 +594,92 @@ class MADatasetGenerator:
 
         print(f"Файл '{filename}' успешно создан — готов к импорту в DB Browser for SQLite.")
 
+    @staticmethod
+    def _open_bulk_connection(db_path: str, replace: bool = False) -> sqlite3.Connection:
+        """
+        Соединение с прагмами массовой загрузки: без журнала и fsync, большой кэш.
+        Существующая база удаляется только при replace=True, иначе — FileExistsError.
+        """
+        if os.path.exists(db_path):
+            if not replace:
+                raise FileExistsError(f"База '{db_path}' уже существует (replace=True — пересоздать её)")
+            os.remove(db_path)
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA locking_mode = EXCLUSIVE")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -262144")  # 256 МБ
+        return conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        for table, columns in self.SQLITE_SCHEMA.items():
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns}\n)")
+
+    def _create_indexes(self, conn: sqlite3.Connection):
+        for statement in self.SQLITE_INDEXES:
+            conn.execute(statement)
+        conn.execute("ANALYZE")
+
+    @staticmethod
+    def _sql_rows(df: pd.DataFrame):
+        """
+        Строки для executemany: столбцы переводятся в списки Python целиком,
+        списки и словари сериализуются так же, как в export_to_sql (их разбирает literal_eval).
+        """
+        columns = []
+        for col in df.columns:
+            values = df[col].tolist()
+            if df[col].dtype == object and any(isinstance(v, (list, dict)) for v in values[:1]):
+                values = [str(v) for v in values]
+            columns.append(values)
+        return zip(*columns)
+
+    def _insert_frame(self, conn: sqlite3.Connection, table: str, df: pd.DataFrame):
+        if df.empty:
+            return
+        placeholders = ", ".join("?" * len(df.columns))
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(df.columns)}) VALUES ({placeholders})",
+            self._sql_rows(df)
+        )
+
+    def export_to_sqlite(self, db_path: str = "m_and_a_generated.db", replace: bool = False,
+                         batch_size: int = 200_000):
+        """
+        Загружает сгенерированные данные прямо в базу SQLite.
+        Вставка идёт через executemany порциями по batch_size строк в одной транзакции,
+        индексы строятся после загрузки.
+
+        :param db_path: Путь к базе
+        :param replace: Удалить существующий файл базы перед загрузкой (иначе — FileExistsError)
+        :param batch_size: Число строк в одном вызове executemany
+        """
+        conn = self._open_bulk_connection(db_path, replace)
+        try:
+            conn.execute("BEGIN")
+            self._create_schema(conn)
+            for table, df in (("sellers", self.df_sellers), ("buyers", self.df_buyers), ("deals", self.df_deals)):
+                for start in range(0, len(df), batch_size):
+                    self._insert_frame(conn, table, df.iloc[start:start + batch_size])
+            self._create_indexes(conn)
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        print(f"База '{db_path}' успешно создана.")
+
+    def export_to_parquet(self, directory: str = "m_and_a_parquet"):
+        """
+        Экспортирует таблицы в колоночный формат Parquet: <directory>/<таблица>.parquet.
+        Фокусы покупателей хранятся как list<string>, прошлые сделки — как list<struct>.
+
+        :param directory: Каталог для файлов
+        """
+        os.makedirs(directory, exist_ok=True)
+        for table, df in (("sellers", self.df_sellers), ("buyers", self.df_buyers), ("deals", self.df_deals)):
+            df.to_parquet(os.path.join(directory, f"{table}.parquet"), engine="pyarrow", index=False)
+        print(f"Parquet-файлы записаны в '{directory}'.")
+
     def _write_inserts(self, f, table_name: str, df: pd.DataFrame):
         """Вспомогательный метод для записи INSERT-запросов."""
         if df.empty:
@@ -241,6 +694,34 @@ class MADatasetGenerator:
         f.write(",\n".join(rows) + ";\n\n")
 
 
+# === Задачи пула процессов (верхний уровень модуля — чтобы их можно было передать в процесс) ===
+_worker_generators: Dict[Tuple[int, int, int, int], MADatasetGenerator] = {}
+
+
+def _worker_generator(config: Tuple[int, int, int, int]) -> MADatasetGenerator:
+    """Генератор процесса-исполнителя; пулы Faker собираются один раз на процесс."""
+    generator = _worker_generators.get(config)
+    if generator is None:
+        entropy, num_sellers, num_buyers, num_deals = config
+        generator = MADatasetGenerator(seed=entropy).set_config(num_sellers, num_buyers, num_deals)
+        _worker_generators.clear()
+        _worker_generators[config] = generator
+    return generator
+
+
+def _partition_rows(config, table: str, chunk_no: int, chunk_size: int) -> Tuple[List[str], list]:
+    generator = _worker_generator(config)
+    chunk = generator.generate_chunk(table, chunk_no, chunk_size)
+    return list(chunk.columns), list(generator._sql_rows(chunk))
+
+
+def _partition_parquet(config, table: str, chunk_no: int, chunk_size: int, directory: str) -> str:
+    chunk = _worker_generator(config).generate_chunk(table, chunk_no, chunk_size)
+    path = os.path.join(directory, table, f"part-{chunk_no:05d}.parquet")
+    chunk.to_parquet(path, engine="pyarrow", index=False)
+    return path
+
+
 # === Пример использования ===
 if __name__ == "__main__":
     generator = MADatasetGenerator()
@@ -248,6 +729,11 @@ if __name__ == "__main__":
     generator.generate_all()
     generator.export_to_sql("m_and_a_sqlite_compatible.sql")
 
+    # Прямая загрузка в SQLite (путь к базе — первый аргумент командной строки).
+    # Существующая база перезаписывается только с --replace: m_and_a.db читают приложение и тесты
+    generator.export_to_sqlite(sys.argv[1] if len(sys.argv) > 1 else "m_and_a_generated.db",
+                               replace="--replace" in sys.argv[2:])
+
     # Дополнительно: можно использовать DataFrame в памяти
     # print("\nПример данных о продавцах:")
     # print(generator.df_sellers.head())
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, List
+
+from .document_access import DocumentAccessManager
+from .metrics import metrics
+
+
+class DossierPayload:
+    """Готовый к отдаче документ: байты JSON и их ETag."""
+
+    __slots__ = ("body", "etag", "kind")
+    content_type = "application/json; charset=utf-8"
+
+    def __init__(self, body: bytes, kind: str):
+        self.body = body
+        self.kind = kind
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class DossierService:
+    """
+    Выдача teaser и полного досье нескольких продавцов множеству покупателей.
+
+    Состояние NDA хранится по паре (продавец, покупатель). Документ каждого вида
+    сериализуется один раз и хранится в LRU-кэше готовыми байтами с ETag,
+    поэтому обработка запроса — поиск в словарях и запись события в буфер.
+    События доступа дописываются в журнал (JSON Lines) пачками по flush_every.
+    """
+
+    def __init__(self, log_path: Optional[str] = None, cache_size: int = 1024, flush_every: int = 256):
+        """
+        :param log_path: Файл журнала доступа (None — журнал не ведётся)
+        :param cache_size: Число документов в LRU-кэше
+        :param flush_every: Размер пачки событий для записи в журнал
+        """
+        self.log_path = log_path
+        self.cache_size = cache_size
+        self.flush_every = flush_every
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        self._nda: Dict[str, set] = {}
+        self._cache: "OrderedDict[Tuple[str, str], DossierPayload]" = OrderedDict()
+        self._events: List[str] = []
+        self._lock = threading.Lock()
+
+    # === Продавцы и NDA ===
+    def register_seller(self, seller_id: str, seller_profile: Dict[str, Any]):
+        """Регистрирует продавца; при изменении профиля его документы пересобираются."""
+        with self._lock:
+            if self._profiles.get(seller_id) == seller_profile:
+                return
+            self._profiles[seller_id] = dict(seller_profile)
+            for kind in ("teaser", "full"):
+                self._cache.pop((seller_id, kind), None)
+
+    def grant_nda(self, seller_id: str, buyer_id: str):
+        with self._lock:
+            self._nda.setdefault(seller_id, set()).add(buyer_id)
+            self._log(seller_id, buyer_id, "nda_granted", None)
+
+    def revoke_nda(self, seller_id: str, buyer_id: str):
+        with self._lock:
+            self._nda.get(seller_id, set()).discard(buyer_id)
+            self._log(seller_id, buyer_id, "nda_revoked", None)
+
+    def has_nda(self, seller_id: str, buyer_id: str) -> bool:
+        return buyer_id in self._nda.get(seller_id, ())
+
+    # === Выдача документов ===
+    def serve(self, seller_id: str, buyer_id: str, if_none_match: Optional[str] = None) -> Tuple[int, Optional[DossierPayload]]:
+        """
+        Документ для покупателя: полное досье при подписанном NDA, иначе teaser.
+
+        :param if_none_match: ETag из кэша клиента
+        :return: (HTTP-статус, документ): 200 — документ, 304 — не изменился, 404 — продавец неизвестен
+        """
+        with self._lock:
+            if seller_id not in self._profiles:
+                self._log(seller_id, buyer_id, "request", 404)
+                return 404, None
+            kind = "full" if buyer_id in self._nda.get(seller_id, ()) else "teaser"
+            payload = self._payload(seller_id, kind)
+            status = 304 if if_none_match == payload.etag else 200
+            self._log(seller_id, buyer_id, kind, status)
+            return status, payload
+
+    def _payload(self, seller_id: str, kind: str) -> DossierPayload:
+        key = (seller_id, kind)
+        payload = self._cache.get(key)
+        if payload is not None:
+            self._cache.move_to_end(key)
+            metrics.incr("cache_hits.dossier")
+            return payload
+        metrics.incr("cache_misses.dossier")
+        manager = DocumentAccessManager(self._profiles[seller_id])
+        document = manager.get_full_dossier(nda_signed=(kind == "full"))
+        payload = DossierPayload(json.dumps(document, ensure_ascii=False, indent=2).encode("utf-8"), kind)
+        self._cache[key] = payload
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return payload
+
+    # === Журнал доступа ===
+    def _log(self, seller_id: str, buyer_id: str, action: str, status: Optional[int]):
+        if self.log_path is None:
+            return
+        self._events.append(json.dumps({
+            "ts": time.time(), "seller_id": seller_id, "buyer_id": buyer_id,
+            "action": action, "status": status
+        }, ensure_ascii=False))
+        if len(self._events) >= self.flush_every:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._events:
+            return
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(self._events) + "\n")
+        self._events.clear()
+
+    def flush(self):
+        """Дописывает накопленные события в журнал."""
+        with self._lock:
+            if self.log_path is not None:
+                self._flush_locked()
+
+    def close(self):
+        self.flush()
+
+
+# === Пример использования ===
+if __name__ == "__main__":
+    seller = {
+        "industry": "Стоматологические клиники",
+        "geography": "Берлин",
+        "revenue": 10.0,
+        "ebitda": 2.0,
+        "assets": "Современное оборудование и лояльная клиентская база",
+        "num_customers": 5000,
+        "usp": "Высокая маржинальность и стабильный кэш-флоу"
+    }
+    service = DossierService(log_path="dossier_access.log")
+    service.register_seller("s_1", seller)
+    service.grant_nda("s_1", "b_1")
+
+    start = time.perf_counter()
+    n_requests = 100000
+    for i in range(n_requests):
+        service.serve("s_1", f"b_{i % 150 + 1}")
+    elapsed = time.perf_counter() - start
+    service.close()
+
+    status, payload = service.serve("s_1", "b_1")
+    print(status, payload.etag, payload.body.decode("utf-8")[:80])
+    print(f"{n_requests / elapsed:,.0f} запросов/с")
@@ -1,12 +1,16 @@
 import random
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 class EmailGenerator:
     """
     Генератор персонализированных email-предложений для M&A-рассылки.
     """
 
-    def __init__(self):
+    def __init__(self, rng: Optional[random.Random] = None):
+        """
+        :param rng: Генератор случайных чисел для выбора шаблона и контекста (None — новый несидированный)
+        """
+        self.rng = rng if rng is not None else random.Random()
         # Шаблоны можно вынести в JSON или конфиг позже
         self._templates = {
             "strategic": [
@@ -67,7 +71,7 @@ class EmailGenerator:
 
         # Выбираем шаблон
         if buyer_type in self._templates:
-            template = random.choice(self._templates[buyer_type])
+            template = self.rng.choice(self._templates[buyer_type])
             return template.format(
                 name=name,
                 industry_context=industry_context,
@@ -84,7 +88,7 @@ class EmailGenerator:
         """Возвращает релевантное значение из предпочтений покупателя или случайный выбор."""
         if seller_value in buyer_list:
             return seller_value
-        return random.choice(buyer_list) if buyer_list else seller_value
+        return self.rng.choice(buyer_list) if buyer_list else seller_value
 
 
 # === Пример использования ===
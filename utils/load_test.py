@@ -0,0 +1,520 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, List, Optional
+
+import numpy as np
+
+from .metrics import metrics
+
+# Значения полей ввода app.py, из которых сессии собирают продавцов
+SESSION_INDUSTRIES = ["Стоматологические клиники", "Аптеки", "Фитнес-клубы", "IT-аутсорсинг"]
+SESSION_GEOGRAPHIES = ["Берлин", "Мюнхен", "Москва", "Санкт-Петербург"]
+SESSION_REVENUES = np.arange(5.0, 100.5, 0.5)
+
+PERCENTILES = (50, 95, 99)
+
+
+def random_seller(rng: np.random.Generator) -> Dict[str, Any]:
+    """Продавец, каким его вводит пользователь в app.py."""
+    ebitda = round(float(rng.uniform(0.0, 10.0)), 1) if rng.random() < 0.5 else 0.0
+    return {
+        "industry": SESSION_INDUSTRIES[rng.integers(len(SESSION_INDUSTRIES))],
+        "geography": SESSION_GEOGRAPHIES[rng.integers(len(SESSION_GEOGRAPHIES))],
+        "revenue": float(SESSION_REVENUES[rng.integers(len(SESSION_REVENUES))]),
+        "ebitda": ebitda if ebitda > 0 else None,
+        "assets": "Современное оборудование и лояльная клиентская база",
+        "num_customers": 5000,
+        "usp": "Высокая маржинальность и стабильный кэш-флоу"
+    }
+
+
+# === Сбор замеров ===
+
+class LatencyRecorder:
+    """Длительности этапов по всем сессиям (потокобезопасно) и перцентили по ним."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+
+    def error(self, stage: str):
+        with self._lock:
+            self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def timed(self, stage: str, func: Callable) -> Callable:
+        """Оборачивает функцию этапа замером времени её выполнения."""
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return wrapper
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            samples = {stage: np.asarray(values) for stage, values in self._samples.items()}
+        result = {}
+        for stage, values in sorted(samples.items()):
+            stats = {"count": int(len(values)), "mean": float(values.mean()), "max": float(values.max())}
+            for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                stats[f"p{q}"] = float(value)
+            result[stage] = stats
+        return result
+
+
+class ResourceSampler:
+    """
+    Периодически записывает загрузку CPU и RSS процесса (и его дочерних процессов) из /proc.
+    Без /proc (не Linux) CPU берётся из getrusage, а RSS — пиковый ru_maxrss.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.samples: List[Dict[str, Any]] = []
+        self.active_sessions = 0
+        self.completed_runs = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self._has_proc = os.path.exists("/proc/self/stat")
+
+    def _proc_cpu_seconds(self, pid: str) -> float:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return 0.0
+        # utime и stime (поля 14–15 в нумерации proc(5))
+        return (int(fields[11]) + int(fields[12])) / self._ticks
+
+    def _children(self) -> List[str]:
+        pids = []
+        try:
+            for task in os.listdir("/proc/self/task"):
+                with open(f"/proc/self/task/{task}/children") as f:
+                    pids.extend(f.read().split())
+        except OSError:
+            pass
+        return pids
+
+    def _cpu_seconds(self) -> float:
+        """CPU процесса и работающих дочерних процессов (пул построения графа)."""
+        if self._has_proc:
+            return self._proc_cpu_seconds("self") + sum(self._proc_cpu_seconds(pid) for pid in self._children())
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_utime + usage.ru_stime
+
+    @staticmethod
+    def _rss_mb(pid: str = "self") -> Optional[float]:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            return None
+        return None
+
+    def _children_rss_mb(self) -> float:
+        return sum(self._rss_mb(pid) or 0.0 for pid in self._children())
+
+    def _sample(self, start: float, last: Dict[str, float]):
+        now, cpu = time.perf_counter(), self._cpu_seconds()
+        elapsed = now - last["wall"]
+        rss = self._rss_mb() if self._has_proc else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.samples.append({
+            "t": round(now - start, 3),
+            "cpu_percent": round(100.0 * (cpu - last["cpu"]) / elapsed, 1) if elapsed > 0 else 0.0,
+            "rss_mb": round(rss, 1) if rss is not None else None,
+            "children_rss_mb": round(self._children_rss_mb(), 1) if self._has_proc else None,
+            "active_sessions": self.active_sessions,
+            "completed_runs": self.completed_runs
+        })
+        last["wall"], last["cpu"] = now, cpu
+
+    def _loop(self):
+        start = time.perf_counter()
+        last = {"wall": start, "cpu": self._cpu_seconds()}
+        while not self._stop.wait(self.interval):
+            self._sample(start, last)
+        self._sample(start, last)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="resource-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        cpu = [s["cpu_percent"] for s in self.samples]
+        rss = [s["rss_mb"] for s in self.samples if s["rss_mb"] is not None]
+        return {
+            "cpu_percent_mean": float(np.mean(cpu)) if cpu else None,
+            "cpu_percent_max": float(np.max(cpu)) if cpu else None,
+            "rss_mb_max": float(np.max(rss)) if rss else None
+        }
+
+
+# === Сессии без UI: те же этапы и зависимости, что в app.py ===
+
+class _DataCache:
+    """Аналог st.cache_data: LRU результатов по ключу, вычисление — вне блокировки."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[tuple, Any]" = OrderedDict()
+
+    def get(self, key: tuple, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                metrics.incr(f"cache_hits.{key[0]}")
+                return self._data[key]
+        metrics.incr(f"cache_misses.{key[0]}")
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            if len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return value
+
+
+class HeadlessApp:
+    """
+    Серверная часть app.py без Streamlit: общие ресурсы (модель ранжирования, профили,
+    генератор teaser, пул процессов для графа) создаются один раз на процесс,
+    как st.cache_resource, а каждый прогон проходит граф этапов через StageScheduler.
+    """
+
+    def __init__(self, db_path: str, use_model: bool = False, cache: bool = True, graph: bool = True,
+                 ui_sleep: float = 0.0):
+        """
+        :param use_model: Генерировать teaser языковой моделью (по умолчанию — шаблоны)
+        :param cache: Кэшировать результаты этапов по продавцу, как st.cache_data
+        :param graph: Строить граф связей (в пуле процессов, как в app.py)
+        :param ui_sleep: Пауза на каждый шаг показа аукциона в потоке сессии
+                         (эмуляция прежнего UI с time.sleep)
+        """
+        from .buyer_response_simulator import BuyerResponseSimulator
+        from .data_loader import BuyerDataLoader
+        from .pipeline import data_version
+        from .ranking import BuyerRanker
+        from .teaser_generator_hf import TeaserGenerator
+
+        self.db_path = db_path
+        self.version = data_version(db_path)
+        self.graph = graph
+        self.ui_sleep = ui_sleep
+        self.ranker = BuyerRanker(db_path, dedup=True)
+        self.ranker.fit()
+        self.teaser_generator = TeaserGenerator(use_model=use_model)
+        buyers_df = BuyerDataLoader(db_path).load_buyers()
+        self.profiles = dict(zip(buyers_df["company_id"], buyers_df.to_dict("records")))
+        self.cache = _DataCache() if cache else None
+        self.process_pool = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) \
+            if graph else None
+        self._simulator_class = BuyerResponseSimulator
+
+    def close(self):
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+
+    def _cached(self, stage: str, key: tuple, compute: Callable[[], Any]) -> Any:
+        if self.cache is None:
+            return compute()
+        return self.cache.get((stage, self.version, key), compute)
+
+    def run(self, seller: Dict[str, Any], recorder: LatencyRecorder, rng: np.random.Generator):
+        """Один прогон «Запустить анализ продажи»: этапы и зависимости как в app.py."""
+        from .auction_simulator import AuctionSimulator
+        from .company_graph import render_graph_png
+        from .deal_monte_carlo import DealMonteCarlo
+        from .email_generator import EmailGenerator
+        from .pipeline import seller_key
+        from .stage_scheduler import StageScheduler
+        from .valuation import BusinessValuationEngine
+
+        key = seller_key(seller)
+        simulator = self._simulator_class(rng=rng)
+
+        def ranking():
+            def compute():
+                ranked = self.ranker.rank(dict(key), top_k=10)
+                for i, b in enumerate(ranked, 1):
+                    b["rank"] = i
+                return ranked
+            return self._cached("ranking", key, compute)
+
+        def responses(ranking, profiles):
+            result = simulator.simulate(ranking, profiles, seller)
+            return result, simulator.simulate_many(ranking, profiles, seller, n_trials=100000)
+
+        def auction(responses, valuation, ranking, profiles):
+            if valuation["error"]:
+                return None
+            result = AuctionSimulator(rng=rng).simulate(valuation["estimated_value"], responses[0])
+            price_range = DealMonteCarlo(simulator, n_workers=1).run(
+                valuation["estimated_value"], ranking, profiles, seller, n_trials=20000, seed=0
+            )
+            if self.ui_sleep:
+                events = AuctionSimulator.reveal_events(valuation["estimated_value"], result["nda_count"],
+                                                        result["final_price"], result["multiplier"])
+                time.sleep(self.ui_sleep * len(events))
+            return result, price_range
+
+        stages = {
+            "valuation": (lambda: self._cached(
+                "valuation", key, lambda: BusinessValuationEngine(self.db_path).estimate(dict(key))), ()),
+            "ranking": (ranking, ()),
+            "teaser": (lambda: self._cached("teaser", key, lambda: self.teaser_generator.generate(dict(key))), ()),
+            "profiles": (lambda: self.profiles, ()),
+            "email": (lambda ranking, profiles: EmailGenerator().generate(profiles[ranking[0]["company_id"]], seller),
+                      ("ranking", "profiles")),
+            "responses": (responses, ("ranking", "profiles")),
+            "auction": (auction, ("responses", "valuation", "ranking", "profiles")),
+        }
+        if self.graph:
+            stages["graph"] = (lambda: self._cached("graph", key, lambda: self.process_pool.submit(
+                render_graph_png, self.db_path, dict(key), 8).result()), ())
+
+        scheduler = StageScheduler(max_threads=6)
+        for name, (func, deps) in stages.items():
+            scheduler.add(name, recorder.timed(name, func), deps=deps)
+        for name, result in scheduler.run():
+            if name == "valuation" and result["error"]:
+                # Как st.stop() в app.py: остальные этапы не показываются
+                break
+
+
+class StreamlitSession:
+    """
+    Сессия через streamlit.testing (AppTest): скрипт app.py выполняется целиком,
+    поэтому замеряется только время прогона, а разбивка по этапам — из общего реестра метрик.
+    """
+
+    def __init__(self, app_path: str = "app.py", timeout: float = 300.0):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(app_path, default_timeout=timeout)
+        self.app.run()
+
+    def run(self, seller: Dict[str, Any], recorder: LatencyRecorder, rng: np.random.Generator):
+        self.app.selectbox[0].select(seller["industry"])
+        self.app.selectbox[1].select(seller["geography"])
+        self.app.number_input[0].set_value(seller["revenue"])
+        self.app.number_input[1].set_value(seller["ebitda"] or 0.0)
+        self.app.button[0].click().run()
+        if self.app.exception:
+            raise RuntimeError(self.app.exception[0].message)
+
+
+# === Прогон нагрузки ===
+
+def run_load(make_session: Callable[[], Any], sessions: int, duration: float, think_time: float = 1.0,
+             ramp_up: float = 0.0, runs_per_session: Optional[int] = None, sample_interval: float = 0.5,
+             seed: int = 0) -> Dict[str, Any]:
+    """
+    Запускает sessions одновременных сессий; каждая повторяет прогоны с паузой «на размышление».
+
+    :param make_session: Фабрика сессии (объект с методом run(seller, recorder, rng))
+    :param duration: Длительность теста, сек. (новые прогоны после неё не начинаются)
+    :param think_time: Средняя пауза между прогонами сессии, сек. (экспоненциальное распределение)
+    :param ramp_up: Сессии стартуют равномерно в течение ramp_up секунд
+    :param runs_per_session: Ограничение числа прогонов сессии (None — до конца duration)
+    :return: Перцентили задержек по этапам, пропускная способность и ряд CPU/RSS
+    """
+    recorder = LatencyRecorder()
+    sampler = ResourceSampler(sample_interval)
+    seeds = np.random.SeedSequence(seed).spawn(sessions)
+    counter_lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def session_loop(i: int):
+        rng = np.random.default_rng(seeds[i])
+        time.sleep(ramp_up * i / max(1, sessions))
+        try:
+            session = make_session()
+        except Exception:
+            recorder.error("session_start")
+            return
+        with counter_lock:
+            sampler.active_sessions += 1
+        runs = 0
+        try:
+            while time.perf_counter() < deadline and (runs_per_session is None or runs < runs_per_session):
+                run_start = time.perf_counter()
+                try:
+                    session.run(random_seller(rng), recorder, rng)
+                    recorder.add("run", time.perf_counter() - run_start)
+                except Exception:
+                    recorder.error("run")
+                runs += 1
+                with counter_lock:
+                    sampler.completed_runs += 1
+                if think_time > 0:
+                    time.sleep(min(float(rng.exponential(think_time)), max(0.0, deadline - time.perf_counter())))
+        finally:
+            with counter_lock:
+                sampler.active_sessions -= 1
+
+    snapshot = metrics.snapshot()
+    sampler.start()
+    threads = [threading.Thread(target=session_loop, args=(i,), name=f"session-{i}") for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sampler.stop()
+    elapsed = time.perf_counter() - start
+
+    latencies = recorder.summary()
+    completed = latencies.get("run", {}).get("count", 0)
+    return {
+        "sessions": sessions,
+        "elapsed_seconds": elapsed,
+        "completed_runs": completed,
+        "throughput_runs_per_second": completed / elapsed if elapsed > 0 else 0.0,
+        "errors": dict(recorder.errors),
+        "latency": latencies,
+        "resources": sampler.summary(),
+        "timeseries": sampler.samples,
+        "metrics": metrics.since(snapshot)
+    }
+
+
+def compare(levels: List[Dict[str, Any]], baseline: List[Dict[str, Any]], threshold: float,
+            metric: str = "p95", min_seconds: float = 0.01) -> List[Dict[str, Any]]:
+    """Регрессии задержек (по умолчанию p95) и пропускной способности относительно прошлого отчёта."""
+    base = {level["sessions"]: level for level in baseline}
+    regressions = []
+    for level in levels:
+        old = base.get(level["sessions"])
+        if old is None:
+            continue
+        for stage, stats in level["latency"].items():
+            old_value, new_value = old["latency"].get(stage, {}).get(metric), stats[metric]
+            if old_value is not None and new_value > old_value * (1 + threshold) and new_value - old_value > min_seconds:
+                regressions.append({"sessions": level["sessions"], "stage": stage, "metric": metric,
+                                    "baseline": old_value, "current": new_value})
+        old_rate, new_rate = old["throughput_runs_per_second"], level["throughput_runs_per_second"]
+        if old_rate > 0 and new_rate < old_rate * (1 - threshold):
+            regressions.append({"sessions": level["sessions"], "stage": "run", "metric": "throughput",
+                                "baseline": old_rate, "current": new_rate})
+    return regressions
+
+
+def sessions_within_slo(levels: List[Dict[str, Any]], slo: float, metric: str = "p95") -> int:
+    """Наибольшее число сессий, при котором прогон укладывается в slo секунд по metric и нет ошибок."""
+    fits = [level["sessions"] for level in levels
+            if not level["errors"] and level["latency"].get("run", {}).get(metric, float("inf")) <= slo]
+    return max(fits, default=0)
+
+
+def print_level(level: Dict[str, Any]):
+    res = level["resources"]
+    cpu = f"{res['cpu_percent_mean']:.0f}%" if res["cpu_percent_mean"] is not None else "—"
+    rss = f"{res['rss_mb_max']:.0f} MB" if res["rss_mb_max"] is not None else "—"
+    print(f"\nСессий: {level['sessions']}  прогонов: {level['completed_runs']}  "
+          f"{level['throughput_runs_per_second']:.2f} прогонов/с  CPU {cpu}  RSS max {rss}  "
+          f"ошибок: {sum(level['errors'].values())}")
+    print(f"  {'этап':<12} {'n':>6} {'p50, с':>9} {'p95, с':>9} {'p99, с':>9} {'max, с':>9}")
+    for stage, stats in level["latency"].items():
+        print(f"  {stage:<12} {stats['count']:>6} {stats['p50']:9.4f} {stats['p95']:9.4f} "
+              f"{stats['p99']:9.4f} {stats['max']:9.4f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест: одновременные сессии анализа продажи")
+    parser.add_argument("--db", default="m_and_a.db", help="Путь к базе SQLite")
+    parser.add_argument("--mode", choices=("headless", "streamlit"), default="headless",
+                        help="headless — этапы app.py без UI; streamlit — app.py через streamlit.testing")
+    parser.add_argument("--app", default="app.py", help="Скрипт приложения для --mode streamlit")
+    parser.add_argument("--sessions", default="1,4,16", help="Числа одновременных сессий через запятую")
+    parser.add_argument("--duration", type=float, default=30.0, help="Длительность каждого уровня, сек.")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Средняя пауза между прогонами, сек.")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Время плавного старта сессий, сек.")
+    parser.add_argument("--runs-per-session", type=int, default=None, help="Ограничение прогонов на сессию")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="Период замера CPU/RSS, сек.")
+    parser.add_argument("--no-cache", action="store_true", help="Без кэша результатов этапов (headless)")
+    parser.add_argument("--no-graph", action="store_true", help="Без построения графа (headless)")
+    parser.add_argument("--use-model", action="store_true", help="Teaser языковой моделью (headless)")
+    parser.add_argument("--ui-sleep", type=float, default=0.0,
+                        help="Пауза на шаг показа аукциона в потоке сессии (эмуляция прежнего UI)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--slo", type=float, default=None,
+                        help="Цель по p95 прогона, сек.: в отчёт пишется число сессий, которое сервер в неё укладывает")
+    parser.add_argument("--output", default="load_test_report.json", help="Файл отчёта (JSON)")
+    parser.add_argument("--baseline", default=None, help="Отчёт прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Допустимый рост p95 / падение пропускной способности")
+    args = parser.parse_args(argv)
+    metrics.enabled = True
+
+    app = None
+    if args.mode == "headless":
+        app = HeadlessApp(args.db, use_model=args.use_model, cache=not args.no_cache, graph=not args.no_graph,
+                          ui_sleep=args.ui_sleep)
+        make_session = lambda: app
+    else:
+        make_session = lambda: StreamlitSession(args.app)
+
+    levels = []
+    try:
+        for sessions in (int(s) for s in args.sessions.split(",")):
+            level = run_load(make_session, sessions, args.duration, think_time=args.think_time,
+                             ramp_up=args.ramp_up, runs_per_session=args.runs_per_session,
+                             sample_interval=args.sample_interval, seed=args.seed)
+            levels.append(level)
+            print_level(level)
+    finally:
+        if app is not None:
+            app.close()
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": vars(args),
+        "levels": levels
+    }
+    if args.slo is not None:
+        report["sessions_within_slo"] = sessions_within_slo(levels, args.slo)
+        print(f"\nСессий на сервер при p95 прогона ≤ {args.slo:g} с: {report['sessions_within_slo']}")
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["levels"]
+        report["regressions"] = compare(levels, baseline, args.threshold)
+        for reg in report["regressions"]:
+            print(f"РЕГРЕССИЯ: {reg['sessions']} сессий, {reg['stage']} {reg['metric']}: "
+                  f"{reg['baseline']:.4f} → {reg['current']:.4f}")
+        exit_code = 1 if report["regressions"] else 0
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import json
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Any, Optional
+
+
+class _NullSpan:
+    """Пустой контекст для выключенных метрик: без замеров и аллокаций."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("_registry", "_name", "_start")
+
+    def __init__(self, registry: 'MetricsRegistry', name: str):
+        self._registry = registry
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._registry.record(self._name, time.perf_counter() - self._start)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Лёгкий реестр метрик: интервалы (span) по этапам и счётчики.
+    Включается переменной окружения MA_METRICS=1 или атрибутом enabled.
+    В выключенном состоянии span() возвращает общий пустой контекст.
+
+    Реестр процесса общий для всех сессий Streamlit. Метрики одного прогона собирает
+    отдельный реестр, подключённый к потокам прогона через bind().
+    """
+
+    def __init__(self, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.environ.get("MA_METRICS", "").lower() not in ("", "0", "false", "no")
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._spans: Dict[str, list] = {}    # имя → [число, сумма сек., максимум сек.]
+        self._counters: Dict[str, float] = {}
+        # Реестр прогона текущего контекста (потока или задачи asyncio)
+        self._scope: ContextVar[Optional['MetricsRegistry']] = ContextVar("metrics_scope", default=None)
+
+    def span(self, name: str):
+        """Контекстный менеджер замера времени этапа."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name: str, seconds: float):
+        """Записывает длительность этапа, измеренную вне span()."""
+        if not self.enabled:
+            return
+        scope = self._scope.get()
+        if scope is not None:
+            scope.record(name, seconds)
+        with self._lock:
+            stat = self._spans.get(name)
+            if stat is None:
+                self._spans[name] = [1, seconds, seconds]
+            else:
+                stat[0] += 1
+                stat[1] += seconds
+                if seconds > stat[2]:
+                    stat[2] = seconds
+
+    def incr(self, name: str, value: float = 1):
+        """Увеличивает счётчик (попадания в кэш, прочитанные строки, токены и т.п.)."""
+        if not self.enabled:
+            return
+        scope = self._scope.get()
+        if scope is not None:
+            scope.incr(name, value)
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def bind(self, scope: Optional['MetricsRegistry']):
+        """
+        Подключает к текущему потоку реестр прогона (None — отключает): span() и incr()
+        пишутся и в общий реестр, и в него. Новые потоки привязку не наследуют —
+        bind() вызывается и в них (например, в initializer пула).
+        """
+        self._scope.set(scope)
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "spans": {
+                    name: {"count": c, "total_seconds": total, "max_seconds": mx}
+                    for name, (c, total, mx) in self._spans.items()
+                },
+                "counters": dict(self._counters)
+            }
+
+    def since(self, before: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Разница с прошлым снимком. Включает всё, что записали за это время другие потоки
+        и сессии; разбивку одного прогона даёт реестр, подключённый через bind().
+        """
+        now = self.snapshot()
+        spans = {}
+        for name, stat in now["spans"].items():
+            old = before["spans"].get(name, {"count": 0, "total_seconds": 0.0})
+            count = stat["count"] - old["count"]
+            if count > 0:
+                spans[name] = {"count": count, "total_seconds": stat["total_seconds"] - old["total_seconds"]}
+        counters = {
+            name: value - before["counters"].get(name, 0)
+            for name, value in now["counters"].items()
+            if value != before["counters"].get(name, 0)
+        }
+        return {"spans": spans, "counters": counters}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix: str = "ma") -> str:
+        """Экспорт в текстовом формате Prometheus."""
+        snap = self.snapshot()
+        lines = []
+        if snap["spans"]:
+            lines.append(f"# HELP {prefix}_span_seconds Длительность этапов")
+            lines.append(f"# TYPE {prefix}_span_seconds summary")
+            for name, stat in sorted(snap["spans"].items()):
+                label = f'{{span="{name}"}}'
+                lines.append(f"{prefix}_span_seconds_count{label} {stat['count']}")
+                lines.append(f"{prefix}_span_seconds_sum{label} {stat['total_seconds']:.6f}")
+            lines.append(f"# TYPE {prefix}_span_seconds_max gauge")
+            for name, stat in sorted(snap["spans"].items()):
+                lines.append(f'{prefix}_span_seconds_max{{span="{name}"}} {stat["max_seconds"]:.6f}')
+        for name, value in sorted(snap["counters"].items()):
+            metric = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str):
+        """Пишет метрики в файл: *.prom — формат Prometheus, иначе JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus() if path.endswith(".prom") else self.to_json())
+
+
+# Общий реестр процесса
+metrics = MetricsRegistry()
@@ -1,44 +1,179 @@
 import random
+import sqlite3
+from typing import List, Optional
+
+import numpy as np
+
+from .news_signals import mark_annotated, reset_news_signals
+from .storage import open_storage
+
+NEWS_TEMPLATES = [
+    "Компания «{buyer_name}» приобрела успешную {industry} в {geography}.",
+    "Инвесторы из «{buyer_name}» расширяют присутствие в секторе {industry} через покупку актива в {geography}.",
+    "«{buyer_name}» завершила сделку по покупке бизнеса в сфере {industry} в регионе {geography}."
+]
+
+NEWS_INDUSTRIES = ["Стоматологические клиники", "Аптеки", "Частные медицинские центры"]
+NEWS_GEOGRAPHIES = ["Берлин", "Мюнхен", "Москва", "Санкт-Петербург"]
+
+# Вставка в FTS5 по строке из триггера в разы медленнее пакетной: generate_all_news снимает его
+# на время своей транзакции и индексирует порцию сам. Остальные писатели news опираются на триггер.
+_FTS_INSERT_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS news_fts_insert AFTER INSERT ON news BEGIN
+        INSERT INTO news_fts (rowid, text) VALUES (new.id, new.text);
+    END
+"""
+
+# Индексы и полнотекстовый индекс FTS5 (внешнее содержимое: текст хранится только в news).
+# Вставки, изменения и удаления в news попадают в индекс триггерами.
+NEWS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS news (
+        id INTEGER PRIMARY KEY,
+        text TEXT,
+        extracted_industry TEXT,
+        extracted_geography TEXT,
+        buyer_id TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_news_buyer ON news (buyer_id)",
+    "CREATE INDEX IF NOT EXISTS idx_news_industry ON news (extracted_industry)",
+    "CREATE INDEX IF NOT EXISTS idx_news_geography ON news (extracted_geography)",
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(
+        text, content='news', content_rowid='id', tokenize='unicode61'
+    )
+    """,
+    _FTS_INSERT_TRIGGER,
+    """
+    CREATE TRIGGER IF NOT EXISTS news_fts_delete AFTER DELETE ON news BEGIN
+        INSERT INTO news_fts (news_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS news_fts_update AFTER UPDATE OF text ON news BEGIN
+        INSERT INTO news_fts (news_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO news_fts (rowid, text) VALUES (new.id, new.text);
+    END
+    """
+]
+
 
 def generate_synthetic_news(industry: str, geography: str, buyer_name: str) -> str:
-    templates = [
-        f"Компания «{buyer_name}» приобрела успешную {industry.lower()} в {geography}.",
-        f"Инвесторы из «{buyer_name}» расширяют присутствие в секторе {industry.lower()} через покупку актива в {geography}.",
-        f"«{buyer_name}» завершила сделку по покупке бизнеса в сфере {industry.lower()} в регионе {geography}."
-    ]
-    return random.choice(templates)
-
-def generate_all_news(db_path: str):
-    """Генерирует 50 синтетических новостей и сохраняет в базу (таблица `news`)."""
-    import sqlite3
-    from .data_loader import BuyerDataLoader
-    loader = BuyerDataLoader(db_path)
-    buyers = loader.load_buyers()
-    
-    news_items = []
-    for _ in range(50):
-        buyer = buyers.sample(1).iloc[0]
-        industry = random.choice([
-            "Стоматологические клиники", "Аптеки", "Частные медицинские центры"
-        ])
-        geography = random.choice([
-            "Берлин", "Мюнхен", "Москва", "Санкт-Петербург"
-        ])
-        text = generate_synthetic_news(industry, geography, buyer["name"])
-        news_items.append((text, industry, geography, buyer["company_id"]))
-    
+    return random.choice(NEWS_TEMPLATES).format(
+        buyer_name=buyer_name, industry=industry.lower(), geography=geography
+    )
+
+
+def ensure_news_schema(conn: sqlite3.Connection):
+    """Создаёт таблицу news, её индексы и FTS5-индекс, если их ещё нет."""
+    for statement in NEWS_SCHEMA:
+        conn.execute(statement)
+    # Таблица news от старых версий создавалась без FTS: дополняем индекс существующими строками
+    fts_rows = conn.execute("SELECT COUNT(*) FROM news_fts_docsize").fetchone()[0]
+    if fts_rows == 0 and conn.execute("SELECT EXISTS (SELECT 1 FROM news)").fetchone()[0]:
+        conn.execute("INSERT INTO news_fts (news_fts) VALUES ('rebuild')")
+
+
+def generate_all_news(db_path: str, n_items: int = 50, batch_size: int = 50_000, append: bool = False,
+                      seed: Optional[int] = None, industries: Optional[List[str]] = None,
+                      geographies: Optional[List[str]] = None) -> int:
+    """
+    Генерирует синтетические новости и сохраняет в базу (таблица `news`).
+    Новости пишутся порциями по batch_size, каждая порция — отдельная транзакция.
+
+    :param n_items: Число новостей
+    :param batch_size: Размер порции
+    :param append: Дописать к существующим новостям (иначе таблица очищается)
+    :param seed: Seed генератора
+    :param industries: Отрасли новостей (по умолчанию — медицинский сегмент)
+    :param geographies: Города новостей
+    :return: Число записанных новостей
+    """
+    rng = np.random.default_rng(seed)
+    industries = np.array(industries or NEWS_INDUSTRIES, dtype=object)
+    geographies = np.array(geographies or NEWS_GEOGRAPHIES, dtype=object)
+    industries_lower = np.array([i.lower() for i in industries], dtype=object)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        # Для новостей нужны только id и названия — без разбора остальных полей покупателей
+        buyers = conn.execute("SELECT company_id, name FROM buyers").fetchall()
+        if not buyers:
+            raise ValueError("В базе нет покупателей для генерации новостей")
+        buyer_ids = np.array([b[0] for b in buyers], dtype=object)
+        buyer_names = np.array([b[1] for b in buyers], dtype=object)
+
+        if not append:
+            # Пересоздание быстрее построчного удаления: триггер обновлял бы FTS на каждой строке
+            conn.execute("DROP TABLE IF EXISTS news_fts")
+            conn.execute("DROP TABLE IF EXISTS news")
+            reset_news_signals(conn)
+        ensure_news_schema(conn)
+        conn.commit()
+        next_id = conn.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM news").fetchone()[0]
+
+        for start in range(0, n_items, batch_size):
+            count = min(batch_size, n_items - start)
+            buyer_idx = rng.integers(0, len(buyer_ids), size=count)
+            ind_idx = rng.integers(0, len(industries), size=count)
+            geo_idx = rng.integers(0, len(geographies), size=count)
+            tpl_idx = rng.integers(0, len(NEWS_TEMPLATES), size=count)
+            names = buyer_names[buyer_idx]
+            rows = [
+                (next_id + j, NEWS_TEMPLATES[t].format(buyer_name=n, industry=il, geography=g), i, g, b)
+                for j, (t, n, il, i, g, b) in enumerate(zip(
+                    tpl_idx.tolist(), names, industries_lower[ind_idx],
+                    industries[ind_idx], geographies[geo_idx], buyer_ids[buyer_idx]
+                ))
+            ]
+            # Триггер снимается и возвращается в той же транзакции: другие соединения его не теряют
+            conn.execute("BEGIN")
+            conn.execute("DROP TRIGGER IF EXISTS news_fts_insert")
+            conn.executemany("INSERT INTO news VALUES (?,?,?,?,?)", rows)
+            conn.executemany("INSERT INTO news_fts (rowid, text) VALUES (?, ?)", [(r[0], r[1]) for r in rows])
+            conn.execute(_FTS_INSERT_TRIGGER)
+            # Сущности новостей известны при генерации — порция сразу размечена
+            mark_annotated(conn, next_id + count - 1, after=next_id - 1)
+            conn.commit()
+            next_id += count
+    finally:
+        conn.close()
+    print(f"Сгенерировано {n_items} синтетических новостей.")
+    return n_items
+
+
+def search_news(db_path: str, query: str, limit: int = 20, by_relevance: bool = False) -> List[dict]:
+    """
+    Полнотекстовый поиск по новостям (синтаксис FTS5: слова, "фразы", префиксы аптек*).
+
+    :param by_relevance: Сортировать по bm25. По умолчанию — сначала свежие (по id):
+                         такой порядок FTS5 отдаёт без сортировки всех совпадений
+    """
+    order = "bm25(news_fts)" if by_relevance else "news_fts.rowid DESC"
     conn = sqlite3.connect(db_path)
-    conn.execute("DROP TABLE IF EXISTS news")
-    conn.execute("""
-        CREATE TABLE news (
-            id INTEGER PRIMARY KEY,
-            text TEXT,
-            extracted_industry TEXT,
-            extracted_geography TEXT,
-            buyer_id TEXT
-        )
-    """)
-    conn.executemany("INSERT INTO news VALUES (?,?,?,?,?)", [(i, *item) for i, item in enumerate(news_items)])
-    conn.commit()
-    conn.close()
-    print("Сгенерировано 50 синтетических новостей.")
\ No newline at end of file
+    try:
+        rows = conn.execute(f"""
+            SELECT n.id, n.text, n.extracted_industry, n.extracted_geography, n.buyer_id
+            FROM news_fts JOIN news n ON n.id = news_fts.rowid
+            WHERE news_fts MATCH ?
+            ORDER BY {order}
+            LIMIT ?
+        """, (query, limit)).fetchall()
+    finally:
+        conn.close()
+    return [dict(zip(("id", "text", "industry", "geography", "buyer_id"), r)) for r in rows]
+
+
+def news_for_buyer(db_path: str, buyer_id: str, limit: int = 20) -> List[dict]:
+    """
+    Последние новости о покупателе. Отбор по buyer_id выполняет хранилище
+    (в SQLite — по индексу idx_news_buyer, в каталоге Arrow — фильтром по столбцу).
+    """
+    df = open_storage(db_path).read(
+        "news", columns=["id", "text", "extracted_industry", "extracted_geography", "buyer_id"],
+        filters=[("buyer_id", "==", buyer_id)]
+    )
+    df = df.sort_values("id", ascending=False).head(limit)
+    return [dict(zip(("id", "text", "industry", "geography", "buyer_id"), r))
+            for r in df.astype(object).where(df.notna(), None).itertuples(index=False)]
@@ -1,23 +1,198 @@
 import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from .news_signals import mark_annotated
+
+# Словари для NER: основа слова (или фраза из основ) → отрасль / город.
+# Основы сопоставляются с началом слова, поэтому покрывают падежные формы («аптеки», «аптечную»).
+INDUSTRY_STEMS = {
+    "стоматологическ клиник": "Стоматологические клиники",
+    "стоматолог": "Стоматологические клиники",
+    "зубн": "Стоматологические клиники",
+    "частн медицинск центр": "Частные медицинские центры",
+    "медицинск центр": "Частные медицинские центры",
+    "медицин": "Частные медицинские центры",
+    "клиник": "Частные медицинские центры",
+    "здоровь": "Частные медицинские центры",
+    "аптек": "Аптеки",
+    "аптечн": "Аптеки",
+    "фармацевт": "Аптеки",
+    "оптик": "Оптика",
+    "офтальмолог": "Оптика",
+    "фитнес": "Фитнес-клубы",
+    "спортзал": "Фитнес-клубы",
+    "розничн торговл продукт": "Розничная торговля продуктами",
+    "супермаркет": "Розничная торговля продуктами",
+    "продуктов магазин": "Розничная торговля продуктами",
+    "автосервис": "Автосервисы",
+    "автомастерск": "Автосервисы",
+    "шиномонтаж": "Автосервисы",
+    "it-аутсорсинг": "IT-аутсорсинг",
+    "аутсорсинг": "IT-аутсорсинг",
+}
+
+# Все города MADatasetGenerator.GEOGRAPHIES (с вариантами написания)
+GEOGRAPHY_STEMS = {
+    "берлин": "Берлин",
+    "мюнхен": "Мюнхен",
+    "гамбург": "Гамбург",
+    "франкфурт": "Франкфурт",
+    "кёльн": "Кёльн",
+    "кельн": "Кёльн",
+    "москв": "Москва",
+    "санкт-петербург": "Санкт-Петербург",
+    "петербург": "Санкт-Петербург",
+    "екатеринбург": "Екатеринбург",
+    "новосибирск": "Новосибирск",
+}
+
+# Совместимость: прежние списки ключевых слов
+INDUSTRIES = list(INDUSTRY_STEMS)
+GEOGRAPHIES = sorted(set(GEOGRAPHY_STEMS.values()))
+
+
+class EntityExtractor:
+    """
+    Извлекает отрасли и города за один проход по тексту.
+    Все основы из словарей собираются в одно регулярное выражение в виде префиксного дерева:
+    общие префиксы проверяются один раз, а более длинная фраза пробуется раньше короткой,
+    поэтому «стоматологические клиники» не распадается на две отрасли.
+    """
+
+    def __init__(self, industry_stems: Optional[Dict[str, str]] = None,
+                 geography_stems: Optional[Dict[str, str]] = None):
+        """
+        :param industry_stems: Основа/фраза → отрасль (по умолчанию INDUSTRY_STEMS)
+        :param geography_stems: Основа → город (по умолчанию GEOGRAPHY_STEMS)
+        """
+        self.industry_stems = dict(industry_stems or INDUSTRY_STEMS)
+        self.geography_stems = dict(geography_stems or GEOGRAPHY_STEMS)
+
+        entries = [(stem, "industry", value) for stem, value in self.industry_stems.items()]
+        entries += [(stem, "geography", value) for stem, value in self.geography_stems.items()]
+        trie: dict = {}
+        for i, (stem, _, _) in enumerate(entries):
+            node = trie
+            for ch in stem.lower():
+                node = node.setdefault(ch, {})
+            node[""] = i
+
+        # Каждый лист дерева заканчивается пустой группой «()»: номер сработавшей группы
+        # (match.lastindex) указывает на словарную статью
+        self._targets = []
+
+        def build(node: dict) -> str:
+            alternatives = []
+            for ch in sorted(k for k in node if k):
+                piece = r"[\w-]*\s+" if ch == " " else re.escape(ch)
+                alternatives.append(piece + build(node[ch]))
+            if "" in node:
+                _, kind, value = entries[node[""]]
+                self._targets.append((kind, value))
+                alternatives.append(r"[\w-]*()")
+            return alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+
+        # Текст приводится к нижнему регистру заранее: без IGNORECASE поиск заметно быстрее
+        self.pattern = re.compile(r"(?<![\w-])" + build(trie))
+
+    def extract_all(self, text: str) -> Dict[str, List[str]]:
+        """Все найденные отрасли и города (без повторов, в порядке появления)."""
+        found = {"industry": [], "geography": []}
+        for match in self.pattern.finditer((text or "").lower()):
+            kind, value = self._targets[match.lastindex - 1]
+            if value not in found[kind]:
+                found[kind].append(value)
+        return {"industries": found["industry"], "geographies": found["geography"]}
+
+    def extract(self, text: str) -> Dict[str, Optional[str]]:
+        """Первая найденная отрасль и первый город — формат extract_entities."""
+        industry = geography = None
+        for match in self.pattern.finditer((text or "").lower()):
+            kind, value = self._targets[match.lastindex - 1]
+            if kind == "industry" and industry is None:
+                industry = value
+            elif kind == "geography" and geography is None:
+                geography = value
+            if industry is not None and geography is not None:
+                break
+        return {"industry": industry, "geography": geography}
+
+    def extract_batch(self, texts: Iterable[str], n_workers: int = 1,
+                      chunk_size: int = 10_000) -> List[Dict[str, Optional[str]]]:
+        """
+        Извлекает сущности для набора текстов.
+
+        :param n_workers: Число процессов (1 — в текущем процессе)
+        :param chunk_size: Размер порции текстов для процесса
+        """
+        texts = list(texts)
+        if n_workers <= 1 or len(texts) <= chunk_size:
+            return [self.extract(t) for t in texts]
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        results = []
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            # map сохраняет порядок порций
+            for part in pool.map(_extract_chunk, [self] * len(chunks), chunks):
+                results.extend(part)
+        return results
+
+
+def _extract_chunk(extractor: EntityExtractor, texts: List[str]) -> List[Dict[str, Optional[str]]]:
+    return [extractor.extract(t) for t in texts]
+
+
+_default_extractor: Optional[EntityExtractor] = None
+
+
+def get_extractor() -> EntityExtractor:
+    """Общий экземпляр со словарями по умолчанию (выражение компилируется один раз)."""
+    global _default_extractor
+    if _default_extractor is None:
+        _default_extractor = EntityExtractor()
+    return _default_extractor
 
-# Списки для простого NER
-INDUSTRIES = ["стоматолог", "аптек", "медицин", "клиник", "здоровь", "фармацевт"]
-GEOGRAPHIES = ["Берлин", "Мюнхен", "Москва", "Санкт-Петербург", "Гамбург", "Новосибирск"]
 
 def extract_entities(text: str):
     """Извлекает отрасль и географию из текста без ML (правила)."""
-    industry = None
-    geography = None
-    
-    text_lower = text.lower()
-    for word in INDUSTRIES:
-        if word in text_lower:
-            industry = "Стоматологические клиники" 
-            break
-    
-    for city in GEOGRAPHIES:
-        if city in text:
-            geography = city
-            break
-    
-    return {"industry": industry, "geography": geography}
\ No newline at end of file
+    return get_extractor().extract(text)
+
+
+def annotate_news(db_path: str, batch_size: int = 50_000, n_workers: int = 1, only_missing: bool = True,
+                  extractor: Optional[EntityExtractor] = None) -> int:
+    """
+    Заполняет extracted_industry / extracted_geography в таблице news.
+    Строки читаются порциями по id (keyset-пагинация), обновления пишутся пакетно.
+    С каждой порцией сдвигается отметка разметки, до которой refresh_news_signals учитывает новости.
+
+    :param only_missing: Обрабатывать только строки без извлечённых сущностей
+    :return: Число обновлённых строк
+    """
+    extractor = extractor or get_extractor()
+    condition = "AND extracted_industry IS NULL AND extracted_geography IS NULL" if only_missing else ""
+    conn = sqlite3.connect(db_path)
+    updated, last_id = 0, -1
+    try:
+        while True:
+            rows = conn.execute(
+                f"SELECT id, text FROM news WHERE id > ? {condition} ORDER BY id LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            entities = extractor.extract_batch((r[1] for r in rows), n_workers=n_workers)
+            conn.executemany(
+                "UPDATE news SET extracted_industry = ?, extracted_geography = ? WHERE id = ?",
+                [(e["industry"], e["geography"], r[0]) for r, e in zip(rows, entities)]
+            )
+            last_id = rows[-1][0]
+            mark_annotated(conn, last_id)
+            conn.commit()
+            updated += len(rows)
+        # Дальше last_id неразмеченных строк нет
+        mark_annotated(conn, conn.execute("SELECT COALESCE(MAX(id), -1) FROM news").fetchone()[0])
+        conn.commit()
+    finally:
+        conn.close()
+    return updated
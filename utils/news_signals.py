@@ -0,0 +1,157 @@
+import math
+import sqlite3
+from typing import Dict, List, Optional
+
+from .metrics import metrics
+
+# Агрегат активности покупателей по новостям: число новостей по отрасли и по городу.
+# Обновляется инкрементально: обрабатываются только новости с id выше отметки high_water_mark.
+# Отметка annotated_id: все новости с id не выше неё размечены (generate_all_news, annotate_news).
+# Агрегат считается за всё время: у новостей нет даты, окно давности можно задать по last_news_id.
+SIGNALS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS buyer_news_signals (
+        buyer_id TEXT NOT NULL,
+        dimension TEXT NOT NULL CHECK(dimension IN ('industry', 'geography')),
+        value TEXT NOT NULL,
+        news_count INTEGER NOT NULL,
+        last_news_id INTEGER NOT NULL,
+        PRIMARY KEY (buyer_id, dimension, value)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS news_signals_state (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    """
+]
+
+_UPSERT = """
+    INSERT INTO buyer_news_signals (buyer_id, dimension, value, news_count, last_news_id)
+    SELECT buyer_id, '{dimension}', {column}, COUNT(*), MAX(id)
+    FROM news
+    WHERE id > ? AND id <= ? AND buyer_id IS NOT NULL AND {column} IS NOT NULL
+    GROUP BY buyer_id, {column}
+    ON CONFLICT (buyer_id, dimension, value) DO UPDATE SET
+        news_count = news_count + excluded.news_count,
+        last_news_id = MAX(last_news_id, excluded.last_news_id)
+"""
+
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+
+def _state(conn: sqlite3.Connection, key: str, default: int = -1) -> int:
+    row = conn.execute("SELECT value FROM news_signals_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def mark_annotated(conn: sqlite3.Connection, upper: int, after: Optional[int] = None):
+    """
+    Сдвигает отметку разметки до upper (в транзакции вызывающего).
+
+    :param after: Сдвигать, только если отметка уже не ниже after — для порции новых строк
+                  id after+1..upper: иначе между ними остались бы неразмеченные новости
+    """
+    for statement in SIGNALS_SCHEMA:
+        conn.execute(statement)
+    current = _state(conn, "annotated_id")
+    if after is not None and current < after:
+        return
+    conn.execute("INSERT OR REPLACE INTO news_signals_state (key, value) VALUES ('annotated_id', ?)",
+                 (max(current, upper),))
+
+
+def refresh_news_signals(db_path: str, batch_size: int = 500_000) -> int:
+    """
+    Дописывает в buyer_news_signals новости, поступившие после прошлого обновления.
+    Каждая порция id и новая отметка фиксируются одной транзакцией, поэтому прерванное
+    обновление продолжается с места остановки без двойного счёта.
+    Отметка не проходит отметку разметки annotated_id: новости, до которых ещё не дошёл
+    annotate_news, учитываются при обновлении после разметки. Новость, в которой разметка
+    не нашла ни отрасли, ни города, отметку не задерживает.
+
+    :param batch_size: Ширина диапазона id в одной транзакции
+    :return: Число учтённых новостей
+    """
+    conn = sqlite3.connect(db_path)
+    processed = 0
+    try:
+        if not _table_exists(conn, "news"):
+            return 0
+        for statement in SIGNALS_SCHEMA:
+            conn.execute(statement)
+        mark = _state(conn, "high_water_mark")
+        max_id = conn.execute("SELECT COALESCE(MAX(id), -1) FROM news").fetchone()[0]
+        max_id = min(max_id, _state(conn, "annotated_id"))
+        conn.commit()
+
+        with metrics.span("news_signals.refresh"):
+            while mark < max_id:
+                upper = min(mark + batch_size, max_id)
+                with conn:
+                    for dimension, column in (("industry", "extracted_industry"), ("geography", "extracted_geography")):
+                        conn.execute(_UPSERT.format(dimension=dimension, column=column), (mark, upper))
+                    processed += conn.execute(
+                        "SELECT COUNT(*) FROM news WHERE id > ? AND id <= ?", (mark, upper)
+                    ).fetchone()[0]
+                    conn.execute(
+                        "INSERT OR REPLACE INTO news_signals_state (key, value) VALUES ('high_water_mark', ?)",
+                        (upper,)
+                    )
+                mark = upper
+    finally:
+        conn.close()
+    metrics.incr("rows_scanned.news", processed)
+    return processed
+
+
+def reset_news_signals(conn: sqlite3.Connection):
+    """Сбрасывает агрегат (при пересоздании таблицы news id начинаются заново)."""
+    conn.execute("DROP TABLE IF EXISTS buyer_news_signals")
+    conn.execute("DROP TABLE IF EXISTS news_signals_state")
+
+
+class NewsSignals:
+    """
+    Сигналы интереса покупателей из новостей в памяти: buyer_id → {(измерение, значение): число}.
+    Поиск по покупателю — одно обращение к словарю.
+    """
+
+    def __init__(self, counts: Optional[Dict[str, Dict[tuple, int]]] = None):
+        self.counts = counts or {}
+
+    @classmethod
+    def load(cls, db_path: str, refresh: bool = True) -> 'NewsSignals':
+        """
+        Загружает агрегат из базы (предварительно дописав новые новости).
+        Без таблицы news возвращает пустые сигналы.
+        """
+        if refresh:
+            refresh_news_signals(db_path)
+        conn = sqlite3.connect(db_path)
+        try:
+            if not _table_exists(conn, "buyer_news_signals"):
+                return cls()
+            rows = conn.execute("SELECT buyer_id, dimension, value, news_count FROM buyer_news_signals").fetchall()
+        finally:
+            conn.close()
+        counts: Dict[str, Dict[tuple, int]] = {}
+        for buyer_id, dimension, value, count in rows:
+            counts.setdefault(buyer_id, {})[(dimension, value)] = count
+        return cls(counts)
+
+    def count(self, buyer_id: str, dimension: str, value: str) -> int:
+        return self.counts.get(buyer_id, {}).get((dimension, value), 0)
+
+    def features(self, buyer_id: str, seller: Dict) -> List[float]:
+        """[log1p(новости в отрасли продавца), log1p(новости в городе продавца)]."""
+        buyer = self.counts.get(buyer_id)
+        if not buyer:
+            return [0.0, 0.0]
+        return [
+            math.log1p(buyer.get(("industry", seller["industry"]), 0)),
+            math.log1p(buyer.get(("geography", seller["geography"]), 0))
+        ]
@@ -0,0 +1,442 @@
+import argparse
+import json
+import os
+import random
+import time
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import multiprocessing
+import multiprocessing.util
+from typing import Dict, Any, Iterator, Iterable, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from .valuation import BusinessValuationEngine
+from .ranking import BuyerRanker
+from .teaser_generator_hf import TeaserGenerator
+from .email_generator import EmailGenerator
+from .buyer_response_simulator import BuyerResponseSimulator
+from .buyer_vectors import BuyerVectorIndex
+from .auction_simulator import AuctionSimulator
+from .data_loader import BuyerDataLoader
+from .metrics import metrics
+from .storage import open_storage
+
+
+def data_version(db_path: str) -> str:
+    """Версия данных: меняется при любой перезаписи файла БД (или файлов каталога Arrow)."""
+    return open_storage(db_path).version()
+
+
+def seller_key(seller: Dict[str, Any]) -> tuple:
+    """Нормализованный (хешируемый) ключ профиля продавца для кэша."""
+    return tuple(sorted(
+        (k, round(float(v), 2) if isinstance(v, (int, float)) else v)
+        for k, v in seller.items()
+    ))
+
+
+def _json_default(value):
+    """Приводит типы numpy к встроенным для json.dumps."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class DealPipeline:
+    """
+    Конвейер анализа продажи без UI:
+    оценка → ранжирование → teaser → письма → отклики → аукцион.
+    Движки и модели загружаются один раз и переиспользуются для всех продавцов.
+    """
+
+    def __init__(self, db_path: str, top_k: int = 10, use_model: bool = True,
+                 auction_format: Optional[str] = None, seed: Optional[int] = None, dedup: bool = False,
+                 run_store: Optional[str] = None, vector_index: Optional[str] = None):
+        """
+        :param db_path: Путь к базе SQLite
+        :param top_k: Число покупателей в ранжировании
+        :param use_model: Генерировать teaser языковой моделью (False — только шаблоны)
+        :param auction_format: Формат AuctionEngine (None — упрощённая модель)
+        :param seed: Seed обучения ранжирования, выбора шаблонов teaser и писем, симуляции откликов и аукциона
+        :param dedup: Исключить дубликаты покупателей (таблица buyer_canonical, см. utils.dedup)
+        :param run_store: Файл RunStore: готовые прогоны берутся из него, новые — записываются
+        :param vector_index: Каталог BuyerVectorIndex: персонализация откликов по близости векторов
+        """
+        self.db_path = db_path
+        self.top_k = top_k
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+
+        self.valuation_engine = BusinessValuationEngine(db_path)
+        self.ranker = BuyerRanker(db_path, dedup=dedup, seed=seed)
+        self.ranker.fit()
+        self.teaser_generator = TeaserGenerator(use_model=use_model, rng=random.Random(seed))
+        self.email_generator = EmailGenerator(rng=random.Random(seed))
+        self.response_simulator = BuyerResponseSimulator(
+            rng=rng, vector_index=BuyerVectorIndex(vector_index) if vector_index is not None else None
+        )
+        self.auction = AuctionSimulator(auction_format, rng=rng)
+
+        buyers_df = BuyerDataLoader(db_path).load_buyers()
+        self.buyer_profiles = dict(zip(buyers_df["company_id"], buyers_df.to_dict("records")))
+
+        self.run_store = None
+        if run_store is not None:
+            from .run_store import RunStore, model_version
+
+            self.run_store = RunStore(run_store)
+            self.data_version = data_version(db_path)
+            self.model_version = model_version(top_k=top_k, use_model=use_model, auction_format=auction_format,
+                                               seed=seed, dedup=dedup, vector_index=vector_index is not None)
+
+    def _run_profile(self, seller: Dict[str, Any]) -> Dict[str, Any]:
+        """Профиль для ключа RunStore: seller_id влияет на результат только через seed симуляции."""
+        if self.seed is not None:
+            return seller
+        return {k: v for k, v in seller.items() if k != "seller_id"}
+
+    # === Этапы ===
+
+    def valuate(self, seller: Dict[str, Any]) -> Dict[str, Any]:
+        return self.valuation_engine.estimate(seller)
+
+    def rank(self, seller: Dict[str, Any]) -> List[Dict[str, Any]]:
+        ranked = self.ranker.rank(seller, top_k=self.top_k)
+        for i, b in enumerate(ranked, 1):
+            b["rank"] = i
+        return ranked
+
+    def teaser(self, seller: Dict[str, Any]) -> str:
+        return self.teaser_generator.generate(seller)
+
+    def emails(self, seller: Dict[str, Any], ranked: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        return [
+            {"company_id": b["company_id"],
+             "email": self.email_generator.generate(self.buyer_profiles[b["company_id"]], seller)}
+            for b in ranked if b["company_id"] in self.buyer_profiles
+        ]
+
+    def simulate_responses(self, seller: Dict[str, Any], ranked: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self.response_simulator.simulate(ranked, self.buyer_profiles, seller)
+
+    def run_auction(self, seller: Dict[str, Any], valuation: Dict[str, Any],
+                    responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return self.auction.simulate(valuation["estimated_value"], responses, self.buyer_profiles, seller)
+
+    def run(self, seller: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Прогоняет продавца через все этапы.
+
+        :param seller: Профиль продавца (industry, geography, revenue, ebitda, ...)
+        :return: Результаты всех этапов; status = "ok", "no_valuation" или "error"
+        """
+        if self.run_store is not None:
+            stored = self.run_store.get(self._run_profile(seller), self.data_version, self.model_version)
+            if stored is not None:
+                return {**stored["result"], "seller_id": seller.get("seller_id")}
+        result: Dict[str, Any] = {"seller_id": seller.get("seller_id"), "status": "ok"}
+        if self.seed is not None:
+            # Поток случайных чисел зависит только от seed и продавца, а не от процесса-исполнителя
+            key = zlib.crc32(str(seller.get("seller_id")).encode())
+            rng = np.random.default_rng([self.seed, key])
+            self.response_simulator.rng = rng
+            self.auction.rng = rng
+            self.teaser_generator.rng = random.Random(f"{self.seed}:{key}:teaser")
+            self.email_generator.rng = random.Random(f"{self.seed}:{key}:email")
+        try:
+            with metrics.span("stage.valuation"):
+                valuation = self.valuate(seller)
+            result["valuation"] = valuation
+            if valuation["error"]:
+                result["status"] = "no_valuation"
+                return result
+            with metrics.span("stage.ranking"):
+                ranked = self.rank(seller)
+            result["ranking"] = ranked
+            with metrics.span("stage.teaser"):
+                result["teaser"] = self.teaser(seller)
+            with metrics.span("stage.email"):
+                result["emails"] = self.emails(seller, ranked)
+            with metrics.span("stage.responses"):
+                responses = self.simulate_responses(seller, ranked)
+            result["responses"] = [{"company_id": r["company_id"], "response": r["response"]} for r in responses]
+            with metrics.span("stage.auction"):
+                result["auction"] = self.run_auction(seller, valuation, responses)
+        except Exception as e:
+            result["status"] = "error"
+            result["error"] = str(e)
+            return result
+        finally:
+            if self.run_store is not None and result["status"] != "error":
+                self.run_store.put(self._run_profile(seller), result, self.data_version, self.model_version,
+                                   source="pipeline")
+        return result
+
+    def close(self):
+        if self.run_store is not None:
+            self.run_store.close()
+
+
+# === Источники продавцов ===
+
+def _seller_from_row(row: Dict[str, Any], fallback_id: str) -> Dict[str, Any]:
+    seller = {k: (None if isinstance(v, float) and pd.isna(v) else v) for k, v in row.items()}
+    if seller.get("seller_id") is None:
+        seller["seller_id"] = fallback_id
+    return seller
+
+
+def iter_sellers(source: Optional[str], db_path: str, chunk_size: int = 10000) -> Iterator[Dict[str, Any]]:
+    """
+    Читает продавцов порциями из CSV, Parquet или таблицы sellers.
+
+    :param source: Путь к .csv/.parquet (None — таблица sellers в хранилище)
+    :param db_path: Путь к базе SQLite или каталогу Arrow/Parquet
+    :param chunk_size: Размер порции
+    """
+    offset = 0
+    if source is None:
+        for chunk in open_storage(db_path).iter_batches("sellers", batch_size=chunk_size):
+            for i, row in enumerate(chunk.to_dict("records")):
+                yield _seller_from_row(row, f"row_{offset + i}")
+            offset += len(chunk)
+    elif source.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            for i, row in enumerate(batch.to_pylist()):
+                yield _seller_from_row(row, f"row_{offset + i}")
+            offset += batch.num_rows
+    else:
+        for chunk in pd.read_csv(source, chunksize=chunk_size):
+            for i, row in enumerate(chunk.to_dict("records")):
+                yield _seller_from_row(row, f"row_{offset + i}")
+            offset += len(chunk)
+
+
+# === Запись результатов с контрольными точками ===
+
+class JsonlResultWriter:
+    """
+    Дописывает результаты в JSONL. Сам файл служит контрольной точкой:
+    при возобновлении недописанная последняя строка отбрасывается.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._completed = self._recover()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _recover(self) -> Set[str]:
+        completed = set()
+        if not os.path.exists(self.path):
+            return completed
+        good_offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    completed.add(str(json.loads(line)["seller_id"]))
+                except (ValueError, KeyError):
+                    break
+                good_offset += len(line)
+        with open(self.path, "r+b") as f:
+            f.truncate(good_offset)
+        return completed
+
+    def completed_ids(self) -> Set[str]:
+        return self._completed
+
+    def write(self, records: List[Dict[str, Any]]):
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False, default=_json_default) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetResultWriter:
+    """
+    Пишет результаты в каталог Parquet: каждая порция — отдельный файл,
+    записанный атомарно (временный файл + переименование).
+    Вложенные структуры хранятся как JSON-строки.
+    """
+
+    SCALAR_FIELDS = ("seller_id", "status", "error", "teaser")
+    JSON_FIELDS = ("valuation", "ranking", "emails", "responses", "auction")
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def completed_ids(self) -> Set[str]:
+        completed = set()
+        for name in os.listdir(self.directory):
+            if name.endswith(".parquet"):
+                part = pd.read_parquet(os.path.join(self.directory, name), columns=["seller_id"])
+                completed.update(part["seller_id"].astype(str))
+        return completed
+
+    def write(self, records: List[Dict[str, Any]]):
+        if not records:
+            return
+        rows = []
+        for record in records:
+            row = {f: record.get(f) for f in self.SCALAR_FIELDS}
+            for f in self.JSON_FIELDS:
+                row[f] = json.dumps(record.get(f), ensure_ascii=False, default=_json_default)
+            rows.append(row)
+        name = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+        tmp_path = os.path.join(self.directory, "." + name + ".tmp")
+        pd.DataFrame(rows).astype({"seller_id": str}).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+
+    def close(self):
+        pass
+
+
+def open_result_writer(output: str):
+    """JSONL для *.jsonl, иначе каталог Parquet."""
+    if output.endswith(".jsonl"):
+        return JsonlResultWriter(output)
+    return ParquetResultWriter(output)
+
+
+# === Параллельный запуск ===
+
+_WORKER_PIPELINE: Optional[DealPipeline] = None
+
+
+def _init_worker(db_path: str, options: Dict[str, Any]):
+    global _WORKER_PIPELINE
+    _WORKER_PIPELINE = DealPipeline(db_path, **options)
+    # Процессы пула завершаются без atexit: буфер RunStore дописывается финализатором multiprocessing
+    multiprocessing.util.Finalize(None, _WORKER_PIPELINE.close, exitpriority=10)
+
+
+def _run_seller(seller: Dict[str, Any]) -> Dict[str, Any]:
+    return _WORKER_PIPELINE.run(seller)
+
+
+def run_batch(sellers: Iterable[Dict[str, Any]], writer, db_path: str, workers: int = 1,
+              flush_every: int = 100, **pipeline_options) -> Dict[str, int]:
+    """
+    Обрабатывает поток продавцов, пропуская уже обработанных, и пишет результаты порциями.
+
+    :param sellers: Итератор профилей продавцов (с seller_id)
+    :param writer: JsonlResultWriter или ParquetResultWriter
+    :param db_path: Путь к базе SQLite
+    :param workers: Число процессов (1 — без пула)
+    :param flush_every: Размер порции записи
+    :param pipeline_options: Параметры DealPipeline
+    :return: Счётчики обработанных и пропущенных продавцов
+    """
+    completed = writer.completed_ids()
+    stats = {"processed": 0, "skipped": 0}
+    buffer: List[Dict[str, Any]] = []
+
+    def pending_sellers() -> Iterator[Dict[str, Any]]:
+        # Пропущенными считаются только продавцы этого входа, уже записанные ранее
+        for seller in sellers:
+            if str(seller["seller_id"]) in completed:
+                stats["skipped"] += 1
+            else:
+                yield seller
+
+    pending = pending_sellers()
+
+    def collect(record: Dict[str, Any]):
+        buffer.append(record)
+        stats["processed"] += 1
+        if len(buffer) >= flush_every:
+            writer.write(buffer)
+            buffer.clear()
+
+    def collect_done(futures):
+        # Готовые результаты сохраняются и тогда, когда соседняя задача упала
+        error = None
+        for future in futures:
+            try:
+                record = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            collect(record)
+        if error is not None:
+            raise error
+
+    # Результаты в буфере записываются и при ошибке: после перезапуска их не придётся считать заново
+    try:
+        if workers == 1:
+            pipeline = DealPipeline(db_path, **pipeline_options)
+            try:
+                for seller in pending:
+                    collect(pipeline.run(seller))
+            finally:
+                pipeline.close()
+        else:
+            # Не больше 4 × workers продавцов в работе: память не зависит от размера входа
+            window = 4 * workers
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_worker, initargs=(db_path, pipeline_options)) as pool:
+                running = set()
+                try:
+                    for seller in pending:
+                        running.add(pool.submit(_run_seller, seller))
+                        if len(running) >= window:
+                            done, running = wait(running, return_when=FIRST_COMPLETED)
+                            collect_done(done)
+                finally:
+                    # Задачи, уже отправленные в пул, доводятся до конца и тоже попадают в буфер
+                    collect_done(running)
+    finally:
+        writer.write(buffer)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Пакетный анализ продавцов без UI")
+    parser.add_argument("--db", default="m_and_a.db", help="Путь к базе SQLite")
+    parser.add_argument("--sellers", default=None, help="CSV/Parquet с продавцами (по умолчанию — таблица sellers)")
+    parser.add_argument("--output", required=True, help="Файл .jsonl или каталог Parquet")
+    parser.add_argument("--workers", type=int, default=1, help="Число процессов")
+    parser.add_argument("--flush-every", type=int, default=100, help="Размер порции записи")
+    parser.add_argument("--top-k", type=int, default=10, help="Число покупателей в ранжировании")
+    parser.add_argument("--auction-format", default=None, help="Формат AuctionEngine")
+    parser.add_argument("--no-model", action="store_true", help="Teaser только по шаблонам")
+    parser.add_argument("--seed", type=int, default=None, help="Seed симуляции")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Не выдавать дубликаты покупателей (нужен прогон python -m utils.dedup)")
+    parser.add_argument("--run-store", default=None,
+                        help="Файл RunStore: пропускать уже посчитанные прогоны и сохранять новые")
+    parser.add_argument("--vector-index", default=None,
+                        help="Каталог индекса векторов покупателей (python -m utils.buyer_vectors)")
+    parser.add_argument("--metrics", default=None,
+                        help="Файл метрик основного процесса (*.prom — Prometheus, иначе JSON)")
+    args = parser.parse_args(argv)
+    if args.metrics:
+        metrics.enabled = True
+
+    writer = open_result_writer(args.output)
+    try:
+        stats = run_batch(
+            iter_sellers(args.sellers, args.db), writer, args.db,
+            workers=args.workers, flush_every=args.flush_every,
+            top_k=args.top_k, use_model=not args.no_model,
+            auction_format=args.auction_format, seed=args.seed, dedup=args.dedup,
+            run_store=args.run_store, vector_index=args.vector_index
+        )
+    finally:
+        writer.close()
+        if args.metrics:
+            metrics.export(args.metrics)
+    print(f"Обработано продавцов: {stats['processed']}, пропущено (уже готово): {stats['skipped']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,76 @@
-import sqlite3
-import pandas as pd
+import os
+import pickle
 import numpy as np
-from sklearn.linear_model import LogisticRegression
-import ast
-from typing import List, Dict, Any
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from typing import List, Dict, Any, Optional, Iterable
+from .buyer_store import CompactBuyers
 from .data_loader import BuyerDataLoader
+from .dedup import load_canonical_ids
+from .metrics import metrics
+from .news_signals import NewsSignals
+from .storage import open_storage, parse_list
 
 class BuyerRanker:
-    def __init__(self, db_path: str):
+    # Отклик, считающийся положительным примером при онлайн-обучении
+    POSITIVE_RESPONSES = {"NDA_requested"}
+    # Столбцы buyers, нужные для признаков и выдачи (financial_capacity — для CompactBuyers.from_frame)
+    BUYER_COLUMNS = ["company_id", "name", "type", "industry_focus", "target_geography",
+                     "preferred_revenue_min", "preferred_revenue_max", "financial_capacity", "past_acquisitions"]
+
+    def __init__(self, db_path: str, use_news_signals: bool = False, online: bool = False,
+                 batch_size: int = 256, compact: bool = False, dedup: bool = False, seed: Optional[int] = None):
+        """
+        :param use_news_signals: Добавить к признакам активность покупателя в новостях (buyer_news_signals)
+        :param online: Онлайн-режим: SGDClassifier с partial_fit, дообучение через update()
+        :param batch_size: Размер мини-пакета partial_fit
+        :param compact: Хранить покупателей в CompactBuyers и считать признаки векторно
+                        (для больших баз: память в разы меньше, чем у DataFrame со списками)
+        :param dedup: Не выдавать дубликаты покупателей (таблица buyer_canonical из BuyerDeduplicator):
+                      в ранжировании остаётся только канонический покупатель кластера
+        :param seed: Seed выборки обучающих примеров в fit (None — каждый раз новая выборка)
+        """
         self.db_path = db_path
         self.model = None
         self._buyers_df = None
+        self.compact = compact
+        self.buyers: Optional[CompactBuyers] = None
+        self._buyer_rows: Optional[Dict[str, int]] = None
+        self.dedup = dedup
+        self.canonical: Dict[str, str] = {}
+        self._rank_rows: Optional[np.ndarray] = None
+        self.use_news_signals = use_news_signals
+        self.news_signals = NewsSignals()
+        self.online = online
+        self.batch_size = batch_size
+        self.n_updates = 0
+        self.rng = np.random.default_rng(seed)
 
     def _safe_literal_eval(self, x):
-        if pd.isna(x) or x == "":
-            return []
-        try:
-            return ast.literal_eval(x)
-        except (ValueError, SyntaxError):
-            return []
+        return parse_list(x)
 
     def _load_buyers(self):
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query("SELECT * FROM buyers", conn)
-        conn.close()
-        df["industry_focus"] = df["industry_focus"].apply(self._safe_literal_eval)
-        df["target_geography"] = df["target_geography"].apply(self._safe_literal_eval)
-        df["past_acquisitions"] = df["past_acquisitions"].apply(self._safe_literal_eval)
+        if self.dedup:
+            self.canonical = load_canonical_ids(self.db_path)
+        if self.compact:
+            self.buyers = CompactBuyers.from_db(self.db_path)
+            if self.canonical:
+                # Строки дубликатов исключаются из ранжирования один раз, а не на каждый запрос
+                aliases = [r for r in map(self.buyers.row_of, self.canonical) if r is not None]
+                self._rank_rows = np.setdiff1d(np.arange(len(self.buyers)), np.array(aliases, dtype=np.int64))
+            if self.use_news_signals:
+                self.news_signals = NewsSignals.load(self.db_path)
+            return
+        with metrics.span("db_load.buyers"):
+            df = open_storage(self.db_path).read("buyers", columns=self.BUYER_COLUMNS)
+        metrics.incr("rows_scanned.buyers", len(df))
+        with metrics.span("parse.literal_eval"):
+            df["industry_focus"] = df["industry_focus"].apply(self._safe_literal_eval)
+            df["target_geography"] = df["target_geography"].apply(self._safe_literal_eval)
+            df["past_acquisitions"] = df["past_acquisitions"].apply(self._safe_literal_eval)
         self._buyers_df = df
+        self._buyer_rows = None
+        if self.use_news_signals:
+            self.news_signals = NewsSignals.load(self.db_path)
 
     def _simulate_interest_label(self, seller: Dict[str, Any], buyer: Dict[str, Any]) -> int:
         score = 0.0
@@ -56,43 +99,208 @@ class BuyerRanker:
         rev_center = (buyer["preferred_revenue_min"] + buyer["preferred_revenue_max"]) / 2
         rev_range = max(1.0, buyer["preferred_revenue_max"] - buyer["preferred_revenue_min"])
         rev_diff_norm = abs(seller["revenue"] - rev_center) / rev_range
-        return [ind_match, geo_match, rev_in_range, int(past_match), rev_diff_norm]
+        features = [ind_match, geo_match, rev_in_range, int(past_match), rev_diff_norm]
+        if self.use_news_signals:
+            features += self.news_signals.features(buyer["company_id"], seller)
+        return features
+
+    def _is_loaded(self) -> bool:
+        return self.buyers is not None if self.compact else self._buyers_df is not None
+
+    def _compact_features(self, seller: Dict[str, Any], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Матрица признаков _extract_features для строк CompactBuyers (None — все покупатели)."""
+        store = self.buyers
+        rows = np.arange(len(store)) if rows is None else rows
+        revenue = np.float32(seller["revenue"])
+        rev_min, rev_max = store.revenue_min[rows], store.revenue_max[rows]
+        columns = [
+            store.industry_match(seller["industry"])[rows],
+            store.geography_match(seller["geography"])[rows],
+            (rev_min <= revenue) & (revenue <= rev_max),
+            store.acquisition_counts(seller["industry"], seller["geography"])[rows] > 0,
+            np.abs(revenue - (rev_min + rev_max) / 2) / np.maximum(1.0, rev_max - rev_min)
+        ]
+        if self.use_news_signals:
+            news = np.array([self.news_signals.features(store.company_id(r), seller) for r in rows.tolist()])
+            columns += [news[:, 0], news[:, 1]] if len(rows) else [np.zeros(0), np.zeros(0)]
+        return np.column_stack([np.asarray(c, dtype=float) for c in columns])
+
+    def _compact_labels(self, X: np.ndarray) -> np.ndarray:
+        """Метки _simulate_interest_label по матрице признаков (сложение в том же порядке)."""
+        score = np.zeros(len(X))
+        score += 0.3 * X[:, 0]
+        score += 0.3 * X[:, 1]
+        score += 0.3 * X[:, 2]
+        score += 0.1 * X[:, 3]
+        return (score >= 0.7).astype(int)
 
     def fit(self):
-        if self._buyers_df is None:
+        if not self._is_loaded():
             self._load_buyers()
         X, y = [], []
         industries = ["Стоматологические клиники", "Аптеки", "Фитнес-клубы"]
         geographies = ["Берлин", "Москва"]
+        n_buyers = len(self.buyers) if self.compact else len(self._buyers_df)
         for _ in range(300):
             fake_seller = {
-                "industry": np.random.choice(industries),
-                "geography": np.random.choice(geographies),
-                "revenue": round(np.random.uniform(5, 100), 1)
+                "industry": self.rng.choice(industries),
+                "geography": self.rng.choice(geographies),
+                "revenue": round(self.rng.uniform(5, 100), 1)
             }
-            sampled = self._buyers_df.sample(n=min(20, len(self._buyers_df)))
-            for _, buyer_row in sampled.iterrows():
+            rows = self.rng.choice(n_buyers, size=min(20, n_buyers), replace=False)
+            if self.compact:
+                features = self._compact_features(fake_seller, rows)
+                X.extend(features.tolist())
+                y.extend(self._compact_labels(features).tolist())
+                continue
+            for _, buyer_row in self._buyers_df.iloc[rows].iterrows():
                 buyer_dict = buyer_row.to_dict()
                 label = self._simulate_interest_label(fake_seller, buyer_dict)
                 features = self._extract_features(fake_seller, buyer_dict)
                 X.append(features)
                 y.append(label)
-        self.model = LogisticRegression(max_iter=1000)
-        self.model.fit(X, y)
+        with metrics.span("model.fit"):
+            if self.online:
+                # Начальная модель на правилах; дальше она дообучается на реальных откликах
+                self.model = SGDClassifier(loss="log_loss", alpha=1e-4, random_state=0)
+                self._partial_fit(np.asarray(X, dtype=float), np.asarray(y))
+            else:
+                self.model = LogisticRegression(max_iter=1000)
+                self.model.fit(X, y)
+
+    def _partial_fit(self, X: np.ndarray, y: np.ndarray):
+        for start in range(0, len(X), self.batch_size):
+            self.model.partial_fit(X[start:start + self.batch_size], y[start:start + self.batch_size], classes=[0, 1])
+        self.n_updates += len(X)
 
-    def rank(self, seller_profile: Dict[str, Any], top_k: int = 10) -> List[Dict[str, Any]]:
+    def _buyer(self, company_id: str) -> Optional[Dict[str, Any]]:
+        if self.compact:
+            return self.buyers.get(company_id)
+        if self._buyer_rows is None:
+            self._buyer_rows = {cid: i for i, cid in enumerate(self._buyers_df["company_id"])}
+        row = self._buyer_rows.get(company_id)
+        return None if row is None else self._buyers_df.iloc[row].to_dict()
+
+    def update(self, events: Iterable[Dict[str, Any]]) -> int:
+        """
+        Дообучает онлайн-модель на событиях откликов без полного переобучения.
+        Событие: {"seller": профиль продавца, "company_id": ..., "response": ...}
+        или с явной меткой {"label": 0/1} вместо "response".
+        События читаются и применяются мини-пакетами по batch_size.
+
+        :return: Число учтённых событий
+        """
+        if not self.online:
+            raise RuntimeError("Дообучение доступно только в онлайн-режиме (online=True)")
         if self.model is None:
             raise RuntimeError("Модель не обучена")
+        X, y, applied = [], [], 0
+        with metrics.span("model.update"):
+            for event in events:
+                buyer = self._buyer(event["company_id"])
+                if buyer is None:
+                    continue
+                label = event["label"] if "label" in event else int(event.get("response") in self.POSITIVE_RESPONSES)
+                X.append(self._extract_features(event["seller"], buyer))
+                y.append(int(label))
+                if len(X) >= self.batch_size:
+                    self._partial_fit(np.asarray(X, dtype=float), np.asarray(y))
+                    applied += len(X)
+                    X, y = [], []
+            if X:
+                self._partial_fit(np.asarray(X, dtype=float), np.asarray(y))
+                applied += len(X)
+        metrics.incr("model.update_events", applied)
+        return applied
+
+    def update_from_responses(self, seller_profile: Dict[str, Any], responses: List[Dict[str, Any]]) -> int:
+        """Дообучение на результатах BuyerResponseSimulator.simulate (или реальных ответах в том же формате)."""
+        return self.update(
+            {"seller": seller_profile, "company_id": r["company_id"], "response": r["response"]} for r in responses
+        )
+
+    def save_checkpoint(self, path: str):
+        """Сохраняет состояние модели (атомарно: запись во временный файл и переименование)."""
+        state = {
+            "model": self.model,
+            "online": self.online,
+            "use_news_signals": self.use_news_signals,
+            "n_updates": self.n_updates
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def load_checkpoint(self, path: str) -> 'BuyerRanker':
+        """Восстанавливает модель из контрольной точки; данные покупателей загружаются заново."""
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state["use_news_signals"] != self.use_news_signals:
+            raise ValueError("Контрольная точка обучена с другим набором признаков (use_news_signals)")
+        self.model = state["model"]
+        self.online = state["online"]
+        self.n_updates = state["n_updates"]
+        if not self._is_loaded():
+            self._load_buyers()
+        return self
+
+    def rank(self, seller_profile: Dict[str, Any], top_k: int = 10,
+             candidate_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        :param candidate_ids: Ранжировать только этих покупателей (например, ближайших
+                              по BuyerVectorIndex.similar_to_seller) вместо всей базы
+        """
+        if self.model is None:
+            raise RuntimeError("Модель не обучена")
+        if candidate_ids is not None and self.canonical:
+            candidate_ids = list(dict.fromkeys(self.canonical.get(c, c) for c in candidate_ids))
+        if self.compact:
+            return self._rank_compact(seller_profile, top_k, candidate_ids)
+        buyers_df = self._buyers_df
+        if candidate_ids is not None:
+            buyers_df = buyers_df[buyers_df["company_id"].isin(candidate_ids)]
+        elif self.canonical:
+            buyers_df = buyers_df[~buyers_df["company_id"].isin(self.canonical.keys())]
+        metrics.incr("rows_scanned.ranking", len(buyers_df))
         results = []
-        for _, buyer_row in self._buyers_df.iterrows():
-            buyer = buyer_row.to_dict()
-            features = self._extract_features(seller_profile, buyer)
-            prob = self.model.predict_proba([features])[0][1]
+        with metrics.span("model.inference"):
+            for _, buyer_row in buyers_df.iterrows():
+                buyer = buyer_row.to_dict()
+                features = self._extract_features(seller_profile, buyer)
+                prob = self.model.predict_proba([features])[0][1]
+                results.append({
+                    "name": buyer["name"],
+                    "type": buyer["type"],
+                    "company_id": buyer["company_id"],
+                    "probability": float(prob)
+                })
+        results.sort(key=lambda x: x["probability"], reverse=True)
+        return results[:top_k]
+
+    def _rank_compact(self, seller_profile: Dict[str, Any], top_k: int,
+                      candidate_ids: Optional[List[str]]) -> List[Dict[str, Any]]:
+        store = self.buyers
+        if candidate_ids is None:
+            rows = self._rank_rows if self._rank_rows is not None else np.arange(len(store))
+        else:
+            rows = np.array(sorted({r for r in map(store.row_of, candidate_ids) if r is not None}), dtype=np.int64)
+        metrics.incr("rows_scanned.ranking", len(rows))
+        with metrics.span("model.inference"):
+            if len(rows) == 0:
+                return []
+            probs = self.model.predict_proba(self._compact_features(seller_profile, rows))[:, 1]
+            # Полная сортировка не нужна: отбираем top_k и упорядочиваем только их
+            k = min(top_k, len(rows))
+            best = np.argpartition(-probs, k - 1)[:k]
+            best = best[np.lexsort((best, -probs[best]))]
+        results = []
+        for i in best.tolist():
+            profile = store.profile(int(rows[i]))
             results.append({
-                "name": buyer["name"],
-                "type": buyer["type"],
-                "company_id": buyer["company_id"],
-                "probability": float(prob)
+                "name": profile["name"],
+                "type": profile["type"],
+                "company_id": profile["company_id"],
+                "probability": float(probs[i])
             })
-        results.sort(key=lambda x: x["probability"], reverse=True)
-        return results[:top_k]
\ No newline at end of file
+        return results
@@ -0,0 +1,267 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Dict, Any, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from .metrics import metrics
+from .pipeline import seller_key, _json_default
+
+# Сводные столбцы прогона: по ним строятся история, сравнение и дашборд без разбора JSON
+SUMMARY_COLUMNS = ["run_key", "created_at", "source", "seller_id", "industry", "geography", "revenue", "ebitda",
+                   "data_version", "model_version", "status", "estimated_value", "final_price", "multiplier",
+                   "nda_count", "top_buyer"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_key TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    source TEXT,
+    seller_id TEXT,
+    industry TEXT,
+    geography TEXT,
+    revenue REAL,
+    ebitda REAL,
+    data_version TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    status TEXT,
+    estimated_value REAL,
+    final_price REAL,
+    multiplier REAL,
+    nda_count INTEGER,
+    top_buyer TEXT,
+    seller TEXT NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at);
+CREATE INDEX IF NOT EXISTS runs_segment ON runs (industry, geography, created_at);
+"""
+
+
+def model_version(**options) -> str:
+    """Версия моделей и настроек этапов: меняется при смене любого параметра, влияющего на результат."""
+    text = json.dumps(options, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def _int_keys(obj: Dict[str, Any]) -> Dict[Any, Any]:
+    """JSON превращает числовые ключи (перцентили цены) в строки — возвращаем им тип int."""
+    return {int(k) if k.isdigit() else k: v for k, v in obj.items()}
+
+
+def _summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    valuation = result.get("valuation") or {}
+    auction = result.get("auction") or {}
+    ranking = result.get("ranking") or []
+    nda_count = auction.get("nda_count")
+    if nda_count is None and result.get("responses") is not None:
+        nda_count = sum(1 for r in result["responses"] if r.get("response") == "NDA_requested")
+    return {
+        "status": result.get("status", "ok"),
+        "estimated_value": valuation.get("estimated_value"),
+        "final_price": auction.get("final_price"),
+        "multiplier": auction.get("multiplier"),
+        "nda_count": nda_count,
+        "top_buyer": ranking[0]["company_id"] if ranking else None,
+    }
+
+
+class RunStore:
+    """
+    Постоянное хранилище результатов анализа продавца (SQLite).
+
+    Ключ прогона — нормализованный профиль продавца (seller_key) вместе с версией данных
+    и версией моделей, поэтому после перезапуска или у другого аналитика тот же продавец
+    берётся из истории, а смена данных или настроек даёт новый прогон.
+
+    Запись буферизуется: прогоны копятся в памяти и пишутся одной транзакцией, когда набралось
+    batch_size записей или прошло flush_interval секунд (фоновый поток). get() видит и ещё
+    не записанные прогоны. Сводные столбцы (оценка, цена, NDA, лучший покупатель) хранятся
+    отдельно от полного JSON, поэтому история и дашборд не разбирают результаты.
+    """
+
+    def __init__(self, path: str = "runs.db", batch_size: int = 32, flush_interval: float = 2.0):
+        """
+        :param path: Файл SQLite хранилища
+        :param batch_size: Размер транзакции записи
+        :param flush_interval: Максимальная задержка записи буфера, сек (0 — без фонового потока)
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Tuple] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        with closing(self._connect()) as conn, conn:
+            # WAL: чтение истории не ждёт записи, несколько процессов пишут по очереди
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        self._flusher = None
+        if flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="run-store-flush", daemon=True)
+            self._flusher.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def run_key(seller: Dict[str, Any], data_version: str, model_version: str) -> str:
+        text = json.dumps([seller_key(seller), data_version, model_version], ensure_ascii=False, default=str)
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    # === Запись ===
+    def put(self, seller: Dict[str, Any], result: Dict[str, Any], data_version: str, model_version: str,
+            source: str = "app") -> str:
+        """
+        Ставит прогон в очередь записи (повторный прогон с тем же ключом заменяет прежний).
+
+        :param result: Результаты этапов (valuation, ranking, auction, ...), сериализуемые в JSON
+        :param source: Откуда прогон: "app", "pipeline" и т.п.
+        :return: Ключ прогона
+        """
+        key = self.run_key(seller, data_version, model_version)
+        summary = _summary(result)
+        row = (key, time.time(), source, None if seller.get("seller_id") is None else str(seller["seller_id"]),
+               seller.get("industry"), seller.get("geography"), seller.get("revenue"), seller.get("ebitda"),
+               data_version, model_version, summary["status"], summary["estimated_value"], summary["final_price"],
+               summary["multiplier"], summary["nda_count"], summary["top_buyer"],
+               json.dumps(seller, ensure_ascii=False, default=_json_default),
+               json.dumps(result, ensure_ascii=False, default=_json_default))
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("RunStore закрыт")
+            self._pending[key] = row
+            full = len(self._pending) >= self.batch_size
+        metrics.incr("run_store.puts")
+        if full:
+            self.flush()
+        return key
+
+    def flush(self) -> int:
+        """Записывает буфер одной транзакцией. :return: Число записанных прогонов"""
+        # Порядок записей сохраняется: следующий буфер не обгонит предыдущий
+        with self._write_lock:
+            with self._lock:
+                rows = list(self._pending.values())
+            if not rows:
+                return 0
+            with metrics.span("run_store.flush"), closing(self._connect()) as conn, conn:
+                conn.executemany(f"INSERT OR REPLACE INTO runs ({', '.join(SUMMARY_COLUMNS)}, seller, result) "
+                                 f"VALUES ({', '.join('?' * (len(SUMMARY_COLUMNS) + 2))})", rows)
+            with self._lock:
+                # Удаляем только записанное: прогон мог быть обновлён во время транзакции
+                for row in rows:
+                    if self._pending.get(row[0]) is row:
+                        del self._pending[row[0]]
+        metrics.incr("run_store.rows_written", len(rows))
+        return len(rows)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error:
+                # Запись повторится при следующем сбросе: буфер не очищен
+                metrics.incr("run_store.flush_errors")
+
+    def close(self):
+        """Дописывает буфер и останавливает фоновый поток."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wakeup.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    # === Чтение ===
+    def get(self, seller: Dict[str, Any], data_version: str, model_version: str) -> Optional[Dict[str, Any]]:
+        """Готовый прогон для продавца при тех же данных и моделях или None."""
+        run = self.load(self.run_key(seller, data_version, model_version))
+        metrics.incr("run_store.hits" if run is not None else "run_store.misses")
+        return run
+
+    def load(self, run_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Прогон по ключу: {"run_key", "created_at", "seller", "result", ...сводные столбцы}.
+        """
+        with self._lock:
+            row = self._pending.get(run_key)
+        if row is None:
+            with closing(self._connect()) as conn:
+                row = conn.execute(f"SELECT {', '.join(SUMMARY_COLUMNS)}, seller, result FROM runs WHERE run_key = ?",
+                                   (run_key,)).fetchone()
+        if row is None:
+            return None
+        run = dict(zip(SUMMARY_COLUMNS, row[:len(SUMMARY_COLUMNS)]))
+        run["seller"] = json.loads(row[-2])
+        run["result"] = json.loads(row[-1], object_hook=_int_keys)
+        return run
+
+    def _query(self, sql: str, params: Sequence[Any] = ()) -> pd.DataFrame:
+        # Незаписанные прогоны тоже должны попасть в историю
+        self.flush()
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(sql, conn, params=list(params))
+
+    def history(self, limit: int = 50, industry: Optional[str] = None, geography: Optional[str] = None,
+                source: Optional[str] = None) -> pd.DataFrame:
+        """Последние прогоны (сводные столбцы), новые сверху."""
+        conditions, params = [], []
+        for column, value in (("industry", industry), ("geography", geography), ("source", source)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        df = self._query(f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM runs{where} "
+                         f"ORDER BY created_at DESC LIMIT ?", params + [limit])
+        df["created_at"] = pd.to_datetime(df["created_at"], unit="s")
+        return df
+
+    def compare(self, run_keys: Sequence[str], top_n: int = 5) -> pd.DataFrame:
+        """Прогоны рядом: строка на прогон — сводные показатели и top_n покупателей."""
+        rows = []
+        for key in run_keys:
+            run = self.load(key)
+            if run is None:
+                continue
+            ranking = run["result"].get("ranking") or []
+            price_range = run["result"].get("price_range") or {}
+            percentiles = price_range.get("price_percentiles", {})
+            rows.append({**{c: run[c] for c in SUMMARY_COLUMNS},
+                         "price_p5": percentiles.get(5), "price_p95": percentiles.get(95),
+                         "top_buyers": ", ".join(b["name"] for b in ranking[:top_n])})
+        df = pd.DataFrame(rows)
+        if len(df):
+            df["created_at"] = pd.to_datetime(df["created_at"], unit="s")
+        return df
+
+    def dashboard(self, by: Sequence[str] = ("industry", "geography")) -> pd.DataFrame:
+        """Агрегаты по сегментам: число прогонов, средняя оценка и цена, средний рост цены и число NDA."""
+        group = ", ".join(by)
+        return self._query(
+            f"SELECT {group}, COUNT(*) AS runs, AVG(estimated_value) AS avg_estimated_value, "
+            f"AVG(final_price) AS avg_final_price, AVG(multiplier) AS avg_multiplier, "
+            f"AVG(nda_count) AS avg_nda_count, MAX(created_at) AS last_run "
+            f"FROM runs WHERE status = 'ok' GROUP BY {group} ORDER BY runs DESC"
+        ).assign(last_run=lambda df: pd.to_datetime(df["last_run"], unit="s"))
+
+
+# === Пример использования ===
+if __name__ == "__main__":
+    import sys
+
+    store = RunStore(sys.argv[1] if len(sys.argv) > 1 else "runs.db", flush_interval=0)
+    print(store.dashboard().to_string())
+    history = store.history(limit=10)
+    print(history.to_string())
+    if len(history) >= 2:
+        print(store.compare(history["run_key"].head(2).tolist()).T.to_string())
@@ -0,0 +1,104 @@
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, Any
+
+from .metrics import metrics
+
+
+class Stage:
+    """Этап конвейера: функция, её зависимости и тип исполнителя."""
+
+    KINDS = ("thread", "process")
+
+    def __init__(self, name: str, func: Callable, deps: Iterable[str] = (), kind: str = "thread"):
+        if kind not in self.KINDS:
+            raise ValueError(f"Неизвестный тип исполнителя: {kind}")
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.kind = kind
+
+
+class StageScheduler:
+    """
+    Запускает независимые этапы анализа параллельно с учётом зависимостей.
+
+    Этапы типа "thread" (I/O, инференс моделей) выполняются в пуле потоков,
+    этапы типа "process" (чистый Python под GIL) — в пуле процессов.
+    Функция этапа получает результаты зависимостей именованными аргументами.
+    Результаты отдаются по мере готовности, поэтому UI может показывать
+    каждый этап сразу, а общее время близко к самой долгой цепочке.
+    """
+
+    def __init__(self, max_threads: int = 4, max_processes: Optional[int] = None,
+                 thread_initializer: Optional[Callable] = None,
+                 process_pool: Optional[ProcessPoolExecutor] = None):
+        """
+        :param max_threads: Размер пула потоков
+        :param max_processes: Размер пула процессов (по умолчанию — число CPU)
+        :param thread_initializer: Функция инициализации потоков (например, контекст Streamlit)
+        :param process_pool: Внешний пул процессов (не закрывается планировщиком)
+        """
+        self.max_threads = max_threads
+        self.max_processes = max_processes
+        self.thread_initializer = thread_initializer
+        self.process_pool = process_pool
+        self._stages: Dict[str, Stage] = {}
+
+    def add(self, name: str, func: Callable, deps: Iterable[str] = (), kind: str = "thread") -> 'StageScheduler':
+        """
+        Добавляет этап. Зависимости должны быть добавлены раньше — так граф всегда ацикличен.
+        """
+        if name in self._stages:
+            raise ValueError(f"Этап '{name}' уже добавлен")
+        stage = Stage(name, func, deps, kind)
+        missing = [d for d in stage.deps if d not in self._stages]
+        if missing:
+            raise ValueError(f"Этап '{name}' зависит от неизвестных этапов: {missing}")
+        self._stages[name] = stage
+        return self
+
+    def run(self) -> Iterator[Tuple[str, Any]]:
+        """
+        Выполняет все этапы и отдаёт пары (имя, результат) в порядке завершения.
+        Исключение этапа пробрасывается, незапущенные этапы отменяются.
+        """
+        results: Dict[str, Any] = {}
+        remaining = dict(self._stages)
+        running = {}
+        started: Dict[str, float] = {}
+
+        threads = ThreadPoolExecutor(max_workers=self.max_threads, initializer=self.thread_initializer)
+        processes = self.process_pool
+        owns_processes = False
+        if processes is None and any(s.kind == "process" for s in remaining.values()):
+            processes = ProcessPoolExecutor(
+                max_workers=self.max_processes,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            owns_processes = True
+
+        def submit_ready():
+            for name, stage in list(remaining.items()):
+                if all(d in results for d in stage.deps):
+                    pool = processes if stage.kind == "process" else threads
+                    kwargs = {d: results[d] for d in stage.deps}
+                    running[pool.submit(stage.func, **kwargs)] = name
+                    started[name] = time.perf_counter()
+                    del remaining[name]
+
+        try:
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    metrics.record(f"stage.{name}", time.perf_counter() - started[name])
+                    yield name, results[name]
+                submit_ready()
+        finally:
+            threads.shutdown(wait=False, cancel_futures=True)
+            if owns_processes:
+                processes.shutdown(wait=False, cancel_futures=True)
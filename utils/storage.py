@@ -0,0 +1,322 @@
+import ast
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .metrics import metrics
+
+# Условие отбора: (столбец, операция, значение); условия списка объединяются через И
+Filter = Tuple[str, str, Any]
+FILTER_OPS = ("==", "!=", "<", "<=", ">", ">=", "in")
+
+TABLES = ("sellers", "buyers", "deals", "news", "buyer_canonical")
+
+# Объявленный тип столбца SQLite → тип Arrow (по правилам type affinity SQLite)
+_AFFINITY_TYPES = (("INT", "int64"), ("CHAR", "string"), ("CLOB", "string"), ("TEXT", "string"),
+                   ("REAL", "float64"), ("FLOA", "float64"), ("DOUB", "float64"))
+
+
+def parse_list(value: Any) -> list:
+    """
+    Значение спискового столбца (industry_focus, target_geography, past_acquisitions) → список Python.
+    Принимает текст из SQLite (repr списка), список или массив из Parquet; NULL, NaN и мусор → [].
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    if not isinstance(value, str) or value in ("", "NULL"):
+        return []
+    try:
+        result = ast.literal_eval(value)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return []
+    return result if isinstance(result, list) else []
+
+
+def list_text(value: Any) -> str:
+    """Списковое значение в текстовом виде, как оно хранится в SQLite (repr списка); NULL и NaN → ""."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return str(parse_list(value))
+    return ""
+
+
+def _check_filters(filters: Optional[Sequence[Filter]]) -> List[Filter]:
+    filters = list(filters or [])
+    for column, op, _ in filters:
+        if op not in FILTER_OPS:
+            raise ValueError(f"Неподдерживаемая операция фильтра: {op} (столбец {column})")
+    return filters
+
+
+class StorageBackend:
+    """
+    Источник таблиц sellers / buyers / deals / news.
+    Чтение с проекцией (columns) и отбором строк (filters), которые выполняются
+    на стороне хранилища, а не после загрузки всей таблицы в pandas.
+    """
+
+    def read(self, table: str, columns: Optional[Sequence[str]] = None,
+             filters: Optional[Sequence[Filter]] = None) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def iter_batches(self, table: str, columns: Optional[Sequence[str]] = None,
+                     filters: Optional[Sequence[Filter]] = None, batch_size: int = 200_000) -> Iterator[pd.DataFrame]:
+        raise NotImplementedError
+
+    def count(self, table: str) -> int:
+        raise NotImplementedError
+
+    def has_table(self, table: str) -> bool:
+        raise NotImplementedError
+
+    def version(self) -> str:
+        """Версия данных: меняется при перезаписи хранилища."""
+        raise NotImplementedError
+
+
+class SQLiteBackend(StorageBackend):
+    """Хранилище по умолчанию: файл SQLite. Проекция и фильтры превращаются в SELECT ... WHERE."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+    @staticmethod
+    def _query(table: str, columns: Optional[Sequence[str]], filters: List[Filter]) -> Tuple[str, list]:
+        select = ", ".join(f'"{c}"' for c in columns) if columns else "*"
+        conditions, params = [], []
+        for column, op, value in filters:
+            if op == "in":
+                values = list(value)
+                conditions.append(f'"{column}" IN ({", ".join("?" * len(values))})' if values else "0")
+                params.extend(values)
+            else:
+                conditions.append(f'"{column}" {"=" if op == "==" else op} ?')
+                params.append(value)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        # Порядок строк — как в таблице (и в выгрузке Arrow), даже если отбор идёт по индексу
+        return f"SELECT {select} FROM {table}{where} ORDER BY rowid", params
+
+    def read(self, table: str, columns: Optional[Sequence[str]] = None,
+             filters: Optional[Sequence[Filter]] = None) -> pd.DataFrame:
+        sql, params = self._query(table, columns, _check_filters(filters))
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def iter_batches(self, table: str, columns: Optional[Sequence[str]] = None,
+                     filters: Optional[Sequence[Filter]] = None, batch_size: int = 200_000) -> Iterator[pd.DataFrame]:
+        sql, params = self._query(table, columns, _check_filters(filters))
+        conn = sqlite3.connect(self.db_path)
+        try:
+            yield from pd.read_sql_query(sql, conn, params=params, chunksize=batch_size)
+        finally:
+            conn.close()
+
+    def count(self, table: str) -> int:
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def has_table(self, table: str) -> bool:
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                (table,)).fetchone() is not None
+
+    def arrow_schema(self, table: str):
+        """Схема Arrow по объявленным типам столбцов (не по значениям первой порции)."""
+        import pyarrow as pa
+
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+        fields = []
+        for _, name, declared, *_ in info:
+            arrow_type = next((t for key, t in _AFFINITY_TYPES if key in (declared or "").upper()), "string")
+            fields.append(pa.field(name, getattr(pa, arrow_type)()))
+        return pa.schema(fields)
+
+    def version(self) -> str:
+        stat = os.stat(self.db_path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+class ArrowBackend(StorageBackend):
+    """
+    Колоночное хранилище в каталоге: <table>.arrow (Arrow IPC без сжатия),
+    <table>.parquet или каталог <table>/ с частями *.parquet (как пишет MADatasetGenerator).
+
+    Файлы Arrow открываются через memory map: проекция столбцов не копирует данные,
+    а страницы файла — общий page cache ОС, поэтому несколько процессов читают
+    одну копию. Для Parquet проекция и фильтры передаются в pyarrow
+    (пропуск групп строк по статистике), чтение также через memory map;
+    списковые столбцы Parquet отдаются текстом, как из SQLite (см. _to_pandas).
+    """
+
+    def __init__(self, directory: str):
+        import pyarrow  # noqa: F401 — понятная ошибка при отсутствии зависимости
+
+        self.directory = directory
+        self._tables: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, table: str) -> Tuple[str, str]:
+        for kind, path in (("arrow", os.path.join(self.directory, f"{table}.arrow")),
+                           ("parquet", os.path.join(self.directory, f"{table}.parquet")),
+                           ("parquet", os.path.join(self.directory, table))):
+            if os.path.exists(path):
+                return kind, path
+        raise FileNotFoundError(f"Таблица '{table}' не найдена в {self.directory}")
+
+    def _arrow_table(self, path: str):
+        import pyarrow as pa
+
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._tables.get(path)
+            if cached is None or cached[0] != stamp:
+                # Файл перезаписан (export_arrow заменяет его атомарно) — отображаем заново
+                cached = (stamp, pa.ipc.open_file(pa.memory_map(path, "r")).read_all())
+                self._tables[path] = cached
+        return cached[1]
+
+    @staticmethod
+    def _mask(table, filters: List[Filter]):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        ops = {"==": pc.equal, "!=": pc.not_equal, "<": pc.less, "<=": pc.less_equal,
+               ">": pc.greater, ">=": pc.greater_equal}
+        mask = None
+        for column, op, value in filters:
+            if op == "in":
+                condition = pc.is_in(table[column], value_set=pa.array(list(value), type=table.schema.field(column).type))
+            else:
+                condition = ops[op](table[column], value)
+            mask = condition if mask is None else pc.and_(mask, condition)
+        return mask
+
+    def read_table(self, table: str, columns: Optional[Sequence[str]] = None,
+                   filters: Optional[Sequence[Filter]] = None):
+        """Таблица pyarrow; без фильтров для .arrow — представление над отображённым файлом без копии."""
+        import pyarrow.parquet as pq
+
+        filters = _check_filters(filters)
+        kind, path = self._path(table)
+        if kind == "parquet":
+            return pq.read_table(path, columns=list(columns) if columns else None,
+                                 filters=filters or None, memory_map=True)
+        data = self._arrow_table(path)
+        if filters:
+            # Фильтруем до проекции: условия могут ссылаться на непрочитанные столбцы
+            data = data.filter(self._mask(data, filters))
+        return data.select(list(columns)) if columns else data
+
+    @staticmethod
+    def _to_pandas(data) -> pd.DataFrame:
+        """
+        DataFrame в том же виде, что читает SQLiteBackend: списковые столбцы Parquet
+        (list<string>, list<struct>) приводятся к тексту repr списка, как их пишет MADatasetGenerator в SQLite.
+        """
+        import pyarrow as pa
+
+        df = data.to_pandas()
+        for field in data.schema:
+            if pa.types.is_list(field.type) or pa.types.is_large_list(field.type):
+                df[field.name] = [None if v is None else list_text(v) for v in df[field.name].tolist()]
+        return df
+
+    def read(self, table: str, columns: Optional[Sequence[str]] = None,
+             filters: Optional[Sequence[Filter]] = None) -> pd.DataFrame:
+        return self._to_pandas(self.read_table(table, columns, filters))
+
+    def iter_batches(self, table: str, columns: Optional[Sequence[str]] = None,
+                     filters: Optional[Sequence[Filter]] = None, batch_size: int = 200_000) -> Iterator[pd.DataFrame]:
+        data = self.read_table(table, columns, filters)
+        for offset in range(0, data.num_rows, batch_size):
+            yield self._to_pandas(data.slice(offset, batch_size))
+
+    def count(self, table: str) -> int:
+        import pyarrow.parquet as pq
+
+        kind, path = self._path(table)
+        if kind == "arrow":
+            return self._arrow_table(path).num_rows
+        return pq.ParquetDataset(path).read(columns=[]).num_rows
+
+    def has_table(self, table: str) -> bool:
+        try:
+            self._path(table)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def version(self) -> str:
+        stamps = []
+        for name in sorted(os.listdir(self.directory)):
+            stat = os.stat(os.path.join(self.directory, name))
+            stamps.append(f"{name}:{stat.st_mtime_ns}-{stat.st_size}")
+        return hashlib.sha1("|".join(stamps).encode("utf-8")).hexdigest()[:16]
+
+
+_backends: Dict[str, StorageBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def open_storage(source: str) -> StorageBackend:
+    """
+    Хранилище по пути: каталог — ArrowBackend, иначе — файл SQLite (по умолчанию).
+    Экземпляры переиспользуются в процессе, чтобы отображённые файлы открывались один раз.
+    """
+    key = os.path.abspath(source)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            backend = ArrowBackend(source) if os.path.isdir(source) else SQLiteBackend(source)
+            _backends[key] = backend
+    return backend
+
+
+def export_arrow(db_path: str, directory: str, tables: Sequence[str] = TABLES, batch_size: int = 200_000) -> Dict[str, int]:
+    """
+    Выгружает таблицы SQLite в файлы Arrow IPC (без сжатия — для чтения через memory map).
+    Таблицы пишутся потоково порциями; файл заменяется атомарно.
+
+    :return: Число строк по таблицам
+    """
+    import pyarrow as pa
+
+    os.makedirs(directory, exist_ok=True)
+    source = SQLiteBackend(db_path)
+    counts = {}
+    for table in tables:
+        if not source.has_table(table):
+            continue
+        path = os.path.join(directory, f"{table}.arrow")
+        tmp_path = path + ".tmp"
+        schema, rows = source.arrow_schema(table), 0
+        with metrics.span(f"storage.export.{table}"), pa.ipc.new_file(tmp_path, schema) as writer:
+            for chunk in source.iter_batches(table, batch_size=batch_size):
+                writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+                rows += len(chunk)
+        os.replace(tmp_path, path)
+        counts[table] = rows
+    return counts
+
+
+# === Пример использования ===
+if __name__ == "__main__":
+    import sys
+
+    db = sys.argv[1] if len(sys.argv) > 1 else "m_and_a.db"
+    target = sys.argv[2] if len(sys.argv) > 2 else "m_and_a_arrow"
+    print(export_arrow(db, target))
+    storage = open_storage(target)
+    print(storage.read("deals", columns=["target_industry", "target_revenue", "ebitda_multiple"],
+                       filters=[("target_industry", "==", "Аптеки"), ("target_revenue", ">", 20)]).head())
@@ -0,0 +1,230 @@
+import warnings
+from typing import Dict, Any, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .auction_simulator import AuctionSimulator
+from .buyer_response_simulator import BuyerResponseSimulator
+from .buyer_store import CompactBuyers
+from .metrics import metrics
+from .ranking import BuyerRanker
+from .valuation import BusinessValuationEngine
+
+
+class SellerSweep:
+    """
+    Сценарии «что если»: оценка, ранжирование покупателей и ожидаемая цена аукциона
+    по сетке значений выручки, EBITDA и города продавца за один векторный проход.
+
+    - Оценка: сделки отрасли сортируются по выручке один раз; окно top_n ближайших
+      сделок для каждой выручки сетки находится двоичным поиском, медианы — по всем окнам сразу.
+    - Ранжирование: модель BuyerRanker линейна, поэтому вклад признаков покупателя,
+      зависящих от отрасли и города, считается один раз на город, а от выручки — один раз на выручку.
+    - Цена: число NDA среди top_k — сумма независимых испытаний (распределение Пуассона—биномиальное),
+      ожидаемый множитель считается по нему точно, без Монте-Карло.
+    """
+
+    def __init__(self, db_path: str, ranker: Optional[BuyerRanker] = None,
+                 response_simulator: Optional[BuyerResponseSimulator] = None):
+        """
+        :param ranker: Обученный BuyerRanker (по умолчанию обучается новый)
+        :param response_simulator: Источник вероятностей NDA по рангам
+        """
+        self.db_path = db_path
+        if ranker is None:
+            ranker = BuyerRanker(db_path)
+            ranker.fit()
+        if not hasattr(ranker.model, "coef_"):
+            raise ValueError("Сценарии поддерживают только линейные модели BuyerRanker")
+        self.ranker = ranker
+        self.response_simulator = response_simulator or BuyerResponseSimulator()
+        self._deals: Optional[pd.DataFrame] = None
+        self._store: Optional[CompactBuyers] = None
+
+    # === Данные ===
+    def _load(self):
+        if self._deals is None:
+            self._deals = BusinessValuationEngine(self.db_path)._load_deals()
+        if self._store is None:
+            self._store = self.ranker.buyers if self.ranker.compact else CompactBuyers.from_frame(self.ranker._buyers_df)
+
+    # === Оценка ===
+    @staticmethod
+    def _window_starts(revenues: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+        """Начала окон из k ближайших по выручке сделок в отсортированном массиве (для всех запросов)."""
+        lo = np.zeros(len(queries), dtype=np.int64)
+        hi = np.full(len(queries), len(revenues) - k, dtype=np.int64)
+        while np.any(lo < hi):
+            active = lo < hi
+            mid = (lo + hi) // 2
+            # Сдвигаем окно вправо, пока левый край дальше от запроса, чем следующий за правым
+            right = np.minimum(mid + k, len(revenues) - 1)
+            move = queries - revenues[mid] > revenues[right] - queries
+            lo = np.where(active & move, mid + 1, lo)
+            hi = np.where(active & ~move, mid, hi)
+        return lo
+
+    def _valuations(self, industry: str, revenues: np.ndarray, ebitdas: Sequence[Optional[float]],
+                    top_n: int) -> pd.DataFrame:
+        deals = self._deals[self._deals["target_industry"] == industry]
+        deals = deals.sort_values("target_revenue", kind="stable")
+        rows = []
+        if deals.empty:
+            for revenue in revenues:
+                for ebitda in ebitdas:
+                    rows.append({"revenue": revenue, "ebitda": ebitda, "estimated_value": None, "method": None,
+                                 "error": "Нет сделок в отрасли", "n_comparables": 0,
+                                 "revenue_multiple": None, "ebitda_multiple": None})
+            return pd.DataFrame(rows)
+
+        k = min(top_n, len(deals))
+        starts = self._window_starts(deals["target_revenue"].to_numpy(dtype=float), revenues, k)
+        windows = starts[:, None] + np.arange(k)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            rev_mult = np.nanmedian(deals["revenue_multiple"].to_numpy(dtype=float)[windows], axis=1)
+            ebitda_mult = np.nanmedian(deals["ebitda_multiple"].to_numpy(dtype=float)[windows], axis=1)
+
+        for i, revenue in enumerate(revenues.tolist()):
+            for ebitda in ebitdas:
+                row = {"revenue": revenue, "ebitda": ebitda, "estimated_value": None, "method": None,
+                       "error": None, "n_comparables": k,
+                       "revenue_multiple": float(rev_mult[i]), "ebitda_multiple": float(ebitda_mult[i])}
+                # Те же правила выбора метода, что в BusinessValuationEngine.estimate
+                if ebitda is not None and ebitda_mult[i] > 0:
+                    row["estimated_value"] = round(ebitda * ebitda_mult[i], 2)
+                    row["method"] = f"мультипликатор EBITDA {ebitda_mult[i]:.1f}x"
+                elif rev_mult[i] > 0:
+                    row["estimated_value"] = round(revenue * rev_mult[i], 2)
+                    row["method"] = f"мультипликатор выручки {rev_mult[i]:.1f}x"
+                else:
+                    row["error"] = "Не удалось рассчитать"
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+    # === Ранжирование и ожидаемая цена ===
+    def _news_columns(self, seller: Dict[str, Any]) -> np.ndarray:
+        store, signals = self._store, self.ranker.news_signals
+        news = np.zeros((len(store), 2))
+        for buyer_id in signals.counts:
+            row = store.row_of(buyer_id)
+            if row is not None:
+                news[row] = signals.features(buyer_id, seller)
+        return news
+
+    def _rankings(self, industry: str, revenues: np.ndarray, geographies: Sequence[str],
+                  top_k: int) -> pd.DataFrame:
+        store = self._store
+        coef = self.ranker.model.coef_[0]
+        intercept = float(self.ranker.model.intercept_[0])
+        ind = store.industry_match(industry)
+        rev_min = store.revenue_min.astype(float)
+        rev_max = store.revenue_max.astype(float)
+        rev_center, rev_range = (rev_min + rev_max) / 2, np.maximum(1.0, rev_max - rev_min)
+        k = min(top_k, len(store))
+        base_probs = np.array([self.response_simulator._get_base_nda_probability(r) for r in range(1, k + 1)])
+
+        # Вклад признаков, не зависящих от выручки: один раз на город
+        by_geography = {}
+        for geography in geographies:
+            geo = store.geography_match(geography)
+            past = store.acquisition_counts(industry, geography) > 0
+            logit = intercept + coef[0] * ind + coef[1] * geo + coef[3] * past
+            if self.ranker.use_news_signals:
+                logit = logit + self._news_columns({"industry": industry, "geography": geography}) @ coef[5:7]
+            personalization = np.minimum(1.0, (ind.astype(float) + geo) / 2.0)
+            by_geography[geography] = (logit, personalization)
+
+        rows = []
+        for revenue in revenues.tolist():
+            revenue32 = np.float32(revenue)
+            in_range = (store.revenue_min <= revenue32) & (revenue32 <= store.revenue_max)
+            revenue_term = coef[2] * in_range + coef[4] * (np.abs(revenue - rev_center) / rev_range)
+            for geography in geographies:
+                logit, personalization = by_geography[geography]
+                z = logit + revenue_term
+                best = np.argpartition(-z, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+                best = best[np.lexsort((best, -z[best]))]
+                probs = 1.0 / (1.0 + np.exp(-z[best]))
+                nda_probs = np.minimum(0.95, base_probs + 0.2 * personalization[best])
+                for rank, (row, prob, p_nda) in enumerate(zip(best.tolist(), probs.tolist(), nda_probs.tolist()), 1):
+                    rows.append({"revenue": revenue, "geography": geography, "rank": rank,
+                                 "company_id": store.company_id(row), "name": store.name(row),
+                                 "probability": prob, "nda_probability": p_nda})
+        return pd.DataFrame(rows, columns=["revenue", "geography", "rank", "company_id", "name",
+                                           "probability", "nda_probability"])
+
+    @staticmethod
+    def _nda_distribution(nda_probs: np.ndarray) -> np.ndarray:
+        """Распределение числа NDA (Пуассона—биномиальное) для каждой строки матрицы вероятностей."""
+        dist = np.zeros((len(nda_probs), nda_probs.shape[1] + 1))
+        dist[:, 0] = 1.0
+        for j in range(nda_probs.shape[1]):
+            p = nda_probs[:, j:j + 1]
+            shifted = dist[:, :-1] * p
+            dist *= 1.0 - p
+            dist[:, 1:] += shifted
+        return dist
+
+    # === Сценарии ===
+    def run(self, seller: Dict[str, Any], revenues: Sequence[float], ebitdas: Sequence[Optional[float]] = (None,),
+            geographies: Optional[Sequence[str]] = None, top_k: int = 10, top_n: int = 10) -> Dict[str, pd.DataFrame]:
+        """
+        Считает все сочетания revenues × ebitdas × geographies для отрасли продавца.
+
+        :param seller: Профиль продавца (используется отрасль и, если geographies не заданы, город)
+        :param ebitdas: Значения EBITDA (None — оценка по мультипликатору выручки)
+        :param top_k: Число покупателей в ранжировании (как в BuyerRanker.rank)
+        :param top_n: Число сопоставимых сделок (как в BusinessValuationEngine.estimate)
+        :return: {"grid": строка на сочетание — оценка, ожидаемые NDA, множитель и цена;
+                  "rankings": top_k покупателей для каждой пары (выручка, город)}
+        """
+        self._load()
+        industry = seller["industry"]
+        revenues = np.asarray(revenues, dtype=float)
+        geographies = list(geographies or [seller["geography"]])
+        with metrics.span("sweep.valuation"):
+            valuations = self._valuations(industry, revenues, list(ebitdas), top_n)
+        with metrics.span("sweep.ranking"):
+            rankings = self._rankings(industry, revenues, geographies, top_k)
+
+        # Ожидаемые NDA и множитель — по паре (выручка, город)
+        competition = []
+        for (revenue, geography), group in rankings.groupby(["revenue", "geography"], sort=False):
+            competition.append({"revenue": revenue, "geography": geography,
+                                "top_buyer": group["company_id"].iloc[0],
+                                "top_probability": group["probability"].iloc[0],
+                                "nda_probs": group["nda_probability"].to_numpy()})
+        competition = pd.DataFrame(competition, columns=["revenue", "geography", "top_buyer",
+                                                         "top_probability", "nda_probs"])
+        if len(competition):
+            dist = self._nda_distribution(np.vstack(competition["nda_probs"].to_list()))
+            competition["expected_nda"] = dist @ np.arange(dist.shape[1])
+            competition["p_competition"] = dist[:, 2:].sum(axis=1)
+            competition["expected_multiplier"] = AuctionSimulator.expected_multiplier(dist)
+        else:
+            competition = competition.assign(expected_nda=0.0, p_competition=0.0, expected_multiplier=1.0)
+        competition = competition.drop(columns="nda_probs")
+
+        grid = valuations.merge(competition, on="revenue", how="left")
+        grid.insert(0, "industry", industry)
+        grid["expected_price"] = grid["estimated_value"].astype(float) * grid["expected_multiplier"]
+        grid = grid[["industry", "geography", "revenue", "ebitda", "estimated_value", "method", "error",
+                     "n_comparables", "revenue_multiple", "ebitda_multiple", "top_buyer", "top_probability",
+                     "expected_nda", "p_competition", "expected_multiplier", "expected_price"]]
+        metrics.incr("sweep.points", len(grid))
+        return {"grid": grid.reset_index(drop=True), "rankings": rankings}
+
+
+# === Пример использования ===
+if __name__ == "__main__":
+    import time
+
+    seller = {"industry": "Стоматологические клиники", "geography": "Берлин", "revenue": 10.0, "ebitda": 2.0}
+    sweep = SellerSweep("m_and_a.db")
+    start = time.perf_counter()
+    result = sweep.run(seller, revenues=np.arange(5.0, 100.5, 5.0), ebitdas=[None, 1.0, 2.0, 5.0],
+                       geographies=["Берлин", "Мюнхен", "Москва", "Санкт-Петербург"])
+    print(f"{len(result['grid'])} сценариев за {time.perf_counter() - start:.3f} с")
+    print(result["grid"].head(10).to_string())
@@ -4,6 +4,7 @@ import json
 import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer
 from typing import Optional, Dict, List
+from .metrics import metrics
 
 class TeaserGenerator:
     """
@@ -11,13 +12,18 @@ class TeaserGenerator:
     Использует языковую модель (ruGPT) с fallback на шаблоны.
     """
 
-    def __init__(self, templates_path: Optional[str] = None, device: str = "auto"):
+    def __init__(self, templates_path: Optional[str] = None, device: str = "auto", use_model: bool = True,
+                 rng: Optional[random.Random] = None):
         """
         Инициализация генератора.
         
         :param templates_path: путь к JSON с шаблонами (по умолчанию — рядом с файлом)
         :param device: "cuda", "cpu" или "auto"
+        :param use_model: использовать языковую модель (False — только шаблоны)
+        :param rng: генератор случайных чисел для выбора шаблонов (None — новый несидированный)
         """
+        self.use_model = use_model
+        self.rng = rng if rng is not None else random.Random()
         self.templates_path = templates_path or os.path.join(os.path.dirname(__file__), "teaser_templates.json")
         self.templates = self._load_templates()
         self.model = None
@@ -56,7 +62,7 @@ class TeaserGenerator:
             # Few-shot примеры из шаблонов
             examples = self.templates.get(seller_profile["industry"], [])
             if examples:
-                selected = random.sample(examples, k=min(2, len(examples)))
+                selected = self.rng.sample(examples, k=min(2, len(examples)))
                 examples_text = "\n".join(f"- {ex}" for ex in selected)
             else:
                 examples_text = (
@@ -85,7 +91,9 @@ class TeaserGenerator:
                 max_length=512
             ).to(self.device)
 
-            with torch.no_grad():
+            # Сэмплирование модели тоже идёт от self.rng: с сидированным rng teaser воспроизводим
+            torch.manual_seed(self.rng.getrandbits(63))
+            with torch.no_grad(), metrics.span("model.teaser_inference"):
                 outputs = self.model.generate(
                     **inputs,
                     max_new_tokens=max_new_tokens,
@@ -96,6 +104,7 @@ class TeaserGenerator:
                     pad_token_id=self.tokenizer.eos_token_id
                 )
 
+            metrics.incr("tokens_generated", outputs.shape[-1] - inputs["input_ids"].shape[-1])
             generated = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
             teaser = generated.split("Teaser:", 1)[-1].strip()
             teaser = teaser.split('\n')[0].split('###')[0].split('Примеры')[0].strip()
@@ -123,7 +132,7 @@ class TeaserGenerator:
         templates = self.templates.get(industry, [
             "Бизнес в сфере {industry} в {geography} с выручкой €{revenue} млн. {usp}. Сильная рыночная позиция и потенциал роста."
         ])
-        template = random.choice(templates)
+        template = self.rng.choice(templates)
 
         return template.format(
             industry=industry.lower(),
@@ -139,7 +148,7 @@ class TeaserGenerator:
         :param seller_profile: словарь с ключами: industry, geography, revenue, usp
         :return: строка с teaser'ом
         """
-        teaser = self._generate_with_model(seller_profile)
+        teaser = self._generate_with_model(seller_profile) if self.use_model else None
         if teaser:
             return teaser
         return self._generate_fallback(seller_profile)
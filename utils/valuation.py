@@ -1,24 +1,28 @@
-import sqlite3
 import pandas as pd
-from typing import Dict, Any, Union
+from typing import Dict, Any, Optional, Union
+from .metrics import metrics
+from .storage import open_storage
+
+# Столбцы deals, нужные для оценки: остальные не читаются
+DEAL_COLUMNS = ["target_industry", "target_revenue", "target_ebitda", "revenue_multiple", "ebitda_multiple"]
 
 class BusinessValuationEngine:
     def __init__(self, db_path: str):
         self.db_path = db_path
 
-    def _load_deals(self) -> pd.DataFrame:
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query("""
-            SELECT target_industry, target_revenue, target_ebitda,
-                   revenue_multiple, ebitda_multiple
-            FROM deals
-        """, conn)
-        conn.close()
+    def _load_deals(self, industry: Optional[str] = None) -> pd.DataFrame:
+        """
+        :param industry: Читать только сделки отрасли (отбор выполняет хранилище)
+        """
+        filters = [("target_industry", "==", industry)] if industry is not None else None
+        with metrics.span("db_load.deals"):
+            df = open_storage(self.db_path).read("deals", columns=DEAL_COLUMNS, filters=filters)
+        metrics.incr("rows_scanned.deals", len(df))
         return df
 
     def estimate(self, seller_profile: Dict[str, Any], top_n: int = 10) -> Dict[str, Union[str, float, None]]:
         try:
-            df_deals = self._load_deals()
+            df_deals = self._load_deals(seller_profile["industry"])
         except Exception as e:
             return {
                 "error": f"Ошибка БД: {e}",